@@ -0,0 +1,54 @@
+"""
+Single entry point for the overwatch node CLI
+
+Subcommands are imported only when invoked, so e.g. printing a peer id never loads the
+substrate or P2P daemon stacks.
+
+python -m cli --help
+python -m cli key --path private_key.key
+python -m cli add-stake --amount 100 --local
+"""
+import importlib
+import logging
+import sys
+from typing import Dict, Tuple
+
+# command -> (module, description), modules must expose `main()` parsing `sys.argv[1:]`
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    "key": ("cli.crypto.key", "Print the peer id of a private key file"),
+    "keygen": ("cli.crypto.keygen", "Generate a private key and bootstrap private key"),
+    "bulk-keygen": ("cli.crypto.bulk_keygen", "Generate many identities without starting the P2P daemon"),
+    "add-stake": ("cli.hypertensor.overwatch_node.add_to_stake", "Add stake to your overwatch node"),
+    "remove-stake": ("cli.hypertensor.overwatch_node.remove_stake", "Remove stake from your overwatch node"),
+    "batch-stake": ("cli.hypertensor.overwatch_node.batch_stake", "Add or remove stake for many accounts at once"),
+}
+
+
+def print_usage():
+    print("usage: python -m cli <command> [args]\n\ncommands:")
+    width = max(len(name) for name in COMMANDS)
+    for name, (_, description) in COMMANDS.items():
+        print(f"  {name:<{width}}  {description}")
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
+        print_usage()
+        return
+
+    command = sys.argv[1]
+    if command not in COMMANDS:
+        print(f"Unknown command {command}\n")
+        print_usage()
+        sys.exit(2)
+
+    module_name, _ = COMMANDS[command]
+    module = importlib.import_module(module_name)
+
+    logging.basicConfig(level=logging.INFO)
+    sys.argv = [f"{sys.argv[0]} {command}"] + sys.argv[2:]
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
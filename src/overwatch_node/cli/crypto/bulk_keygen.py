@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from cli.crypto.identity import (
+    ED25519,
+    KEY_TYPES,
+    base58_encode,
+    encode_key,
+    peer_id_from_public_key,
+)
+from cli.crypto.key import read_peer_id
+
+import logging
+logger = logging.getLogger(__name__)
+
+"""
+Bulk identity generation for fleet provisioning
+
+Keys are generated in a process pool and every written key file is loaded back in pure Python
+and its peer id checked against the generated key. No P2P daemon is started unless a spot
+check against it is requested with --verify_sample.
+
+python -m cli bulk-keygen --count 1000 --out_dir keys
+python -m cli bulk-keygen --count 100 --key_type rsa --out_dir keys --verify_sample 3
+"""
+
+MANIFEST_NAME = "peer_ids.csv"
+
+
+class IdentityMismatch(Exception):
+    pass
+
+
+def _generate_private_key(key_type: int) -> Tuple[bytes, bytes]:
+    """
+    Returns the ``PrivateKey`` data of a new key and the serialized ``PublicKey`` taken from the
+    in-memory key object, independently of how `cli.crypto.key` derives it from the key file
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if key_type == ED25519:
+        private_key = ed25519.Ed25519PrivateKey.generate()
+        raw_private_key = private_key.private_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PrivateFormat.Raw,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+        public_key = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw,
+        )
+        # Same layout as keygen.py, the daemon expects the private key followed by the public key
+        return raw_private_key + public_key, encode_key(key_type, public_key)
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_data = private_key.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    public_key = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return key_data, encode_key(key_type, public_key)
+
+
+def write_atomic(path: str, data: bytes, mode: int = 0o400):
+    """Writes ``data`` to ``path`` through a temporary file so readers never see a partial key"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def generate_identity(key_type: int, path: str) -> Tuple[str, str]:
+    """
+    Generates one identity, writes it to ``path`` and verifies that loading the written file
+    the way `cli.crypto.key` does yields the peer id of the generated key
+
+    Returns:
+      Tuple[str, str]: (path, base58 peer id)
+    """
+    key_data, encoded_public_key = _generate_private_key(key_type)
+    peer_id = peer_id_from_public_key(encoded_public_key)
+
+    write_atomic(path, encode_key(key_type, key_data))
+    loaded_peer_id = read_peer_id(path)
+    if loaded_peer_id != peer_id:
+        os.remove(path)
+        raise IdentityMismatch(
+            f"Peer ID {base58_encode(loaded_peer_id)} loaded from {path} does not match "
+            f"the generated {base58_encode(peer_id)}"
+        )
+    return path, base58_encode(peer_id)
+
+
+def _generate_chunk(key_type: int, paths: List[str]) -> List[Tuple[str, str]]:
+    return [generate_identity(key_type, path) for path in paths]
+
+
+def generate_identities(
+    count: int,
+    out_dir: str,
+    key_type: int = ED25519,
+    prefix: str = "private_key_",
+    workers: Optional[int] = None,
+    chunk_size: int = 64,
+) -> List[Tuple[str, str]]:
+    """Generates ``count`` identities into ``out_dir`` using a process pool"""
+    os.makedirs(out_dir, exist_ok=True)
+    width = len(str(count - 1))
+    paths = [os.path.join(out_dir, f"{prefix}{i:0{width}d}.key") for i in range(count)]
+    existing = [path for path in paths if os.path.exists(path)]
+    if existing:
+        raise FileExistsError(f"{len(existing)} key files already exist in {out_dir}, e.g. {existing[0]}")
+
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    identities = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_identities in executor.map(_generate_chunk, [key_type] * len(chunks), chunks):
+            identities.extend(chunk_identities)
+
+    manifest = "".join(f"{os.path.basename(path)},{peer_id}\n" for path, peer_id in identities)
+    write_atomic(os.path.join(out_dir, MANIFEST_NAME), ("path,peer_id\n" + manifest).encode(), mode=0o644)
+    return identities
+
+
+def verify_with_daemon(identities: List[Tuple[str, str]]):
+    """Boots the P2P daemon for each identity and checks it reports the same peer id"""
+    from hypermind.p2p.p2p_daemon import P2P
+
+    async def daemon_peer_id(identity_path: str) -> str:
+        p2p = await P2P.create(identity_path=identity_path)
+        try:
+            return p2p.peer_id.to_base58()
+        finally:
+            await p2p.shutdown()
+
+    for path, peer_id in identities:
+        p2p_peer_id = asyncio.run(daemon_peer_id(path))
+        if peer_id != p2p_peer_id:
+            raise IdentityMismatch(f"Generated Peer ID {peer_id} and daemon Peer ID {p2p_peer_id} are not equal for {path}")
+        logger.info(f"Verified {path} against the P2P daemon")
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--count", type=int, required=True, help="Number of identities to generate")
+    parser.add_argument("--out_dir", type=str, required=False, default="keys", help="Directory to write the key files to")
+    parser.add_argument("--prefix", type=str, required=False, default="private_key_", help="Key file name prefix")
+    parser.add_argument("--key_type", type=str, required=False, default="ed25519", help="Key type used in subnet. ed25519, rsa")
+    parser.add_argument("--workers", type=int, required=False, default=None, help="Worker processes, defaults to the CPU count")
+    parser.add_argument("--verify_sample", type=int, required=False, default=0, help="Identities to spot-check against the P2P daemon")
+
+    args = parser.parse_args()
+
+    key_type = KEY_TYPES.get(args.key_type.lower())
+    if key_type is None:
+        raise ValueError("Invalid key type. Supported types: rsa, ed25519")
+
+    start = time.perf_counter()
+    identities = generate_identities(args.count, args.out_dir, key_type, args.prefix, args.workers)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Generated {len(identities)} identities in {elapsed:.2f}s ({len(identities) / elapsed * 60:.0f}/min), "
+        f"peer ids written to {os.path.join(args.out_dir, MANIFEST_NAME)}"
+    )
+
+    if args.verify_sample:
+        verify_with_daemon(random.sample(identities, min(args.verify_sample, len(identities))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Pure Python libp2p identity helpers
+
+Reading a key file and deriving its peer id only needs the two-field ``PrivateKey`` /
+``PublicKey`` protobuf messages, a multihash and base58, so they are implemented here instead
+of importing ``hypermind`` (and with it the P2P daemon bindings and torch).
+
+Messages follow ``crypto.proto`` (proto2, both fields required):
+
+  message PublicKey { required KeyType key_type = 1; required bytes data = 2; }
+  message PrivateKey { required KeyType key_type = 1; required bytes data = 2; }
+"""
+import hashlib
+from typing import Tuple
+
+# KeyType enum values from crypto.proto
+RSA = 0
+ED25519 = 1
+SECP256K1 = 2
+ECDSA = 3
+
+KEY_TYPES = {"rsa": RSA, "ed25519": ED25519}
+
+# Multihash codes
+IDENTITY = 0x00
+SHA2_256 = 0x12
+
+# Public keys up to this serialized size are inlined into the peer id with the identity hash
+MAX_INLINE_KEY_LENGTH = 42
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def _encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _decode_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Truncated varint")
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, offset
+        shift += 7
+
+
+def encode_key(key_type: int, data: bytes) -> bytes:
+    """Serializes a ``PrivateKey`` or ``PublicKey`` message"""
+    return b"\x08" + _encode_varint(key_type) + b"\x12" + _encode_varint(len(data)) + data
+
+
+def decode_key(message: bytes) -> Tuple[int, bytes]:
+    """Parses a ``PrivateKey`` or ``PublicKey`` message into (key_type, data)"""
+    key_type = None
+    data = None
+    offset = 0
+    while offset < len(message):
+        tag, offset = _decode_varint(message, offset)
+        field, wire_type = tag >> 3, tag & 0x07
+        if wire_type == 0:
+            value, offset = _decode_varint(message, offset)
+            if field == 1:
+                key_type = value
+        elif wire_type == 2:
+            length, offset = _decode_varint(message, offset)
+            value = message[offset:offset + length]
+            if len(value) != length:
+                raise ValueError("Truncated length-delimited field")
+            offset += length
+            if field == 2:
+                data = value
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type}")
+
+    if key_type is None or data is None:
+        raise ValueError("Key message is missing key_type or data")
+    return key_type, data
+
+
+def multihash(code: int, digest: bytes) -> bytes:
+    return _encode_varint(code) + _encode_varint(len(digest)) + digest
+
+
+def peer_id_from_public_key(encoded_public_key: bytes) -> bytes:
+    """
+    Returns the peer id multihash of a serialized ``PublicKey``
+
+    Small keys (Ed25519) are inlined with the identity multihash, larger ones (RSA) are hashed
+    with sha2-256, as the libp2p daemon does.
+    """
+    if len(encoded_public_key) <= MAX_INLINE_KEY_LENGTH:
+        return multihash(IDENTITY, encoded_public_key)
+    return multihash(SHA2_256, hashlib.sha256(encoded_public_key).digest())
+
+
+def base58_encode(data: bytes) -> str:
+    n_leading_zeros = len(data) - len(data.lstrip(b"\x00"))
+    value = int.from_bytes(data, "big")
+    chars = []
+    while value:
+        value, remainder = divmod(value, 58)
+        chars.append(BASE58_ALPHABET[remainder])
+    return "1" * n_leading_zeros + "".join(reversed(chars))
+
+
+def base58_decode(text: str) -> bytes:
+    value = 0
+    for char in text:
+        value = value * 58 + BASE58_ALPHABET.index(char)
+    n_leading_zeros = len(text) - len(text.lstrip("1"))
+    body = value.to_bytes((value.bit_length() + 7) // 8, "big") if value else b""
+    return b"\x00" * n_leading_zeros + body
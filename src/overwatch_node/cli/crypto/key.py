@@ -1,22 +1,46 @@
 import argparse
-import asyncio
-import hashlib
-import os
-
-from hypermind.proto import crypto_pb2
-from hypermind.p2p.p2p_daemon_bindings.datastructures import PeerID
-from hypermind.p2p.p2p_daemon import P2P
-
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, ed25519
-from cryptography.hazmat.primitives import serialization
-import multihash
 import logging
 
+from cli.crypto.identity import ED25519, RSA, base58_encode, decode_key, encode_key, peer_id_from_public_key
+
 logger = logging.getLogger(__name__)
 
-# python -m subnet.cli.crypto.key 
-# python -m subnet.cli.crypto.key --path private_key2.key
+# python -m cli key
+# python -m cli key --path private_key2.key
+
+def public_key_from_private_key(key_type: int, key_data: bytes) -> bytes:
+    """Returns the serialized ``PublicKey`` message for the ``PrivateKey`` data of a key file"""
+    # cryptography is only needed here, keep it out of the CLI import path
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    if key_type == RSA:
+        private_key = serialization.load_der_private_key(key_data, password=None)
+
+        encoded_public_key = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        logger.info(f"DER RSA Public Key: {encoded_public_key}")
+    elif key_type == ED25519:
+        private_key = ed25519.Ed25519PrivateKey.from_private_bytes(key_data[:32])
+        encoded_public_key = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw,
+        )
+    else:
+        raise ValueError("Invalid key type. Supported types: rsa, ed25519")
+
+    return encode_key(key_type, encoded_public_key)
+
+
+def read_peer_id(path: str) -> bytes:
+    """Returns the peer id multihash of the private key stored at ``path``"""
+    with open(path, "rb") as f:
+        key_type, key_data = decode_key(f.read())
+
+    return peer_id_from_public_key(public_key_from_private_key(key_type, key_data))
+
 
 def main():
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -28,51 +52,12 @@ def main():
     path = args.path
     key_type = args.key_type.lower()
 
-    if key_type is "rsa":
-        with open(path, "rb") as f:
-            data = f.read()
-            key_data = crypto_pb2.PrivateKey.FromString(data).data
-
-            private_key = serialization.load_der_private_key(key_data, password=None)
-
-            encoded_public_key = private_key.public_key().public_bytes(
-                encoding=serialization.Encoding.DER,
-                format=serialization.PublicFormat.SubjectPublicKeyInfo,
-            )
-            logger.info(f"DER RSA Public Key: {encoded_public_key}")
-
-            encoded_public_key = crypto_pb2.PublicKey(
-                key_type=crypto_pb2.RSA,
-                data=encoded_public_key,
-            ).SerializeToString()
-
-            encoded_digest = multihash.encode(
-                hashlib.sha256(encoded_public_key).digest(),
-                multihash.coerce_code("sha2-256"),
-            )
-    elif key_type == "ed25519":
-        with open(path, "rb") as f:
-            data = f.read()
-            key_data = crypto_pb2.PrivateKey.FromString(data).data
-            private_key = ed25519.Ed25519PrivateKey.from_private_bytes(key_data[:32])
-            public_key = private_key.public_key().public_bytes(
-                encoding=serialization.Encoding.Raw,
-                format=serialization.PublicFormat.Raw,
-            )
-
-            combined_key_bytes = private_key.private_bytes_raw() + public_key
-
-            encoded_public_key = crypto_pb2.PublicKey(
-                key_type=crypto_pb2.Ed25519,
-                data=public_key,
-            ).SerializeToString()
-
-            encoded_digest = b"\x00$" + encoded_public_key
-    else:
+    if key_type not in ("rsa", "ed25519"):
         raise ValueError("Invalid key type. Supported types: rsa, ed25519")
 
-    peer_id = PeerID(encoded_digest)
-    logger.info(f"Peer ID {peer_id}")
+    # The key type is read from the key file itself, --key_type is kept for compatibility
+    peer_id = read_peer_id(path)
+    logger.info(f"Peer ID {base58_encode(peer_id)}")
 
 if __name__ == "__main__":
     main()
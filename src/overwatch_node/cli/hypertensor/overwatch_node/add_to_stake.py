@@ -1,26 +1,18 @@
 import argparse
 
-from subnet.substrate.chain_functions import add_to_stake
-from subnet.substrate.config import SubstrateConfigCustom
 from pathlib import Path
 import os
-from dotenv import load_dotenv
 import logging
 
-load_dotenv(os.path.join(Path.cwd(), '.env'))
-
-PHRASE = os.getenv('PHRASE')
-
 logger = logging.getLogger(__name__)
 
 """
-python -m subnet.cli.hypertensor.subnet_node.activate --subnet_id 1
+python -m cli add-stake --amount 100
 """
 
 def main():
     # fmt:off
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument("--subnet_id", type=str, required=True, help="Subnet ID you registered your subnet node for. ")
     parser.add_argument("--amount", type=float, required=True, help="Amount of stake to be added")
     parser.add_argument("--local", action="store_true", help="Run in local mode, uses LOCAL_RPC")
     parser.add_argument("--phrase", type=str, help="Seed phrase for local RPC")
@@ -29,24 +21,33 @@ def main():
     local = args.local
     phrase = args.phrase
 
+    # Imported after argument parsing so `--help` and argument errors stay instant
+    from dotenv import load_dotenv
+    from substrate.chain_functions import add_to_stake
+    from substrate.config import SubstrateConfigCustom
+
+    load_dotenv(os.path.join(Path.cwd(), '.env'))
+
     if local:
         rpc = os.getenv('LOCAL_RPC')
+    elif os.getenv('RPC_ENDPOINTS'):
+        # Several endpoints fail over between each other, see `substrate.endpoints`
+        from substrate.endpoints import endpoints_from_env
+        rpc = endpoints_from_env()
     else:
         rpc = os.getenv('DEV_RPC')
 
     if phrase is not None:
         substrate = SubstrateConfigCustom(phrase, rpc)
     else:
-        substrate = SubstrateConfigCustom(PHRASE, rpc)
+        substrate = SubstrateConfigCustom(os.getenv('PHRASE'), rpc)
 
-    subnet_id = args.subnet_id
     amount = args.amount
 
     try:
         receipt = add_to_stake(
             substrate.interface,
             substrate.keypair,
-            subnet_id,
             amount
         )
         if receipt.is_success:
@@ -56,7 +57,7 @@ def main():
         else:
             print('⚠️ Extrinsic Failed: ', receipt.error_message)
     except Exception as e:
-        logger.error("Error: ", e, exc_info=True)
+        logger.error(f"Error: {e}", exc_info=True)
 
 
 
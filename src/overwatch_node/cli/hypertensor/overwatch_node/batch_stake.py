@@ -0,0 +1,84 @@
+import argparse
+
+from pathlib import Path
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+"""
+Add or remove overwatch stake for many accounts at once
+
+operations.csv (amounts in integer base units, hotkey defaults to the account):
+  account,amount,action,hotkey
+  node-1,100,add,
+  5F3sa2TJAWMqDhXG6jhV4N8ko9SxwGy8TpaNS1repo5EYjQX,50,remove,
+
+keys.json (accounts by name or ss58 address):
+  {"node-1": "<mnemonic or secret uri>", ...}
+
+python -m cli batch-stake --operations operations.csv --keys keys.json --report report.csv
+"""
+
+def main():
+    # fmt:off
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--operations", type=str, required=True, help="CSV or JSON file of account, amount and optional action and hotkey")
+    parser.add_argument("--keys", type=str, required=True, help="JSON file mapping account names to seed phrases")
+    parser.add_argument("--action", type=str, choices=["add", "remove"], default="add", help="Action of operations without one")
+    parser.add_argument("--batch_size", type=int, required=False, default=32, help="Calls per Utility.batch_all extrinsic")
+    parser.add_argument("--workers", type=int, required=False, default=8, help="Accounts submitted concurrently")
+    parser.add_argument("--report", type=str, required=False, default=None, help="CSV file to write per-operation outcomes to")
+    parser.add_argument("--dry_run", action="store_true", help="Only validate and print how operations are batched")
+    parser.add_argument("--local", action="store_true", help="Run in local mode, uses LOCAL_RPC")
+
+    args = parser.parse_args()
+
+    # Imported after argument parsing so `--help` and argument errors stay instant
+    from dotenv import load_dotenv
+    from substrateinterface import SubstrateInterface
+    from substrate.batch_stake import BatchStaker, group_by_signer, load_keypairs, load_operations, write_report
+
+    load_dotenv(os.path.join(Path.cwd(), '.env'))
+
+    operations = load_operations(args.operations, default_action=args.action)
+    batches = group_by_signer(operations, load_keypairs(args.keys))
+
+    for batch in batches:
+        chunks = -(-len(batch.operations) // args.batch_size)
+        print(f"{batch.keypair.ss58_address}: {len(batch.operations)} operations in {chunks} extrinsics")
+    if args.dry_run:
+        return
+
+    if args.local:
+        rpc = os.getenv('LOCAL_RPC')
+    elif os.getenv('RPC_ENDPOINTS'):
+        from substrate.endpoints import endpoints_from_env
+        rpc = endpoints_from_env()
+    else:
+        rpc = os.getenv('DEV_RPC')
+
+    def interface_factory():
+        if isinstance(rpc, list) and len(rpc) > 1:
+            from substrate.endpoints import EndpointPool, FailoverSubstrate
+            return FailoverSubstrate(EndpointPool(rpc))
+        return SubstrateInterface(url=rpc[0] if isinstance(rpc, list) else rpc)
+
+    staker = BatchStaker(interface_factory, batch_size=args.batch_size, max_workers=args.workers)
+    try:
+        staker.run(batches)
+    except Exception as e:
+        logger.error("Error: %s", e, exc_info=True)
+
+    succeeded = sum(operation.status == "success" for operation in operations)
+    for operation in operations:
+        if operation.status != "success":
+            print(f"⚠️ Operation {operation.index} ({operation.account}, {operation.action} {operation.amount}) {operation.status}: {operation.error}")
+    print(f"✅ {succeeded}/{len(operations)} operations succeeded")
+
+    if args.report is not None:
+        write_report(args.report, operations)
+
+
+if __name__ == "__main__":
+    main()
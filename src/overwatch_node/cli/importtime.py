@@ -0,0 +1,90 @@
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from cli.__main__ import COMMANDS
+
+"""
+Import-time report and budget check for the CLI commands
+
+Runs `python -X importtime -m cli <command> --help` in a fresh interpreter and fails if any
+command regresses past its budget, e.g. because a heavy dependency is imported eagerly again.
+Everything imported until the command's arguments are parsed is counted, including imports
+inside `main()` that run before `parse_args`.
+
+python -m cli.importtime
+python -m cli.importtime --top 15 key add-stake
+"""
+
+# Budget in milliseconds of total import time per command, None to only report
+BUDGETS_MS: Dict[str, float] = {
+    "key": 150,
+    "keygen": None,
+    "bulk-keygen": 150,
+    "add-stake": 100,
+    "remove-stake": 100,
+    "batch-stake": 100,
+}
+
+SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(command: str) -> Tuple[float, List[Tuple[float, str]]]:
+    """
+    Returns (total import ms, [(cumulative ms, module)]) for running ``command`` up to and
+    including its argument parsing
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "cli", command, "--help"],
+        cwd=SRC_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to run {command} --help:\n{result.stderr}")
+
+    total_us = 0
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        modules.append((int(cumulative_us) / 1000, name.strip()))
+
+    return total_us / 1000, sorted(modules, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("commands", nargs="*", help="Commands to check, defaults to all")
+    parser.add_argument("--top", type=int, required=False, default=5, help="Slowest imports to show per command")
+    parser.add_argument("--repeat", type=int, required=False, default=3, help="Runs per command, the fastest is kept")
+
+    args = parser.parse_args()
+    commands = args.commands or list(COMMANDS)
+
+    failed = []
+    for command in commands:
+        total_ms, modules = min((measure(command) for _ in range(args.repeat)), key=lambda run: run[0])
+        budget = BUDGETS_MS.get(command)
+
+        status = "ok"
+        if budget is not None and total_ms > budget:
+            status = "OVER BUDGET"
+            failed.append(command)
+
+        budget_text = f"{budget:.0f} ms" if budget is not None else "none"
+        print(f"{command}: {total_ms:.1f} ms (budget {budget_text}) {status}")
+        for cumulative_ms, name in modules[:args.top]:
+            print(f"    {cumulative_ms:>9.1f} ms  {name}")
+
+    if failed:
+        print(f"Import time budget exceeded for: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import logging
+import threading
+from typing import Optional, Tuple
+
+from cli.server.state import NodeControls, NodeState
+
+logger = logging.getLogger(__name__)
+
+"""
+Local status and control server for the overwatch node
+
+Started by the node's run loop on the state and controls of its `BenchmarkManager`, see
+`node.run_benchmarks`:
+
+STATUS_PORT=8765 python -m node.run_benchmarks
+
+GET  /status            JSON snapshot of epoch, benchmark progress, queue and last weights
+GET  /metrics           Prometheus metrics
+POST /control/<cmd>     trigger, pause, resume or drain the evaluation loop
+"""
+
+MAX_REQUEST_LINE = 8192
+MAX_HEADERS = 100
+KEEP_ALIVE_TIMEOUT = 15
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+class StatusServer:
+    def __init__(self, state: NodeState, controls: NodeControls, host: str = "127.0.0.1", port: int = 8765):
+        self.state = state
+        self.controls = controls
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Status server listening on http://{self.host}:{self.port}")
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def route(self, method: str, path: str) -> Tuple[int, str, bytes]:
+        """Returns (status, content type, body) for a request, never blocking on node state"""
+        path = path.split("?")[0]
+        if path == "/status":
+            if method != "GET":
+                return 405, "text/plain", b"Method Not Allowed"
+            return 200, "application/json", self.state.snapshot()
+        if path == "/metrics":
+            if method != "GET":
+                return 405, "text/plain", b"Method Not Allowed"
+            return 200, "text/plain; version=0.0.4; charset=utf-8", self.state.metrics()
+        if path.startswith("/control/"):
+            if method != "POST":
+                return 405, "text/plain", b"Method Not Allowed"
+            command = path[len("/control/"):]
+            try:
+                self.controls.apply(command)
+            except ValueError as e:
+                return 400, "text/plain", str(e).encode("utf-8")
+            body = json.dumps({"command": command, "paused": self.controls.paused}).encode("utf-8")
+            return 200, "application/json", body
+        return 404, "text/plain", b"Not Found"
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line or len(request_line) > MAX_REQUEST_LINE:
+                    break
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self._respond(writer, 400, "text/plain", b"Bad Request", keep_alive=False)
+                    break
+                method, path, version = parts
+
+                headers = {}
+                for _ in range(MAX_HEADERS):
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                # Control commands carry no body we need, but it must be consumed to keep the connection usable
+                try:
+                    content_length = int(headers.get("content-length", 0) or 0)
+                except ValueError:
+                    content_length = -1
+                if content_length < 0:
+                    await self._respond(writer, 400, "text/plain", b"Invalid Content-Length", keep_alive=False)
+                    break
+                if content_length:
+                    await reader.readexactly(content_length)
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                status, content_type, body = self.route(method, path)
+                await self._respond(writer, status, content_type, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, content_type: str, body: bytes, keep_alive: bool):
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        ).encode("latin-1")
+        writer.write(head + body)
+        await writer.drain()
+
+
+def serve_in_background(
+    state: NodeState,
+    controls: NodeControls,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+) -> StatusServer:
+    """Runs the server on its own event loop thread so the evaluation loop is never blocked"""
+    server = StatusServer(state, controls, host, port)
+    started = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        started.set()
+        loop.run_until_complete(server.serve_forever())
+
+    thread = threading.Thread(target=run, name="status-server", daemon=True)
+    thread.start()
+    started.wait()
+    return server
+
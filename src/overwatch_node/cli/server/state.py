@@ -0,0 +1,153 @@
+"""
+Live node state shared between the evaluation loop and the status server
+
+The evaluation loop mutates `NodeState` through `update`, which bumps a version counter. The
+server only ever reads `snapshot`, which renders the JSON body once per version, so any number
+of dashboard polls between two updates are served from the same pre-rendered bytes.
+"""
+import json
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from metrics.exposition import render
+
+# Minimum interval between two renders of the metrics body
+METRICS_RENDER_INTERVAL = 1.0
+
+
+class NodeState:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._fields: Dict[str, Any] = {
+            "epoch": None,
+            "status": "idle",
+            "benchmark": None,
+            "benchmark_progress": {},
+            "queued": 0,
+            "in_flight": 0,
+            "last_weights": None,
+            "last_weights_epoch": None,
+            "paused": False,
+            "draining": False,
+        }
+        self._snapshot_version = -1
+        self._snapshot = b""
+        self._metrics = b""
+        self._metrics_rendered_at = 0.0
+
+    def update(self, **fields):
+        """Updates the given fields, e.g. ``state.update(epoch=10, status="evaluating")``"""
+        with self._lock:
+            self._fields.update(fields)
+            self._fields["updated_at"] = time.time()
+            self._version += 1
+
+    def set_progress(self, benchmark: str, completed: int, total: int):
+        with self._lock:
+            progress = dict(self._fields["benchmark_progress"])
+            progress[benchmark] = {"completed": completed, "total": total}
+            self._fields["benchmark_progress"] = progress
+            self._fields["benchmark"] = benchmark
+            self._version += 1
+
+    def get(self, name: str) -> Any:
+        with self._lock:
+            return self._fields.get(name)
+
+    def snapshot(self) -> bytes:
+        """Returns the JSON status body, rendering it only if the state changed since the last call"""
+        with self._lock:
+            if self._snapshot_version != self._version:
+                self._snapshot = json.dumps(
+                    dict(self._fields, version=self._version), default=str
+                ).encode("utf-8")
+                self._snapshot_version = self._version
+            return self._snapshot
+
+    def metrics(self) -> bytes:
+        """Returns the metrics body, re-rendered at most once per ``METRICS_RENDER_INTERVAL``"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._metrics_rendered_at < METRICS_RENDER_INTERVAL:
+                return self._metrics
+        body = render()
+        with self._lock:
+            self._metrics = body
+            self._metrics_rendered_at = now
+        return body
+
+
+class NodeControls:
+    """
+    Control commands from the server, polled by the evaluation loop between work items
+
+    Commands never block the server: they only set events the loop checks when convenient.
+    """
+
+    COMMANDS = ("trigger", "pause", "resume", "drain")
+
+    def __init__(self, state: Optional[NodeState] = None):
+        self.state = state
+        self.draining = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        # A pending trigger is a flag under a condition, so one arriving while the loop is
+        # between waking up and consuming it is never lost
+        self._trigger = threading.Condition()
+        self._triggered = False
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    @property
+    def triggered(self) -> bool:
+        with self._trigger:
+            return self._triggered
+
+    def apply(self, command: str):
+        if command == "trigger":
+            with self._trigger:
+                self._triggered = True
+                self._trigger.notify_all()
+        elif command == "pause":
+            self._running.clear()
+        elif command == "resume":
+            self.draining.clear()
+            self._running.set()
+        elif command == "drain":
+            self.draining.set()
+            # A paused loop has to wake up to see the drain and stop
+            self._running.set()
+        else:
+            raise ValueError(f"Unknown command {command}, expected one of {self.COMMANDS}")
+        self._publish()
+
+    def _publish(self):
+        if self.state is not None:
+            self.state.update(paused=self.paused, draining=self.draining.is_set())
+
+    def finish_drain(self):
+        """Called by the evaluation loop once it stopped for a drain, later runs proceed again"""
+        self.draining.clear()
+        self._publish()
+
+    def consume_trigger(self) -> bool:
+        """Consumes a pending trigger without waiting, returns whether there was one"""
+        with self._trigger:
+            triggered, self._triggered = self._triggered, False
+            return triggered
+
+    def wait_if_paused(self, timeout: Optional[float] = None) -> bool:
+        """Blocks the evaluation loop while paused, returns False if still paused after ``timeout``"""
+        return self._running.wait(timeout)
+
+    def wait_for_trigger(self, timeout: Optional[float] = None) -> bool:
+        """Waits for a manual evaluation trigger and consumes it"""
+        with self._trigger:
+            if not self._trigger.wait_for(lambda: self._triggered, timeout):
+                return False
+            self._triggered = False
+            return True
@@ -0,0 +1,70 @@
+import argparse
+import shutil
+import time
+
+from transformers import AutoTokenizer
+
+from dsn_connection.tokenizer_cache import cache_path_for, load_tokenizer
+
+"""
+Compares init time and encode throughput of the slow tokenizer against the cached fast tokenizer
+
+python -m dsn_connection.benchmark_tokenizer --repository Orenguteng/Llama-3.1-8B-Lexi-Uncensored-V2
+"""
+
+SAMPLE_TEXT = (
+    "Overwatch nodes evaluate subnet models on a fixed set of benchmarks every epoch and "
+    "submit the resulting weights on-chain. "
+)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def encode_throughput(tokenizer, prompts, batch_size: int):
+    """Returns (tokens/sec one prompt at a time, tokens/sec batched)"""
+    def single():
+        return sum(len(tokenizer(prompt)["input_ids"]) for prompt in prompts)
+
+    def batched():
+        total = 0
+        for i in range(0, len(prompts), batch_size):
+            total += sum(len(ids) for ids in tokenizer(prompts[i:i + batch_size])["input_ids"])
+        return total
+
+    n_tokens, single_secs = timed(single)
+    _, batched_secs = timed(batched)
+    return n_tokens / single_secs, n_tokens / batched_secs
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--repository", type=str, required=True, help="Model repository to load the tokenizer from")
+    parser.add_argument("--cache_dir", type=str, required=False, default=None, help="Tokenizer cache directory")
+    parser.add_argument("--samples", type=int, required=False, default=2000, help="Number of prompts to encode")
+    parser.add_argument("--batch_size", type=int, required=False, default=64, help="Batch size for batched encoding")
+
+    args = parser.parse_args()
+
+    prompts = [SAMPLE_TEXT * (1 + i % 8) for i in range(args.samples)]
+
+    shutil.rmtree(cache_path_for(args.repository, cache_dir=args.cache_dir), ignore_errors=True)
+
+    slow, slow_init = timed(lambda: AutoTokenizer.from_pretrained(args.repository, add_bos_token=False, use_fast=False))
+    _, convert_init = timed(lambda: load_tokenizer(args.repository, cache_dir=args.cache_dir, add_bos_token=False))
+    fast, cached_init = timed(lambda: load_tokenizer(args.repository, cache_dir=args.cache_dir, add_bos_token=False))
+
+    slow_single, slow_batched = encode_throughput(slow, prompts, args.batch_size)
+    fast_single, fast_batched = encode_throughput(fast, prompts, args.batch_size)
+
+    print(f"{'':<14}{'init (s)':>12}{'single (tok/s)':>18}{'batched (tok/s)':>18}")
+    print(f"{'slow':<14}{slow_init:>12.3f}{slow_single:>18.0f}{slow_batched:>18.0f}")
+    print(f"{'fast (cold)':<14}{convert_init:>12.3f}{'':>18}{'':>18}")
+    print(f"{'fast (cached)':<14}{cached_init:>12.3f}{fast_single:>18.0f}{fast_batched:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
+import os
+
 import torch
 
-from data_structures import ModelBackendConfig, ModelChatConfig, ModelConfig, ModelFrontendConfig, SubstrateConfig
+from dsn_connection.data_structures import ModelBackendConfig, ModelChatConfig, ModelConfig, ModelFrontendConfig, SubstrateConfig
+from dsn_connection.peer_routing import peers_from_env
 
 default_chat_config = ModelChatConfig(
     max_session_length=8192,
@@ -10,6 +13,15 @@ default_chat_config = ModelChatConfig(
     generation_params=dict(do_sample=1, temperature=0.6, top_p=0.9),
 )
 
+# Set this to a list of multiaddrs to connect to a private swarm instead of the public one, for example:
+INITIAL_PEERS = [
+    "/ip4/3.17.139.123/tcp/31330/p2p/12D3KooWGmoSHnvRsktrGzNTfCEwzY2TKAYPRtdaA9AwxHwLKfLa"
+]
+
+# SWARM_PEERS adds candidate peers, sessions are routed through the fastest reachable ones,
+# see `dsn_connection.peer_routing`
+INITIAL_PEERS = INITIAL_PEERS + [peer for peer in peers_from_env() if peer not in INITIAL_PEERS]
+
 MODEL_FAMILIES = {
   ModelConfig(
     ModelBackendConfig(repository="Orenguteng/Llama-3.1-8B-Lexi-Uncensored-V2"),
@@ -26,15 +38,10 @@ MODEL_FAMILIES = {
         generation_params=default_chat_config.generation_params,
     ),
     SubstrateConfig(subnet_id=1),
-    ["/ip4/3.17.139.123/tcp/31330/p2p/12D3KooWGmoSHnvRsktrGzNTfCEwzY2TKAYPRtdaA9AwxHwLKfLa"],
+    INITIAL_PEERS,
   ),
 }
 
-# Set this to a list of multiaddrs to connect to a private swarm instead of the public one, for example:
-INITIAL_PEERS = [
-    "/ip4/3.17.139.123/tcp/31330/p2p/12D3KooWGmoSHnvRsktrGzNTfCEwzY2TKAYPRtdaA9AwxHwLKfLa"
-]
-
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
 try:
@@ -44,8 +51,23 @@ try:
 except ImportError:
     has_avx512 = False
 
+# CPU_AUTOTUNE: "cached" applies the calibration stored by `python -m dsn_connection.cpu_autotune`,
+# "on" also calibrates at startup if none is stored, "off" keeps the AVX-512 heuristic below
+CPU_AUTOTUNE = os.getenv("CPU_AUTOTUNE", "cached").lower()
+
+CPU_CONFIG = None
+if DEVICE == "cpu" and CPU_AUTOTUNE != "off":
+    from dsn_connection import cpu_autotune
+
+    try:
+        CPU_CONFIG = cpu_autotune.get_config(allow_calibration=CPU_AUTOTUNE == "on")
+    except Exception as e:
+        cpu_autotune.logger.warning(f"CPU autotuning failed, falling back to defaults: {e}")
+
 if DEVICE == "cuda":
     TORCH_DTYPE = "auto"
+elif CPU_CONFIG is not None:
+    TORCH_DTYPE = cpu_autotune.apply(CPU_CONFIG)
 elif has_avx512:
     TORCH_DTYPE = torch.bfloat16
 else:
@@ -0,0 +1,248 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+"""
+CPU inference autotuning of the torch dtype and intra-op thread count
+
+A short micro-benchmark of transformer-sized matmuls and MLP forward passes is run for each
+candidate configuration, and the fastest one is stored per machine fingerprint. Calibration is
+an explicit step run once per host with this module, `dsn_connection.config` applies the stored
+configuration at startup.
+
+Inter-op threads are left at torch's default, they only parallelize independent operators and
+a decoder's single sequential forward pass has none.
+
+python -m dsn_connection.cpu_autotune
+python -m dsn_connection.cpu_autotune --force
+"""
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "overwatch_node", "cpu_autotune.json")
+
+CANDIDATE_DTYPES = ("float32", "bfloat16")
+
+# A dtype must be at least this much faster than float32 to be picked, bfloat16 loses accuracy
+DTYPE_MARGIN = 0.9
+
+# Hidden size of the micro-benchmark, a scaled down decoder layer
+HIDDEN_SIZE = 1024
+TOKENS = 16
+
+
+def usable_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def physical_cores() -> int:
+    """Physical cores from /proc/cpuinfo, hyperthreads usually only slow matmuls down"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            cores = set()
+            physical_id = None
+            for line in f:
+                if line.startswith("physical id"):
+                    physical_id = line.split(":")[1].strip()
+                elif line.startswith("core id"):
+                    cores.add((physical_id, line.split(":")[1].strip()))
+        if cores:
+            return min(len(cores), usable_cpus())
+    except OSError:
+        pass
+    return usable_cpus()
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def machine_fingerprint() -> str:
+    """Identifies the host and torch build a calibration is valid for"""
+    import torch
+
+    parts = [
+        platform.machine(),
+        _cpu_model(),
+        str(usable_cpus()),
+        str(physical_cores()),
+        torch.__version__,
+        torch.backends.cpu.get_cpu_capability() if hasattr(torch.backends, "cpu") else "",
+    ]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+
+def thread_candidates() -> List[int]:
+    cores = physical_cores()
+    cpus = usable_cpus()
+    return sorted({max(1, cores // 2), cores, cpus})
+
+
+def load_cache(path: str = DEFAULT_CACHE_PATH) -> Dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache: Dict, path: str = DEFAULT_CACHE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _time_forward(dtype_name: str, threads: int, iterations: int) -> Optional[float]:
+    """Median seconds of one matmul plus MLP forward pass, None if the dtype is unsupported"""
+    import torch
+
+    torch.set_num_threads(threads)
+    dtype = getattr(torch, dtype_name)
+    try:
+        generator = torch.Generator().manual_seed(0)
+        x = torch.randn(TOKENS, HIDDEN_SIZE, generator=generator).to(dtype)
+        attention = torch.randn(HIDDEN_SIZE, HIDDEN_SIZE, generator=generator).to(dtype)
+        mlp = torch.nn.Sequential(
+            torch.nn.Linear(HIDDEN_SIZE, 4 * HIDDEN_SIZE),
+            torch.nn.GELU(),
+            torch.nn.Linear(4 * HIDDEN_SIZE, HIDDEN_SIZE),
+        ).to(dtype)
+
+        timings = []
+        with torch.inference_mode():
+            for i in range(iterations + 2):
+                start = time.perf_counter()
+                mlp(x @ attention)
+                if i >= 2:
+                    # The first runs warm up allocators and kernels
+                    timings.append(time.perf_counter() - start)
+    except RuntimeError as e:
+        logger.info(f"{dtype_name} is not supported on this CPU: {e}")
+        return None
+
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def _run_worker(iterations: int) -> List[Dict]:
+    """
+    Benchmarks every dtype and intra-op thread count in a fresh interpreter, so the calling
+    process has run no parallel work yet when the result is applied
+    """
+    result = subprocess.run(
+        [sys.executable, "-m", "dsn_connection.cpu_autotune", "--worker", "--iterations", str(iterations)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        logger.warning(f"Calibration worker failed:\n{result.stderr}")
+        return []
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def calibrate(iterations: int = 20) -> Dict:
+    """Returns the fastest ``{"dtype", "intra_op_threads", "seconds"}``"""
+    results = _run_worker(iterations)
+    if not results:
+        raise RuntimeError("CPU calibration produced no results")
+
+    for result in sorted(results, key=lambda result: result["seconds"]):
+        logger.info(f"{result['dtype']:>9} intra {result['intra_op_threads']:>3}: {result['seconds'] * 1000:.2f} ms")
+
+    best_by_dtype = {}
+    for result in results:
+        if result["dtype"] not in best_by_dtype or result["seconds"] < best_by_dtype[result["dtype"]]["seconds"]:
+            best_by_dtype[result["dtype"]] = result
+
+    best = best_by_dtype.get("float32")
+    for result in best_by_dtype.values():
+        if best is None or result["seconds"] < best["seconds"] * DTYPE_MARGIN:
+            best = result
+    return dict(best, calibrated_at=int(time.time()))
+
+
+def get_config(
+    cache_path: str = DEFAULT_CACHE_PATH,
+    allow_calibration: bool = True,
+    force: bool = False,
+    iterations: int = 20,
+) -> Optional[Dict]:
+    """
+    Returns the stored configuration of this host, calibrating and storing it first if missing.
+    Returns None when there is none and ``allow_calibration`` is off.
+    """
+    fingerprint = machine_fingerprint()
+    cache = load_cache(cache_path)
+    if fingerprint in cache and not force:
+        return cache[fingerprint]
+    if not allow_calibration and not force:
+        logger.info("No CPU calibration stored for this host, run `python -m dsn_connection.cpu_autotune` once")
+        return None
+
+    logger.info("Calibrating CPU inference settings, this runs once per host")
+    config = calibrate(iterations)
+    cache[fingerprint] = config
+    save_cache(cache, cache_path)
+    return config
+
+
+def apply(config: Dict):
+    """Applies the thread count of ``config``, returning its torch dtype"""
+    import torch
+
+    torch.set_num_threads(config["intra_op_threads"])
+    return getattr(torch, config["dtype"])
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="Recalibrate even if this host has a stored configuration")
+    parser.add_argument("--cache_path", type=str, required=False, default=DEFAULT_CACHE_PATH, help="Calibration cache file")
+    parser.add_argument("--iterations", type=int, required=False, default=20, help="Timed forward passes per candidate")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.worker:
+        results = []
+        for dtype in CANDIDATE_DTYPES:
+            for threads in thread_candidates():
+                seconds = _time_forward(dtype, threads, args.iterations)
+                if seconds is not None:
+                    results.append({
+                        "dtype": dtype,
+                        "intra_op_threads": threads,
+                        "seconds": seconds,
+                    })
+        print(json.dumps(results))
+        return
+
+    logging.basicConfig(level=logging.INFO)
+    config = get_config(args.cache_path, force=args.force, iterations=args.iterations)
+    print(json.dumps(config, indent=2))
+
+
+if __name__ == "__main__":
+    main()
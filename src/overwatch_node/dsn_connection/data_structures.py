@@ -9,6 +9,7 @@ class ModelBackendConfig:
     aliases: Sequence[str] = ()
     public_api: bool = True
     subnet_id: int = 0
+    revision: Optional[str] = None  # branch, tag or commit hash, pinned in the snapshot store on first load
 
     @property
     def key(self) -> str:
@@ -0,0 +1,132 @@
+"""
+Batched and incremental detokenization
+
+SentencePiece tokenizers drop the leading space of the first token when decoding, so every
+decode is prefixed with a sentinel token that is stripped from the text afterwards. The
+sentinel id is resolved once per tokenizer instead of re-tokenizing it on every call.
+"""
+import weakref
+from typing import List, Optional, Sequence, Union
+
+import torch
+from transformers import PreTrainedTokenizerBase
+
+SENTINEL = "^"
+
+_sentinel_ids: "weakref.WeakKeyDictionary[PreTrainedTokenizerBase, int]" = weakref.WeakKeyDictionary()
+
+
+def sentinel_id(tokenizer: PreTrainedTokenizerBase) -> int:
+    """Returns the cached id of the sentinel token for ``tokenizer``"""
+    token_id = _sentinel_ids.get(tokenizer)
+    if token_id is None:
+        token_id = tokenizer(SENTINEL, add_special_tokens=False)["input_ids"][0]
+        _sentinel_ids[tokenizer] = token_id
+    return token_id
+
+
+def _to_list(outputs: Union[torch.Tensor, Sequence[int]]) -> List[int]:
+    return outputs.tolist() if isinstance(outputs, torch.Tensor) else list(outputs)
+
+
+def _strip_sentinel(text: str) -> str:
+    # We use .lstrip() since SentencePiece may add leading spaces, e.g. if the outputs are "</s>"
+    return text.lstrip()[len(SENTINEL):]
+
+
+def decode(
+    tokenizer: PreTrainedTokenizerBase,
+    outputs: Union[torch.Tensor, Sequence[int]],
+    skip_special_tokens: bool = False,
+) -> str:
+    """Decodes a single sequence keeping the leading space of its first token"""
+    ids = [sentinel_id(tokenizer)] + _to_list(outputs)
+    return _strip_sentinel(tokenizer.decode(ids, skip_special_tokens=skip_special_tokens))
+
+
+def batch_decode(
+    tokenizer: PreTrainedTokenizerBase,
+    outputs: Union[torch.Tensor, Sequence[Sequence[int]]],
+    skip_special_tokens: bool = False,
+) -> List[str]:
+    """
+    Decodes a batch of sequences in a single tokenizer call
+
+    Args:
+      tokenizer (PreTrainedTokenizerBase): The tokenizer.
+      outputs (Union[torch.Tensor, Sequence[Sequence[int]]]): 2D tensor or list of token id lists.
+      skip_special_tokens (bool): Whether to drop special tokens such as padding.
+
+    Returns:
+      List[str]: The decoded text of each sequence
+    """
+    if isinstance(outputs, torch.Tensor):
+        outputs = outputs.tolist()
+    fake_token = sentinel_id(tokenizer)
+    texts = tokenizer.batch_decode(
+        [[fake_token] + list(ids) for ids in outputs],
+        skip_special_tokens=skip_special_tokens,
+    )
+    return [_strip_sentinel(text) for text in texts]
+
+
+class IncrementalDetokenizer:
+    """
+    Streaming detokenizer that only decodes a small window of tokens per step
+
+    Each step decodes the tokens since the last emitted boundary and returns only the newly
+    completed text. Text ending in an incomplete UTF-8 sequence (``"\\ufffd"``) is held back
+    until the following tokens complete it.
+    """
+
+    def __init__(self, tokenizer: PreTrainedTokenizerBase, skip_special_tokens: bool = False):
+        self.tokenizer = tokenizer
+        self.skip_special_tokens = skip_special_tokens
+        self.token_ids: List[int] = []
+        self.text = ""
+        self._sentinel = sentinel_id(tokenizer)
+        self._prefix_offset = 0
+        self._read_offset = 0
+        self._stop_search_from = 0
+
+    def _decode_window(self, start: int, end: Optional[int] = None) -> str:
+        ids = [self._sentinel] + self.token_ids[start:end]
+        return self.tokenizer.decode(ids, skip_special_tokens=self.skip_special_tokens)
+
+    def step(self, new_token_ids: Union[torch.Tensor, Sequence[int], int]) -> str:
+        """Appends ``new_token_ids`` and returns the text they completed, possibly empty"""
+        if isinstance(new_token_ids, int):
+            self.token_ids.append(new_token_ids)
+        else:
+            self.token_ids.extend(_to_list(new_token_ids))
+
+        # Both windows share the sentinel and prefix tokens, so the difference is exactly the new text
+        prefix_text = self._decode_window(self._prefix_offset, self._read_offset)
+        new_text = self._decode_window(self._prefix_offset)
+
+        if len(new_text) <= len(prefix_text) or new_text.endswith("\ufffd"):
+            return ""
+
+        delta = new_text[len(prefix_text):]
+        self._prefix_offset = self._read_offset
+        self._read_offset = len(self.token_ids)
+        self.text += delta
+        return delta
+
+    def find_stop(self, stop_sequences: Sequence[str]) -> Optional[int]:
+        """
+        Returns the offset in ``text`` where the first stop sequence starts, if any
+
+        Only the text emitted since the previous call (plus enough overlap to catch stop sequences
+        spanning steps) is searched, so checking after every step stays O(new text).
+        """
+        if not stop_sequences:
+            return None
+
+        max_len = max(len(stop) for stop in stop_sequences)
+        start = max(0, self._stop_search_from - max_len + 1)
+        self._stop_search_from = len(self.text)
+
+        positions = [self.text.find(stop, start) for stop in stop_sequences]
+        positions = [position for position in positions if position != -1]
+        return min(positions) if positions else None
@@ -0,0 +1,492 @@
+"""
+Latency-aware routing of inference sessions through swarm peers
+
+`PeerRouter` probes candidate peers for round trip time and throughput and ranks them by the
+expected latency of one inference step. The route is the cheapest chain of peers covering
+every remote block. Step latencies observed during inference feed back into the table. A peer
+on the route that slows down past ``slowdown_factor`` times its usual latency, or keeps
+failing, triggers a new route. Probes only estimate the network part of a step, so a probe
+alone never displaces a route whose latencies were observed.
+
+`RoutedModel` creates a distributed model once, with the route's peers first in
+``initial_peers``, which only orders DHT bootstrap. Route changes are applied through the
+client's ``allowed_servers`` and ``blocked_servers`` when its sequence manager has them. Other
+clients keep their own routing and the router only reports on the swarm.
+
+``python -m dsn_connection.simulated_swarm`` runs the router against local peers with
+injected latencies.
+"""
+import heapq
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from metrics.node_metrics import PEER_RTT, PEER_STEP_LATENCY, ROUTE_CHANGES, ROUTE_PEERS
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.3
+
+# Observed step latencies older than this fall back to probe estimates, so peers routed away
+# from after a slowdown are reconsidered once their probes recover
+OBSERVATION_TTL = 300.0
+
+PROBE_TIMEOUT = 5.0
+
+# Hidden states sent per generated token, 4096 dims of an 8B model in 16-bit
+STEP_BYTES = 4096 * 2
+
+
+def peers_from_env() -> List[str]:
+    """Returns candidate peer multiaddrs from ``SWARM_PEERS`` (comma separated)"""
+    multiaddrs = os.getenv('SWARM_PEERS')
+    if not multiaddrs:
+        return []
+    return [multiaddr.strip() for multiaddr in multiaddrs.split(",") if multiaddr.strip()]
+
+
+@dataclass(frozen=True)
+class Peer:
+    """
+    Dataclass for a swarm peer and the span of blocks it serves, an ``end_block`` of None
+    means every block from ``start_block`` on.
+    """
+
+    multiaddr: str
+    host: str
+    port: int
+    peer_id: Optional[str] = None
+    start_block: int = 0
+    end_block: Optional[int] = None
+
+    @classmethod
+    def from_multiaddr(cls, multiaddr: str, start_block: int = 0, end_block: Optional[int] = None) -> "Peer":
+        parts = multiaddr.strip("/").split("/")
+        protocols = dict(zip(parts[::2], parts[1::2]))
+        host = next((protocols[name] for name in ("ip4", "ip6", "dns4", "dns6", "dns") if name in protocols), None)
+        if host is None or "tcp" not in protocols:
+            raise ValueError(f"Unsupported multiaddr {multiaddr}, expected /<ip4|ip6|dns>/<host>/tcp/<port>[/p2p/<id>]")
+        return cls(multiaddr, host, int(protocols["tcp"]), protocols.get("p2p"), start_block, end_block)
+
+    @property
+    def name(self) -> str:
+        return self.peer_id or f"{self.host}:{self.port}"
+
+    def serves(self, block: int) -> bool:
+        return self.start_block <= block and (self.end_block is None or block < self.end_block)
+
+
+@dataclass
+class ProbeResult:
+    """
+    Dataclass for one probe of a peer, ``throughput`` in bytes per second is None when the
+    probe can't measure it.
+    """
+
+    rtt: float
+    throughput: Optional[float] = None
+
+
+def tcp_probe(peer: Peer, timeout: float = PROBE_TIMEOUT) -> ProbeResult:
+    """Measures the TCP handshake time to a peer, which any libp2p peer answers"""
+    start = time.perf_counter()
+    with socket.create_connection((peer.host, peer.port), timeout=timeout):
+        pass
+    return ProbeResult(rtt=time.perf_counter() - start)
+
+
+@dataclass
+class PeerStats:
+    """
+    Dataclass for the probed and observed performance of one peer.
+    """
+
+    peer: Peer
+    rtt: Optional[float] = None
+    throughput: Optional[float] = None
+    step_latency: Optional[float] = None
+    observed_at: float = 0.0
+    failures: int = 0
+    unhealthy_until: float = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def observed_latency(self, now: float) -> Optional[float]:
+        if self.step_latency is not None and now - self.observed_at < OBSERVATION_TTL:
+            return self.step_latency
+        return None
+
+    def cost(self, step_bytes: int, now: float) -> float:
+        """Expected seconds per step, observed latency if recent, otherwise estimated from probes"""
+        observed = self.observed_latency(now)
+        if observed is not None:
+            return observed
+        if self.rtt is None:
+            # Unprobed peers rank behind every probed one
+            return PROBE_TIMEOUT
+        return self.rtt + (step_bytes / self.throughput if self.throughput else 0.0)
+
+
+class NoRouteError(Exception):
+    pass
+
+
+def _ewma(current: Optional[float], sample: float) -> float:
+    return sample if current is None else EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * current
+
+
+class PeerRouter:
+    def __init__(
+        self,
+        peers: Sequence[Peer],
+        num_blocks: Optional[int] = None,
+        prober: Callable[[Peer], ProbeResult] = tcp_probe,
+        probe_interval: float = 60.0,
+        slowdown_factor: float = 2.0,
+        failure_threshold: int = 2,
+        cooldown: float = 60.0,
+        hysteresis: float = 0.2,
+        step_bytes: int = STEP_BYTES,
+    ):
+        """
+        :param peers: candidate peers, at least one
+        :param num_blocks: remote blocks a route has to cover, None routes through the single
+            best peer, e.g. when the peers' spans aren't known
+        :param prober: measures one peer, raising on failure
+        :param probe_interval: seconds between background probes
+        :param slowdown_factor: a step this many times slower than a peer's average reroutes
+        :param failure_threshold: consecutive failures before a peer is taken out of rotation
+        :param cooldown: seconds an unhealthy peer stays out of rotation before it is retried
+        :param hysteresis: fraction a new route has to be cheaper by to replace a working one
+        :param step_bytes: bytes sent to a peer per step, turns probed throughput into seconds
+        """
+        if not peers:
+            raise ValueError("At least one swarm peer is required")
+        self.stats = {peer.name: PeerStats(peer) for peer in peers}
+        self.num_blocks = num_blocks
+        self.prober = prober
+        self.probe_interval = probe_interval
+        self.slowdown_factor = slowdown_factor
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hysteresis = hysteresis
+        self.step_bytes = step_bytes
+        # Incremented on every route change, `RoutedModel` re-steers its client when it moves
+        self.version = 0
+        self._route: Optional[List[Peer]] = None
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=min(16, len(self.stats)), thread_name_prefix="peer-probe")
+        self._stop = threading.Event()
+        self._probe_thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_multiaddrs(cls, multiaddrs: Sequence[str], **kwargs) -> "PeerRouter":
+        # The same peer may be listed by several model families
+        return cls([Peer.from_multiaddr(multiaddr) for multiaddr in dict.fromkeys(multiaddrs)], **kwargs)
+
+    def _stats(self, peer) -> PeerStats:
+        return self.stats[peer if isinstance(peer, str) else peer.name]
+
+    def _record_failure(self, stats: PeerStats, error: Optional[Exception]):
+        stats.failures += 1
+        if stats.failures >= self.failure_threshold:
+            stats.unhealthy_until = time.monotonic() + self.cooldown
+        logger.warning(f"Swarm peer {stats.peer.name} failed ({stats.failures} in a row): {error}")
+
+    def ranked(self) -> List[PeerStats]:
+        """Healthy peers cheapest first, followed by unhealthy ones soonest-to-recover first"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [stats for stats in self.stats.values() if stats.healthy]
+            unhealthy = [stats for stats in self.stats.values() if not stats.healthy]
+            healthy.sort(key=lambda stats: stats.cost(self.step_bytes, now))
+            unhealthy.sort(key=lambda stats: stats.unhealthy_until)
+        return healthy + unhealthy
+
+    def _route_cost(self, route: Sequence[Peer], now: float) -> float:
+        return sum(self._stats(peer).cost(self.step_bytes, now) for peer in route)
+
+    def _observed(self, route: Sequence[Peer], now: float) -> bool:
+        return all(self._stats(peer).observed_latency(now) is not None for peer in route)
+
+    def _find_route(self, candidates: List[PeerStats], now: float) -> Optional[Tuple[float, List[Peer]]]:
+        if self.num_blocks is None:
+            if not candidates:
+                return None
+            best = min(candidates, key=lambda stats: stats.cost(self.step_bytes, now))
+            return best.cost(self.step_bytes, now), [best.peer]
+
+        # Shortest path over block positions, each peer is an edge from a block it serves to
+        # the end of its span
+        costs = [(stats.cost(self.step_bytes, now), stats.peer) for stats in candidates]
+        best = {0: 0.0}
+        previous = {}
+        heap = [(0.0, 0)]
+        while heap:
+            cost, block = heapq.heappop(heap)
+            if block == self.num_blocks:
+                route = []
+                while block != 0:
+                    block, peer = previous[block]
+                    route.append(peer)
+                return cost, route[::-1]
+            if cost > best[block]:
+                continue
+            for peer_cost, peer in costs:
+                if not peer.serves(block):
+                    continue
+                end = self.num_blocks if peer.end_block is None else min(peer.end_block, self.num_blocks)
+                if cost + peer_cost < best.get(end, float("inf")):
+                    best[end] = cost + peer_cost
+                    previous[end] = (block, peer)
+                    heapq.heappush(heap, (cost + peer_cost, end))
+        return None
+
+    @property
+    def route(self) -> List[Peer]:
+        with self._lock:
+            if self._route is None:
+                self.reroute("initial")
+            return list(self._route)
+
+    def reroute(self, reason: str) -> bool:
+        """
+        Recomputes the route and switches to it if the current one has an unhealthy peer or the
+        new one is cheaper by more than the hysteresis. Returns whether the route changed.
+
+        A probe reroute only compares like with like. Probe estimates lack the peers' compute
+        time, so a route with estimated peers does not replace an observed one. Slowdowns and
+        failures move off the current route on estimates.
+        """
+        now = time.monotonic()
+        with self._lock:
+            found = self._find_route([stats for stats in self.stats.values() if stats.healthy], now)
+            if found is None:
+                # Rather a route through peers in cooldown than none at all
+                found = self._find_route(list(self.stats.values()), now)
+            if found is None:
+                raise NoRouteError(f"No route of {len(self.stats)} swarm peers covers {self.num_blocks} blocks")
+            cost, route = found
+
+            current = self._route
+            if current is not None:
+                if route == current:
+                    return False
+                current_healthy = all(self._stats(peer).healthy for peer in current)
+                if current_healthy and cost >= self._route_cost(current, now) * (1 - self.hysteresis):
+                    return False
+                if (
+                    current_healthy and reason == "probe"
+                    and self._observed(current, now) and not self._observed(route, now)
+                ):
+                    return False
+
+            self._route = route
+            self.version += 1
+            for stats in self.stats.values():
+                ROUTE_PEERS.labels(peer=stats.peer.name).set(1 if stats.peer in route else 0)
+        ROUTE_CHANGES.labels(reason=reason).inc()
+        logger.info(
+            f"Routing swarm sessions through {' -> '.join(peer.name for peer in route)} "
+            f"({reason}, {cost * 1000:.1f} ms per step)"
+        )
+        return True
+
+    def observe(self, peer, seconds: float, ok: bool = True, error: Optional[Exception] = None):
+        """
+        Records one step served by ``peer`` (a `Peer` or its name), rerouting if a peer on the
+        route slowed down or became unhealthy
+        """
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats(peer)
+            on_route = self._route is not None and stats.peer in self._route
+            if not ok:
+                self._record_failure(stats, error)
+                if on_route and not stats.healthy:
+                    self.reroute("failure")
+                return
+
+            usual = stats.observed_latency(now)
+            slow = usual is not None and seconds > self.slowdown_factor * usual
+            # A slowdown replaces the average instead of being smoothed into it, so the
+            # reroute below sees the peer's current latency
+            stats.step_latency = seconds if slow else _ewma(usual, seconds)
+            stats.observed_at = now
+            stats.failures = 0
+            stats.unhealthy_until = 0.0
+            PEER_STEP_LATENCY.labels(peer=stats.peer.name).set(stats.step_latency)
+            if slow and on_route:
+                logger.warning(f"Swarm peer {stats.peer.name} slowed down from {usual * 1000:.1f} to {seconds * 1000:.1f} ms")
+                self.reroute("slowdown")
+
+    def observe_route(self, seconds: float, ok: bool = True, error: Optional[Exception] = None):
+        """
+        Records a step timed over the whole route, for clients that don't report per-peer
+        timings. The time is split over the route's peers in proportion to their expected cost.
+        """
+        now = time.monotonic()
+        with self._lock:
+            route = self.route
+            costs = [self._stats(peer).cost(self.step_bytes, now) for peer in route]
+            total = sum(costs) or 1.0
+            for peer, cost in zip(route, costs):
+                self.observe(peer, seconds * cost / total, ok=ok, error=error)
+
+    def probe(self):
+        """Probes every peer once, concurrently, then reroutes if a cheaper route appeared"""
+        def probe_one(stats: PeerStats):
+            try:
+                result = self.prober(stats.peer)
+            except Exception as e:
+                with self._lock:
+                    self._record_failure(stats, e)
+                return
+            with self._lock:
+                stats.rtt = _ewma(stats.rtt, result.rtt)
+                if result.throughput:
+                    stats.throughput = _ewma(stats.throughput, result.throughput)
+                stats.failures = 0
+                stats.unhealthy_until = 0.0
+            PEER_RTT.labels(peer=stats.peer.name).set(stats.rtt)
+
+        list(self._executor.map(probe_one, list(self.stats.values())))
+        self.reroute("probe")
+
+    def start_probing(self):
+        if self._probe_thread is not None:
+            return
+
+        # Callers probe once up front to pick the first route, the thread keeps it fresh
+        def run():
+            while not self._stop.wait(self.probe_interval):
+                try:
+                    self.probe()
+                except NoRouteError as e:
+                    logger.warning(str(e))
+
+        self._probe_thread = threading.Thread(target=run, name="peer-probe", daemon=True)
+        self._probe_thread.start()
+
+    def initial_peers(self) -> List[str]:
+        """Multiaddrs of the route first, followed by the other peers cheapest first"""
+        route = self.route
+        rest = [stats.peer for stats in self.ranked() if stats.peer not in route]
+        return [peer.multiaddr for peer in route + rest]
+
+    def server_lists(self) -> Tuple[Optional[List[str]], List[str]]:
+        """
+        Peer ids for a client's ``(allowed_servers, blocked_servers)``. Only a route covering
+        every block by peers with known ids is allowed exclusively, otherwise allowed is None
+        and only peers in cooldown are blocked.
+        """
+        with self._lock:
+            route = self.route
+            allowed = None
+            if self.num_blocks is not None and all(peer.peer_id for peer in route):
+                allowed = [peer.peer_id for peer in route]
+            blocked = [
+                stats.peer.peer_id for stats in self.stats.values()
+                if stats.peer.peer_id and not stats.healthy and stats.peer not in route
+            ]
+        return allowed, blocked
+
+    def close(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+
+
+def _generated_tokens(output, args, kwargs) -> int:
+    """New tokens per row of a generate call, decoder-only outputs start with the prompt"""
+    shape = getattr(output, "shape", None)
+    if not shape:
+        return 1
+    inputs = kwargs.get("input_ids", args[0] if args else None)
+    prompt_shape = getattr(inputs, "shape", None)
+    return max(1, int(shape[-1]) - (int(prompt_shape[-1]) if prompt_shape else 0))
+
+
+def _sequence_managers(model) -> List[Any]:
+    """Sequence managers of the model's remote blocks that take server allow and block lists"""
+    modules = model.modules() if hasattr(model, "modules") else [model]
+    managers = [module.sequence_manager for module in modules if hasattr(module, "sequence_manager")]
+    return [
+        manager for manager in managers
+        if hasattr(manager, "allowed_servers") and hasattr(manager, "blocked_servers")
+    ]
+
+
+def _hypermind_peer_id(peer_id: str):
+    from hypermind import PeerID
+
+    return PeerID.from_base58(peer_id)
+
+
+@dataclass
+class RoutedModel:
+    """
+    Dataclass for a distributed model created once by ``factory(initial_peers)`` and steered
+    onto its router's route through the server lists of its sequence managers. Generate calls
+    are timed per new token and fed back into the router.
+    """
+
+    factory: Callable[[List[str]], Any]
+    router: PeerRouter
+    model: Any = field(default=None, repr=False)
+    version: Optional[int] = None
+    to_peer_id: Callable[[str], Any] = _hypermind_peer_id
+    steerable: Optional[bool] = None
+
+    def __post_init__(self):
+        self._ensure_route()
+
+    def _ensure_route(self):
+        if self.model is None:
+            self.model = self.factory(self.router.initial_peers())
+        if self.version != self.router.version:
+            self.version = self.router.version
+            self._steer()
+
+    def _steer(self):
+        managers = _sequence_managers(self.model)
+        if not managers:
+            if self.steerable is None:
+                logger.warning(
+                    "Swarm routing can't be steered, the client has no server allow or block lists. "
+                    "Sessions use the client's own routing and the router only reports on peers"
+                )
+            self.steerable = False
+            return
+
+        self.steerable = True
+        allowed, blocked = self.router.server_lists()
+        for manager in managers:
+            manager.allowed_servers = None if allowed is None else {self.to_peer_id(peer_id) for peer_id in allowed}
+            manager.blocked_servers = {self.to_peer_id(peer_id) for peer_id in blocked}
+            if hasattr(manager, "update"):
+                # Spans are recomputed from the DHT with the new lists on the next update
+                manager.update(wait=False)
+
+    def generate(self, *args, **kwargs):
+        self._ensure_route()
+        start = time.perf_counter()
+        try:
+            output = self.model.generate(*args, **kwargs)
+        except Exception as e:
+            self.router.observe_route(time.perf_counter() - start, ok=False, error=e)
+            raise
+        self.router.observe_route((time.perf_counter() - start) / _generated_tokens(output, args, kwargs))
+        return output
+
+    def __getattr__(self, name):
+        if name in ("factory", "router", "model", "version", "to_peer_id", "steerable"):
+            raise AttributeError(name)
+        return getattr(self.model, name)
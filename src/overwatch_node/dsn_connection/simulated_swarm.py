@@ -0,0 +1,346 @@
+import argparse
+import random
+import socket
+import socketserver
+import statistics
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+
+from dsn_connection.peer_routing import STEP_BYTES, Peer, PeerRouter, ProbeResult, RoutedModel
+
+"""
+Local swarm of simulated peers with injected latencies to exercise `PeerRouter`
+
+Every peer is a TCP server on localhost that serves a span of blocks. It answers a step
+after its injected latency plus jitter and reads the payload at its injected bandwidth. The
+run probes the swarm and then runs inference steps hop by hop through the chosen route. Part
+way through, one peer on the route is slowed down, and the run checks that the router moves
+off it within a few steps. Step latencies are compared with the static route the bootstrap
+list would give.
+
+A second run generates through a `RoutedModel` around a `SimulatedClient`, which times whole
+generate calls like a real client. It checks that the slowed peer is routed around through the
+client's server lists, without recreating the model, and that the per-token latencies fed to
+the router don't count prompt tokens.
+
+python -m dsn_connection.simulated_swarm
+python -m dsn_connection.simulated_swarm --peers 12 --blocks 32 --steps 100 --slowdown 0.2
+"""
+
+PROBE_BYTES = 256 * 1024
+
+
+@dataclass
+class SimulatedPeer:
+    """
+    Dataclass for a simulated peer, the latency, jitter and bandwidth can be changed while it runs.
+    """
+
+    start_block: int
+    end_block: int
+    latency: float
+    bandwidth: float
+    jitter: float = 0.0
+    fail_rate: float = 0.0
+    server: Optional[socketserver.ThreadingTCPServer] = field(default=None, repr=False)
+
+    @property
+    def peer(self) -> Peer:
+        host, port = self.server.server_address
+        peer_id = f"SimPeer{port}"
+        return Peer(f"/ip4/{host}/tcp/{port}/p2p/{peer_id}", host, port, peer_id, self.start_block, self.end_block)
+
+
+def _handler(simulated: SimulatedPeer):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            # Protocol: "STEP <payload bytes>\n" and the payload, answered with "OK\n"
+            line = self.rfile.readline()
+            if not line.startswith(b"STEP "):
+                return
+            if random.random() < simulated.fail_rate:
+                return
+            size = int(line.split()[1])
+            time.sleep(simulated.latency + random.uniform(0, simulated.jitter))
+            self.rfile.read(size)
+            time.sleep(size / simulated.bandwidth)
+            self.wfile.write(b"OK\n")
+
+    return Handler
+
+
+class SimulatedSwarm:
+    def __init__(self, peers: List[SimulatedPeer]):
+        self.peers = peers
+
+    def __enter__(self):
+        for simulated in self.peers:
+            simulated.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _handler(simulated))
+            simulated.server.daemon_threads = True
+            threading.Thread(target=simulated.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for simulated in self.peers:
+            simulated.server.shutdown()
+            simulated.server.server_close()
+        return False
+
+    def by_peer(self, peer: Peer) -> SimulatedPeer:
+        return next(simulated for simulated in self.peers if simulated.peer == peer)
+
+
+def send_step(peer: Peer, size: int, timeout: float = 10.0) -> float:
+    """Sends one step to a simulated peer and returns the seconds until it answered"""
+    start = time.perf_counter()
+    with socket.create_connection((peer.host, peer.port), timeout=timeout) as connection:
+        connection.sendall(b"STEP %d\n" % size + bytes(size))
+        if not connection.makefile("rb").readline().startswith(b"OK"):
+            raise ConnectionError(f"Simulated peer {peer.name} dropped the step")
+    return time.perf_counter() - start
+
+
+def probe(peer: Peer) -> ProbeResult:
+    """Measures RTT with an empty step and throughput with a `PROBE_BYTES` one"""
+    rtt = send_step(peer, 0)
+    transfer = send_step(peer, PROBE_BYTES)
+    return ProbeResult(rtt=rtt, throughput=PROBE_BYTES / max(transfer - rtt, 1e-6))
+
+
+def random_swarm(count: int, num_blocks: int, rng: random.Random) -> List[SimulatedPeer]:
+    """Peers with random latencies and spans, the first two cover the blocks between them"""
+    half = num_blocks // 2
+    spans = [(0, half), (half, num_blocks)]
+    while len(spans) < count:
+        length = rng.randint(max(1, num_blocks // 4), num_blocks)
+        start = rng.randint(0, num_blocks - length)
+        spans.append((start, start + length))
+    return [
+        SimulatedPeer(
+            start_block=start,
+            end_block=end,
+            latency=rng.uniform(0.005, 0.05),
+            bandwidth=rng.uniform(5e6, 100e6),
+            jitter=0.002,
+        )
+        for start, end in spans
+    ]
+
+
+def static_route(peers: List[Peer], num_blocks: int) -> List[Peer]:
+    """The route of a client taking the first listed peer serving each next block"""
+    route, block = [], 0
+    while block < num_blocks:
+        peer = next(peer for peer in peers if peer.serves(block))
+        route.append(peer)
+        block = peer.end_block
+    return route
+
+
+def covers(peers: List[Peer], num_blocks: int) -> bool:
+    reachable = 0
+    for peer in sorted(peers, key=lambda peer: peer.start_block):
+        if peer.start_block > reachable:
+            break
+        reachable = max(reachable, peer.end_block)
+    return reachable >= num_blocks
+
+
+def run_step(router: PeerRouter, step_bytes: int) -> float:
+    """Runs one step hop by hop through the router's route, reporting each hop to the router"""
+    total = 0.0
+    for peer in router.route:
+        try:
+            seconds = send_step(peer, step_bytes)
+        except Exception as e:
+            router.observe(peer, 0.0, ok=False, error=e)
+            raise
+        router.observe(peer, seconds)
+        total += seconds
+    return total
+
+
+class SimulatedSequenceManager:
+    """Stand-in for a client's sequence manager, holding the server lists `RoutedModel` sets"""
+
+    def __init__(self):
+        self.allowed_servers = None
+        self.blocked_servers = set()
+        self.updates = 0
+
+    def update(self, wait: bool):
+        self.updates += 1
+
+
+class SimulatedClient:
+    """
+    Distributed model stand-in generating token by token through the swarm. Like a client
+    without a router it takes the first listed peer serving each next block, among the peers
+    its server lists allow.
+    """
+
+    def __init__(self, peers: List[Peer], num_blocks: int, step_bytes: int):
+        self.peers = peers
+        self.num_blocks = num_blocks
+        self.step_bytes = step_bytes
+        self.sequence_manager = SimulatedSequenceManager()
+        self.route: List[Peer] = []
+
+    def generate(self, input_ids, max_new_tokens: int = 1):
+        manager = self.sequence_manager
+        usable = [
+            peer for peer in self.peers
+            if peer.peer_id not in manager.blocked_servers
+            and (manager.allowed_servers is None or peer.peer_id in manager.allowed_servers)
+        ]
+        self.route = static_route(usable, self.num_blocks)
+        for _ in range(max_new_tokens):
+            for peer in self.route:
+                send_step(peer, self.step_bytes)
+        return np.zeros((1, input_ids.shape[-1] + max_new_tokens), dtype=np.int64)
+
+
+def run_routed_model(swarm: SimulatedSwarm, args) -> List[str]:
+    """Generates through a `RoutedModel`, slowing a client route peer down part way through"""
+    peers = [simulated.peer for simulated in swarm.peers]
+    by_multiaddr = {peer.multiaddr: peer for peer in peers}
+    clients = []
+
+    def factory(initial_peers: List[str]) -> SimulatedClient:
+        clients.append(SimulatedClient([by_multiaddr[multiaddr] for multiaddr in initial_peers], args.blocks, STEP_BYTES))
+        return clients[-1]
+
+    errors = []
+    router = PeerRouter(peers, num_blocks=args.blocks, prober=probe, step_bytes=STEP_BYTES)
+    router.probe()
+    try:
+        model = RoutedModel(factory, router, to_peer_id=str)
+        prompt = np.zeros((1, args.prompt_tokens), dtype=np.int64)
+        slowed, moved_after = None, None
+        for step in range(args.steps):
+            client = model.model
+            if step == args.slowdown_at:
+                slowed = next(
+                    (peer for peer in client.route if covers([other for other in peers if other != peer], args.blocks)),
+                    None,
+                )
+                if slowed is not None:
+                    swarm.by_peer(slowed).latency += args.slowdown
+            start = time.perf_counter()
+            model.generate(prompt, max_new_tokens=args.new_tokens)
+            per_token = (time.perf_counter() - start) / args.new_tokens
+
+            if step == 0:
+                # observe_route splits the per-token time over the route
+                observed = sum(router.stats[peer.name].step_latency for peer in router.route)
+                if not 0.5 < observed / per_token < 2.0:
+                    errors.append(
+                        f"Router observed {observed * 1000:.1f} ms per token, generate took {per_token * 1000:.1f} ms"
+                    )
+            if slowed is not None and moved_after is None and slowed not in client.route:
+                moved_after = step - args.slowdown_at
+        if slowed is not None:
+            swarm.by_peer(slowed).latency -= args.slowdown
+    finally:
+        router.close()
+
+    if len(clients) != 1:
+        errors.append(f"The routed model was created {len(clients)} times, route changes must not reload it")
+    if slowed is not None and (moved_after is None or moved_after > args.max_reroute_steps):
+        errors.append(f"Routed model did not move off the slowed peer within {args.max_reroute_steps} steps")
+    elif slowed is not None:
+        print(f"Routed model moved off the slowed peer after {moved_after} step(s), its client was created once")
+    return errors
+
+
+def describe(route: List[Peer]) -> str:
+    return " -> ".join(f"{peer.port}[{peer.start_block}:{peer.end_block}]" for peer in route)
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--peers", type=int, required=False, default=8, help="Simulated peers")
+    parser.add_argument("--blocks", type=int, required=False, default=32, help="Remote blocks a route has to cover")
+    parser.add_argument("--steps", type=int, required=False, default=60, help="Inference steps to run")
+    parser.add_argument("--slowdown_at", type=int, required=False, default=20, help="Step at which a route peer slows down")
+    parser.add_argument("--slowdown", type=float, required=False, default=0.2, help="Latency added to the slowed peer in seconds")
+    parser.add_argument("--max_reroute_steps", type=int, required=False, default=2, help="Steps the router may take to move off the slowed peer")
+    parser.add_argument("--prompt_tokens", type=int, required=False, default=32, help="Prompt tokens of the routed model's generate calls")
+    parser.add_argument("--new_tokens", type=int, required=False, default=4, help="Tokens generated per routed model call")
+    parser.add_argument("--seed", type=int, required=False, default=0, help="Random seed")
+
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with SimulatedSwarm(random_swarm(args.peers, args.blocks, rng)) as swarm:
+        peers = [simulated.peer for simulated in swarm.peers]
+        router = PeerRouter(peers, num_blocks=args.blocks, prober=probe, step_bytes=STEP_BYTES)
+        router.probe()
+        try:
+            print(f"{'port':>6}{'blocks':>10}{'latency (ms)':>14}{'probed rtt (ms)':>17}{'MB/s':>8}")
+            for stats in router.ranked():
+                simulated = swarm.by_peer(stats.peer)
+                print(
+                    f"{stats.peer.port:>6}{f'{simulated.start_block}:{simulated.end_block}':>10}"
+                    f"{simulated.latency * 1000:>14.1f}{stats.rtt * 1000:>17.1f}{stats.throughput / 1e6:>8.1f}"
+                )
+
+            baseline = static_route(peers, args.blocks)
+            baseline_times = [sum(send_step(peer, STEP_BYTES) for peer in baseline) for _ in range(5)]
+
+            print(f"\nstatic route: {describe(baseline)}")
+            print(f"chosen route: {describe(router.route)}")
+
+            times, slowed, moved_after = [], None, None
+            for step in range(args.steps):
+                if step == args.slowdown_at:
+                    # Only a peer the swarm can route around is slowed down
+                    slowed = next(
+                        (peer for peer in router.route if covers([other for other in peers if other != peer], args.blocks)),
+                        None,
+                    )
+                    if slowed is None:
+                        print(f"step {step}: every peer on the route is irreplaceable, not slowing any down")
+                    else:
+                        swarm.by_peer(slowed).latency += args.slowdown
+                        print(f"step {step}: slowing down {slowed.port} by {args.slowdown * 1000:.0f} ms")
+                version = router.version
+                times.append(run_step(router, STEP_BYTES))
+                if router.version != version:
+                    print(f"step {step}: rerouted to {describe(router.route)}")
+                if slowed is not None and moved_after is None and slowed not in router.route:
+                    moved_after = step - args.slowdown_at + 1
+        finally:
+            router.close()
+
+        if slowed is not None:
+            swarm.by_peer(slowed).latency -= args.slowdown
+        print("\nrouted model:")
+        routed_errors = run_routed_model(swarm, args)
+
+    before = times[:args.slowdown_at]
+    after = times[args.slowdown_at + (moved_after or 0):]
+    print(f"\n{'':>24}{'mean step (ms)':>16}")
+    print(f"{'static route':>24}{statistics.mean(baseline_times) * 1000:>16.1f}")
+    print(f"{'routed, before slowdown':>24}{statistics.mean(before) * 1000:>16.1f}")
+    if slowed is not None and after:
+        print(f"{'routed, after reroute':>24}{statistics.mean(after) * 1000:>16.1f}")
+
+    errors = list(routed_errors)
+    if slowed is not None and (moved_after is None or moved_after > args.max_reroute_steps):
+        errors.insert(0, f"Router did not move off the slowed peer within {args.max_reroute_steps} steps")
+    elif slowed is not None:
+        print(f"Moved off the slowed peer after {moved_after} step(s)")
+    for error in errors:
+        print(error, file=sys.stderr)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import json
+import os
+import re
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+"""
+Local snapshot store of model checkpoints with pinned revisions and memory-mapped local weights
+
+The first load of a repository at a revision resolves it to a commit hash and pins it in the
+store's manifest under the repository and revision, so restarts load that exact snapshot from disk without resolving anything
+over the network. The locally held parameters (embeddings, final norm, LM head, everything
+that isn't a remote transformer block) are extracted once into a single safetensors file in
+the inference dtype and memory-mapped on load. Tensors point straight into the mapping, so
+the OS page cache holding them is shared by every worker process on the host instead of each
+process keeping its own copy.
+"""
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "overwatch_node", "snapshots")
+
+MANIFEST_FILE = "manifest.json"
+
+# Configs, tokenizer and the shard index, the weight shards are picked from the index
+SNAPSHOT_PATTERNS = ["*.json", "tokenizer*", "*.model"]
+
+# Weight map of a sharded checkpoint, and the file of an unsharded one
+SAFETENSORS_INDEX_FILE = "model.safetensors.index.json"
+SAFETENSORS_FILE = "model.safetensors"
+
+# Parameters of transformer blocks, which the swarm serves, everything else is held locally
+REMOTE_BLOCK_PATTERN = re.compile(r"(^|\.)(layers|h|blocks)\.\d+\.")
+
+# safetensors dtype -> numpy dtype of the raw data, bfloat16 has no numpy dtype and is read as uint16
+SAFETENSORS_DTYPES = {
+    "F64": np.float64,
+    "F32": np.float32,
+    "F16": np.float16,
+    "BF16": np.uint16,
+    "I64": np.int64,
+    "I32": np.int32,
+    "I16": np.int16,
+    "I8": np.int8,
+    "U8": np.uint8,
+    "BOOL": np.bool_,
+}
+
+_COMMIT_HASH = re.compile(r"^[0-9a-f]{40}$")
+
+
+def read_header(path: str) -> Tuple[Dict, int]:
+    """Returns the safetensors header and the offset where tensor data starts"""
+    with open(path, "rb") as f:
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+    return header, 8 + header_size
+
+
+def mmap_arrays(path: str) -> Dict[str, Tuple[np.ndarray, str]]:
+    """
+    Maps a safetensors file and returns ``{name: (array, safetensors dtype)}`` viewing the
+    mapping without copying.
+
+    The mapping is copy-on-write, so pages stay shared between processes unless a process
+    writes to a tensor.
+    """
+    header, data_start = read_header(path)
+    mapping = np.memmap(path, dtype=np.uint8, mode="c")
+    arrays = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        start, end = info["data_offsets"]
+        raw = mapping[data_start + start:data_start + end]
+        arrays[name] = (raw.view(SAFETENSORS_DTYPES[info["dtype"]]).reshape(info["shape"]), info["dtype"])
+    return arrays
+
+
+def load_mmap(path: str) -> Dict:
+    """Returns ``{name: torch.Tensor}`` backed by the memory-mapped file"""
+    import torch
+
+    tensors = {}
+    for name, (array, dtype) in mmap_arrays(path).items():
+        tensor = torch.from_numpy(array)
+        if dtype == "BF16":
+            tensor = tensor.view(torch.bfloat16)
+        tensors[name] = tensor
+    return tensors
+
+
+def is_local_parameter(name: str) -> bool:
+    return REMOTE_BLOCK_PATTERN.search(name) is None
+
+
+def local_shards(snapshot_dir: str) -> List[str]:
+    """
+    Returns the checkpoint files holding locally held parameters, from the shard index of a
+    sharded checkpoint. Shards holding only remote blocks are left out.
+    """
+    index_path = os.path.join(snapshot_dir, SAFETENSORS_INDEX_FILE)
+    if not os.path.exists(index_path):
+        return [SAFETENSORS_FILE]
+    with open(index_path) as f:
+        weight_map = json.load(f)["weight_map"]
+    return sorted({file_name for name, file_name in weight_map.items() if is_local_parameter(name)})
+
+
+def extract_local_weights(snapshot_dir: str, out_path: str, dtype) -> int:
+    """
+    Copies the locally held parameters of the checkpoint shards in ``snapshot_dir`` that hold
+    any into one safetensors file in ``dtype``. Returns the number of tensors written.
+    """
+    from safetensors import safe_open
+    from safetensors.torch import save_file
+
+    tensors = {}
+    for file_name in local_shards(snapshot_dir):
+        if not os.path.exists(os.path.join(snapshot_dir, file_name)):
+            continue
+        with safe_open(os.path.join(snapshot_dir, file_name), framework="pt") as f:
+            for name in f.keys():
+                if is_local_parameter(name):
+                    tensor = f.get_tensor(name)
+                    tensors[name] = tensor.to(dtype) if tensor.is_floating_point() else tensor
+    if not tensors:
+        raise ValueError(f"No safetensors weights found in {snapshot_dir}")
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(out_path), suffix=".tmp")
+    os.close(fd)
+    save_file({name: tensor.contiguous() for name, tensor in tensors.items()}, tmp_path)
+    os.replace(tmp_path, out_path)
+    return len(tensors)
+
+
+def share_weights(model, tensors: Dict) -> int:
+    """
+    Points the model's matching CPU parameters and buffers at the memory-mapped ``tensors``,
+    releasing the private copies loaded by ``from_pretrained``. Returns how many were shared.
+    """
+    import torch
+
+    shared = 0
+    state = model.state_dict(keep_vars=True)
+    for name, tensor in tensors.items():
+        current = state.get(name)
+        if current is None or current.device.type != "cpu":
+            continue
+        if current.shape != tensor.shape or current.dtype != tensor.dtype:
+            continue
+        module_name, _, attribute = name.rpartition(".")
+        module = model.get_submodule(module_name) if module_name else model
+        with torch.no_grad():
+            if attribute in module._parameters:
+                module._parameters[attribute] = torch.nn.Parameter(tensor, requires_grad=False)
+            elif attribute in module._buffers:
+                module._buffers[attribute] = tensor
+            else:
+                continue
+        shared += 1
+
+    # Tied weights such as the LM head and embeddings were re-pointed separately
+    if hasattr(model, "tie_weights"):
+        model.tie_weights()
+    return shared
+
+
+class SnapshotStore:
+    def __init__(self, root: Optional[str] = None):
+        """
+        :param root: store directory, ``~/.cache/overwatch_node/snapshots`` by default
+        """
+        self.root = root or DEFAULT_SNAPSHOT_DIR
+        self.hub_dir = os.path.join(self.root, "hub")
+        self.manifest_path = os.path.join(self.root, MANIFEST_FILE)
+
+    def _load_manifest(self) -> Dict[str, str]:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest: Dict[str, str]):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _manifest_key(repository: str, revision: Optional[str]) -> str:
+        # The default branch keeps the bare repository key of manifests written before revisions
+        return repository if revision is None else f"{repository}@{revision}"
+
+    def pinned_revision(self, repository: str, revision: Optional[str] = None) -> Optional[str]:
+        return self._load_manifest().get(self._manifest_key(repository, revision))
+
+    def pin(self, repository: str, commit: str, revision: Optional[str] = None):
+        manifest = self._load_manifest()
+        manifest[self._manifest_key(repository, revision)] = commit
+        self._save_manifest(manifest)
+
+    def resolve(self, repository: str, revision: Optional[str] = None) -> str:
+        """
+        Returns the commit hash to load. A commit hash is used as is, a branch or tag (or the
+        default branch if None) is resolved on the Hub only on its first load and pinned.
+        """
+        if revision is not None and _COMMIT_HASH.match(revision):
+            return revision
+
+        commit = self.pinned_revision(repository, revision)
+        if commit is None:
+            from huggingface_hub import HfApi
+
+            commit = HfApi().model_info(repository, revision=revision).sha
+            self.pin(repository, commit, revision)
+            logger.info(f"Pinned {repository}@{revision or 'main'} to {commit}")
+        return commit
+
+    def _cached_or_download(self, download, repository: str, revision: str, **kwargs) -> str:
+        """Runs a Hub ``download`` function from the local cache, going to the network only if missing"""
+        from huggingface_hub.utils import LocalEntryNotFoundError
+
+        try:
+            return download(repository, revision=revision, cache_dir=self.hub_dir, local_files_only=True, **kwargs)
+        except (LocalEntryNotFoundError, FileNotFoundError):
+            logger.info(f"Downloading {kwargs.get('filename', 'snapshot')} of {repository}@{revision}")
+            return download(repository, revision=revision, cache_dir=self.hub_dir, **kwargs)
+
+    def snapshot(self, repository: str, revision: str) -> str:
+        """
+        Returns the local snapshot directory of a pinned commit, downloading missing files only.
+        Of the weights only the shards holding locally held parameters are downloaded.
+        """
+        from huggingface_hub import hf_hub_download, snapshot_download
+
+        snapshot_dir = self._cached_or_download(
+            snapshot_download, repository, revision, allow_patterns=SNAPSHOT_PATTERNS,
+        )
+        for file_name in local_shards(snapshot_dir):
+            self._cached_or_download(hf_hub_download, repository, revision, filename=file_name)
+        return snapshot_dir
+
+    def local_weights_path(self, repository: str, revision: str, dtype) -> str:
+        dtype_name = str(dtype).replace("torch.", "")
+        return os.path.join(self.root, "local", repository.replace("/", "--"), revision, f"{dtype_name}.safetensors")
+
+    def local_weights(self, repository: str, revision: str, dtype) -> Dict:
+        """Returns memory-mapped local parameters of a pinned commit, extracting them on first use"""
+        path = self.local_weights_path(repository, revision, dtype)
+        if not os.path.exists(path):
+            count = extract_local_weights(self.snapshot(repository, revision), path, dtype)
+            logger.info(f"Extracted {count} local tensors of {repository}@{revision} to {path}")
+        return load_mmap(path)
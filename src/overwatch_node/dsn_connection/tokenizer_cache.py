@@ -0,0 +1,94 @@
+"""
+Persistent cache of fast tokenizers
+
+Converting a slow (SentencePiece) tokenizer to its fast form is what makes
+``LlamaTokenizerFast`` slow to initialise. The conversion only has to happen once per
+repository, so we serialize the converted ``tokenizer.json`` to a local directory and
+load that on subsequent starts, getting both a fast init and fast batched encode/decode.
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from transformers import AutoTokenizer, PreTrainedTokenizerBase
+
+from metrics.node_metrics import record_cache
+
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(Path.home(), ".cache", "overwatch_node", "tokenizers")
+
+# Files written by `save_pretrained` that are required to load the fast tokenizer
+REQUIRED_FILES = ("tokenizer.json", "tokenizer_config.json")
+
+
+def cache_path_for(repository: str, revision: Optional[str] = None, cache_dir: Optional[str] = None) -> str:
+    """Returns the directory holding the converted tokenizer of ``repository`` at ``revision``"""
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    name = repository.replace("/", "--")
+    return os.path.join(cache_dir, name, revision or "main")
+
+
+def is_cached(repository: str, revision: Optional[str] = None, cache_dir: Optional[str] = None) -> bool:
+    path = cache_path_for(repository, revision, cache_dir)
+    return all(os.path.isfile(os.path.join(path, filename)) for filename in REQUIRED_FILES)
+
+
+def load_tokenizer(
+    repository: str,
+    revision: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+    **kwargs,
+) -> PreTrainedTokenizerBase:
+    """
+    Loads the fast tokenizer of ``repository``, converting and persisting it on first use
+
+    Args:
+      repository (str): Hugging Face repository or local path of the model.
+      revision (Optional[str]): Revision of the repository, part of the cache key.
+      cache_dir (Optional[str]): Root of the tokenizer cache, defaults to ``DEFAULT_CACHE_DIR``.
+      kwargs: Forwarded to ``AutoTokenizer.from_pretrained``, e.g. ``add_bos_token=False``.
+
+    Returns:
+      PreTrainedTokenizerBase: The fast tokenizer
+    """
+    path = cache_path_for(repository, revision, cache_dir)
+
+    cached = is_cached(repository, revision, cache_dir)
+    record_cache("tokenizer", cached)
+    if cached:
+        logger.info(f"Loading cached fast tokenizer for {repository} from {path}")
+        try:
+            return AutoTokenizer.from_pretrained(path, use_fast=True, **kwargs)
+        except Exception as e:
+            # A corrupted or incompatible cache entry is rebuilt rather than failing the node
+            logger.warning(f"Failed to load cached tokenizer from {path}, rebuilding: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+
+    logger.info(f"Converting tokenizer for {repository} to its fast form, this only happens once")
+    tokenizer = AutoTokenizer.from_pretrained(repository, revision=revision, use_fast=True, **kwargs)
+    if not tokenizer.is_fast:
+        logger.warning(f"No fast tokenizer available for {repository}, it will not be cached")
+        return tokenizer
+
+    save_tokenizer(tokenizer, path)
+    return tokenizer
+
+
+def save_tokenizer(tokenizer: PreTrainedTokenizerBase, path: str):
+    """Serializes ``tokenizer`` to ``path`` atomically so concurrent starts never see a partial cache"""
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        tokenizer.save_pretrained(tmp_path)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to persist tokenizer cache to {path}: {e}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
@@ -1,11 +1,15 @@
+import functools
 from typing import Dict, List, Tuple, Union
 
 import torch
 from subnet import AutoDistributedModelForCausalLM
-from transformers import AutoTokenizer, PreTrainedModel, PreTrainedTokenizer
+from transformers import PreTrainedModel, PreTrainedTokenizer
 
-import config
-from data_structures import ModelConfig
+from dsn_connection import config, decoding
+from dsn_connection.data_structures import ModelBackendConfig, ModelConfig
+from dsn_connection.peer_routing import PeerRouter, RoutedModel
+from dsn_connection.snapshot_store import SnapshotStore, share_weights
+from dsn_connection.tokenizer_cache import load_tokenizer
 
 from pathlib import Path
 import os
@@ -18,40 +22,74 @@ load_dotenv(os.path.join(Path.cwd(), '.env'))
 
 PRIVATE_KEY_PATH = os.getenv('PRIVATE_KEY_PATH')
 RPC = os.getenv('RPC')
+TOKENIZER_CACHE_DIR = os.getenv('TOKENIZER_CACHE_DIR')
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR')
+
+
+def _load_model(
+    store: SnapshotStore,
+    backend_config: ModelBackendConfig,
+    revision: str,
+    subnet_id: int,
+    initial_peers: List[str],
+) -> PreTrainedModel:
+    logger.info(
+        f"Loading model {backend_config.repository}@{revision} with adapter {backend_config.adapter} in {config.TORCH_DTYPE}"
+    )
+
+    model = AutoDistributedModelForCausalLM.from_pretrained(
+        backend_config.repository,
+        revision=revision,
+        cache_dir=store.hub_dir,
+        active_adapter=backend_config.adapter,
+        torch_dtype=config.TORCH_DTYPE,
+        initial_peers=initial_peers,
+        max_retries=3,
+        subnet_id=subnet_id,
+        identity_path=PRIVATE_KEY_PATH,
+        rpc=RPC,
+    )
+
+    model = model.to(config.DEVICE)
+
+    if config.DEVICE == "cpu":
+        # Swap the private copies of the local weights for memory-mapped ones shared
+        # through the page cache by every worker on this host
+        local_weights = store.local_weights(backend_config.repository, revision, model.dtype)
+        shared = share_weights(model, local_weights)
+        logger.info(f"Memory-mapped {shared}/{len(local_weights)} local tensors of {backend_config.repository}")
+    return model
 
 
 def load_models() -> Dict[str, Tuple[PreTrainedModel, PreTrainedTokenizer, ModelConfig]]:
     models = {}
+    store = SnapshotStore(SNAPSHOT_DIR)
     for family in config.MODEL_FAMILIES.values():
         for model_config in family:
             backend_config = model_config.backend
             subnet_id = model_config.substrate.subnet_id
-            boostrap_peers = model_config.boostrap_peers
 
             logger.info(f"Loading tokenizer for {backend_config.repository}")
-            tokenizer = AutoTokenizer.from_pretrained(
-                backend_config.repository, 
-                add_bos_token=False, 
-                use_fast=False,
+            # The fast tokenizer is converted once and loaded from the local cache afterwards,
+            # so we no longer need use_fast=False to avoid the slow LlamaTokenizerFast init
+            tokenizer = load_tokenizer(
+                backend_config.repository,
+                cache_dir=TOKENIZER_CACHE_DIR,
+                add_bos_token=False,
             )
 
-            logger.info(
-                f"Loading model {backend_config.repository} with adapter {backend_config.adapter} in {config.TORCH_DTYPE}"
-            )
+            # Loading a pinned commit hash from the store needs no revision lookups on restart
+            revision = store.resolve(backend_config.repository, backend_config.revision)
 
-            # We set use_fast=False since LlamaTokenizerFast takes a long time to init
-            model = AutoDistributedModelForCausalLM.from_pretrained(
-                backend_config.repository,
-                active_adapter=backend_config.adapter,
-                torch_dtype=config.TORCH_DTYPE,
-                initial_peers=boostrap_peers,
-                max_retries=3,
-                subnet_id=subnet_id,
-                identity_path=PRIVATE_KEY_PATH,
-                rpc=RPC,
+            # Sessions bootstrap from the fastest probed peers, later routes are applied through
+            # the client's server lists without reloading the model
+            router = PeerRouter.from_multiaddrs(model_config.bootstrap_peers)
+            router.probe()
+            router.start_probing()
+            model = RoutedModel(
+                functools.partial(_load_model, store, backend_config, revision, subnet_id),
+                router,
             )
-            
-            model = model.to(config.DEVICE)
 
             for key in [backend_config.key] + list(backend_config.aliases):
                 models[key] = model, tokenizer, backend_config
@@ -59,11 +97,5 @@ def load_models() -> Dict[str, Tuple[PreTrainedModel, PreTrainedTokenizer, Model
 
 
 def safe_decode(tokenizer: PreTrainedTokenizer, outputs: Union[torch.Tensor, List[int]]) -> str:
-    # Workaround to make SentencePiece .decode() keep leading spaces in a token
-    fake_token = tokenizer("^")["input_ids"][0]
-    outputs = outputs.tolist() if isinstance(outputs, torch.Tensor) else outputs
-    result = tokenizer.decode([fake_token] + outputs)
-    print("result", result)
-    # We use .lstrip() since SentencePiece may add leading spaces, e.g. if the outputs are "</s>"
-    # return result.lstrip()[1:]
-    return result
+    # Workaround to make SentencePiece .decode() keep leading spaces in a token, see `decoding`
+    return decoding.decode(tokenizer, outputs)
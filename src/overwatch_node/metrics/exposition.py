@@ -0,0 +1,90 @@
+"""
+Prometheus/OpenMetrics text exposition of the metrics registry
+
+python -c "from metrics.exposition import start_http_server; start_http_server(9100)"
+curl http://127.0.0.1:9100/metrics
+"""
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from metrics.registry import REGISTRY, Histogram, Registry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        value = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def render(registry: Registry = REGISTRY) -> bytes:
+    """Renders every metric in ``registry`` in the Prometheus text format"""
+    lines: List[str] = []
+    for metric in registry.collect():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+
+        if isinstance(metric, Histogram):
+            quantile_lines = []
+            for labels, child in metric.series():
+                for bound, count in child.cumulative_counts():
+                    bucket_labels = dict(labels, le=_format_value(bound))
+                    lines.append(f"{metric.name}_bucket{_format_labels(bucket_labels)} {count}")
+                lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+                lines.append(f"{metric.name}_count{_format_labels(labels)} {child.count}")
+                for quantile, value in child.quantiles(metric.quantiles):
+                    quantile_labels = dict(labels, quantile=str(quantile))
+                    quantile_lines.append(
+                        f"{metric.name}_recent{_format_labels(quantile_labels)} {_format_value(value)}"
+                    )
+            lines.append(f"# HELP {metric.name}_recent {metric.documentation} (recent window quantiles)")
+            lines.append(f"# TYPE {metric.name}_recent summary")
+            lines.extend(quantile_lines)
+        else:
+            for labels, child in metric.series():
+                lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(child.value)}")
+
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render(self.registry)
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent, don't spam the node logs
+        pass
+
+
+def start_http_server(port: int, addr: str = "127.0.0.1", registry: Optional[Registry] = None) -> ThreadingHTTPServer:
+    """Serves ``/metrics`` on a daemon thread and returns the server so it can be shut down"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry or REGISTRY})
+    server = ThreadingHTTPServer((addr, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,93 @@
+"""
+Metrics exported by the overwatch node
+"""
+from metrics.registry import Counter, Gauge, Histogram
+
+BENCHMARK_DURATION = Histogram(
+    "overwatch_benchmark_duration_seconds",
+    "Wall time of a full benchmark run",
+    labelnames=("benchmark",),
+)
+
+MODEL_REQUEST_LATENCY = Histogram(
+    "overwatch_model_request_latency_seconds",
+    "Latency of a single model generate request",
+    labelnames=("benchmark", "model"),
+)
+
+GENERATED_TOKENS = Counter(
+    "overwatch_generated_tokens_total",
+    "Tokens generated by the evaluated models",
+    labelnames=("model",),
+)
+
+TOKENS_PER_SECOND = Gauge(
+    "overwatch_tokens_per_second",
+    "Generation throughput of the last request",
+    labelnames=("model",),
+)
+
+QUEUE_DEPTH = Gauge(
+    "overwatch_queue_depth",
+    "Evaluation requests waiting to be processed",
+)
+
+CACHE_REQUESTS = Counter(
+    "overwatch_cache_requests_total",
+    "Cache lookups by cache and result (hit or miss)",
+    labelnames=("cache", "result"),
+)
+
+RPC_LATENCY = Histogram(
+    "overwatch_rpc_latency_seconds",
+    "Latency of chain RPC requests",
+    labelnames=("method",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+RPC_ERRORS = Counter(
+    "overwatch_rpc_errors_total",
+    "Failed chain RPC requests",
+    labelnames=("method",),
+)
+
+EXTRINSIC_INCLUSION = Histogram(
+    "overwatch_extrinsic_inclusion_seconds",
+    "Time from submitting an extrinsic until it is included in a block",
+    labelnames=("call",),
+    buckets=(1.0, 3.0, 6.0, 9.0, 12.0, 18.0, 24.0, 36.0, 60.0, 120.0),
+)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+CHAIN_EVENTS = Counter(
+    "overwatch_chain_events_total",
+    "Decoded Network pallet events concerning this node",
+    labelnames=("event",),
+)
+
+PEER_RTT = Gauge(
+    "overwatch_peer_rtt_seconds",
+    "Probed round trip time of each swarm peer",
+    labelnames=("peer",),
+)
+
+PEER_STEP_LATENCY = Gauge(
+    "overwatch_peer_step_latency_seconds",
+    "Moving average latency of inference steps served by each swarm peer",
+    labelnames=("peer",),
+)
+
+ROUTE_PEERS = Gauge(
+    "overwatch_route_peers",
+    "Whether each swarm peer is on the chosen inference route",
+    labelnames=("peer",),
+)
+
+ROUTE_CHANGES = Counter(
+    "overwatch_route_changes_total",
+    "Inference route changes by reason",
+    labelnames=("reason",),
+)
@@ -0,0 +1,265 @@
+"""
+Minimal in-process metrics registry
+
+Counters, gauges and histograms with labels, rendered in the Prometheus/OpenMetrics text
+format by `metrics.exposition`. Observations take a lock and a bisect, so they are cheap
+enough for hot loops; `Histogram.batch` avoids even that by flushing once per loop.
+"""
+import bisect
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0
+)
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+# Number of recent observations per series used to compute quantiles
+QUANTILE_WINDOW = 1024
+
+
+class Registry:
+    """Holds every metric family so they can be rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> "_Metric":
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def collect(self) -> List["_Metric"]:
+        with self._lock:
+            return list(self._metrics.values())
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Optional[Registry] = REGISTRY,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        """Returns the child series for the given label values, creating it on first use"""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels {self.labelnames}, use .labels()")
+        return self._children[()]
+
+    def series(self) -> List[Tuple[Dict[str, str], object]]:
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.labelnames, values)), child) for values, child in items]
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._unlabelled().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._unlabelled().dec(amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.window = deque(maxlen=QUANTILE_WINDOW)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            self.window.append(value)
+
+    def observe_many(self, values: Sequence[float]):
+        indexes = [bisect.bisect_left(self.buckets, value) for value in values]
+        with self._lock:
+            for index in indexes:
+                self.counts[index] += 1
+            self.sum += sum(values)
+            self.count += len(values)
+            self.window.extend(values)
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observes the duration of the block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @contextmanager
+    def batch(self) -> Iterator["_BatchTimer"]:
+        """Collects observations locally and flushes them once, for use around hot loops"""
+        timer = _BatchTimer()
+        try:
+            yield timer
+        finally:
+            if timer.values:
+                self.observe_many(timer.values)
+
+    def quantiles(self, quantiles: Sequence[float]) -> List[Tuple[float, float]]:
+        with self._lock:
+            values = sorted(self.window)
+        if not values:
+            return [(q, math.nan) for q in quantiles]
+        return [(q, values[min(len(values) - 1, int(q * len(values)))]) for q in quantiles]
+
+    def cumulative_counts(self) -> List[Tuple[float, int]]:
+        with self._lock:
+            counts = list(self.counts)
+        total = 0
+        cumulative = []
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class _BatchTimer:
+    """Local, lock-free buffer of observations flushed by `_HistogramChild.batch`"""
+
+    __slots__ = ("values", "_start")
+
+    def __init__(self):
+        self.values: List[float] = []
+        self._start = 0.0
+
+    def start(self):
+        self._start = time.perf_counter()
+
+    def stop(self) -> float:
+        elapsed = time.perf_counter() - self._start
+        self.values.append(elapsed)
+        return elapsed
+
+    def observe(self, value: float):
+        self.values.append(value)
+
+
+class Histogram(_Metric):
+    """
+    Histogram with cumulative buckets, also exposing p50/p95/p99 over a window of recent
+    observations as a companion summary
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        quantiles: Sequence[float] = DEFAULT_QUANTILES,
+        registry: Optional[Registry] = REGISTRY,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        self.quantiles = tuple(quantiles)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._unlabelled().observe(value)
+
+    def time(self):
+        return self._unlabelled().time()
+
+    def batch(self):
+        return self._unlabelled().batch()
@@ -1,26 +1,142 @@
-from benchmarks.ifeval import IFEval
-from benchmarks.bbh import BBH
-from benchmarks.math import MATH
-from benchmarks.gpqa import GPQA
-from benchmarks.musr import MuSR
-from benchmarks.mmlu_pro import MMLUPro
+import functools
+import time
+
+import numpy as np
+
+from node.benchmarks.ifeval import IFEval
+from node.benchmarks.bbh import BBH
+from node.benchmarks.math import MATH
+from node.benchmarks.gpqa import GPQA
+from node.benchmarks.musr import MuSR
+from node.benchmarks.mmlu_pro import MMLUPro
+from node.eval_items import PromptTable
+from node.weights import score_result
+from metrics.node_metrics import (
+    BENCHMARK_DURATION,
+    GENERATED_TOKENS,
+    MODEL_REQUEST_LATENCY,
+    QUEUE_DEPTH,
+    TOKENS_PER_SECOND,
+)
+
+def _input_length(args, kwargs) -> int:
+    """Prompt tokens per row of a generate call, 0 for prompts passed as text"""
+    inputs = kwargs.get("input_ids", args[0] if args else None)
+    shape = getattr(inputs, "shape", None)
+    return shape[-1] if shape else 0
+
+class TimedModel:
+    """Wraps a model so every generate request is recorded in the latency metrics"""
+    def __init__(self, model, benchmark: str):
+        self.model = model
+        self.model_name = getattr(model, "name_or_path", None) or type(model).__name__
+        self._latency = MODEL_REQUEST_LATENCY.labels(benchmark=benchmark, model=self.model_name)
+
+    def generate(self, *args, **kwargs):
+        start = time.perf_counter()
+        output = self.model.generate(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        self._latency.observe(elapsed)
+
+        # Only tensor outputs carry a token count, string outputs from mocks are skipped
+        shape = getattr(output, "shape", None)
+        if shape:
+            # Decoder-only generate returns the prompt followed by the new tokens
+            new_tokens = shape[-1] - _input_length(args, kwargs)
+            n_tokens = max(0, new_tokens) * (shape[0] if len(shape) > 1 else 1)
+            GENERATED_TOKENS.labels(model=self.model_name).inc(n_tokens)
+            if elapsed > 0:
+                TOKENS_PER_SECOND.labels(model=self.model_name).set(n_tokens / elapsed)
+        return output
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+BENCHMARKS = {benchmark.name: benchmark for benchmark in (IFEval, BBH, MATH, GPQA, MuSR, MMLUPro)}
 
 class BenchmarkManager:
-    def __init__(self, model):
+    def __init__(self, model, state=None, controls=None, datasets=None, pool=None, table=None, tokenizer=None):
+        """
+        :param state: optional `cli.server.state.NodeState` updated with benchmark progress
+        :param controls: optional `cli.server.state.NodeControls` checked between benchmarks
+        :param datasets: optional benchmark name -> dataset overriding the downloaded datasets,
+            anything with a `select(indices)` returning rows, see `node.epoch_benchmark`
+        :param pool: optional `node.workers.EvalWorkerPool` tokenizing prompts off the GIL
+        :param table: optional `node.eval_items.PromptTable` to share items across managers and epochs
+        :param tokenizer: optional tokenizer of the model, prompts are then generated from their
+            token ids and the outputs decoded with it
+        """
         self.model = model
+        self.state = state
+        self.controls = controls
+        self.pool = pool
+        self.tokenizer = tokenizer
+        self.table = table if table is not None else PromptTable()
+        datasets = datasets or {}
         self.benchmarks = {
-            "IFEval": IFEval(model),
-            "BBH": BBH(model),
-            "MATH": MATH(model),
-            "GPQA": GPQA(model),
-            "MuSR": MuSR(model),
-            "MMLU-Pro": MMLUPro(model),
+            name: benchmark(TimedModel(model, name), dataset=datasets.get(name), table=self.table, tokenizer=tokenizer)
+            for name, benchmark in BENCHMARKS.items()
         }
 
-    def run_all(self, num_samples=10):
+    def prepare(self, num_samples=10):
+        """
+        Reads the items of every benchmark into the table and, when outputs can be decoded,
+        tokenizes new prompts once, in the pool if it has a tokenizer
+        """
+        for benchmark in self.benchmarks.values():
+            benchmark.items(num_samples)
+        if self.tokenizer is None:
+            return
+        if self.pool is not None and self.pool.has_tokenizer:
+            self.table.tokenize(self.pool.tokenize)
+        else:
+            self.table.tokenize(functools.partial(self.tokenizer, add_special_tokens=False))
+
+    def run_all(self, num_samples=10, epoch=None):
         """Runs all benchmarks and returns results."""
+        if self.controls is not None:
+            # This run answers any pending manual trigger
+            self.controls.consume_trigger()
+        self.prepare(num_samples)
         results = {}
-        for name, benchmark in self.benchmarks.items():
-            print(f"Running {name} benchmark...")
-            results[name] = benchmark.run(num_samples)
+        queued = len(self.benchmarks) * num_samples
+        QUEUE_DEPTH.set(queued)
+        self._update_state(status="evaluating", queued=queued, in_flight=0)
+        if epoch is not None:
+            self._update_state(epoch=epoch)
+        try:
+            for name, benchmark in self.benchmarks.items():
+                if self.controls is not None:
+                    if self.controls.draining.is_set():
+                        self.controls.finish_drain()
+                        break
+                    self.controls.wait_if_paused()
+
+                print(f"Running {name} benchmark...")
+                queued -= num_samples
+                self._update_state(queued=queued, in_flight=num_samples)
+                if self.state is not None:
+                    self.state.set_progress(name, 0, num_samples)
+
+                with BENCHMARK_DURATION.labels(benchmark=name).time():
+                    results[name] = benchmark.run(num_samples)
+
+                QUEUE_DEPTH.dec(num_samples)
+                if self.state is not None:
+                    self.state.set_progress(name, len(results[name]), num_samples)
+        finally:
+            # Also reset when a benchmark raises, so the gauge never reports a stale queue
+            QUEUE_DEPTH.set(0)
+            self._update_state(status="idle", queued=0, in_flight=0)
         return results
+
+    def score_all(self, results):
+        """
+        Returns per-result scores of a `run_all` result per benchmark, scored inline since an
+        epoch's results score faster than the round trip to the pool
+        """
+        return {name: np.array([score_result(result) for result in entries]) for name, entries in results.items() if entries}
+
+    def _update_state(self, **fields):
+        if self.state is not None:
+            self.state.update(**fields)
@@ -0,0 +1,61 @@
+import argparse
+import time
+
+import numpy as np
+
+from node.weights import compute_weights, decode_weights, encode_weights, quantize
+
+"""
+Payload size and encode time of the weights pipeline against subnet count
+
+python -m node.benchmark_weights --subnets 8 64 512 4096
+"""
+
+
+def scale_vec_size(count: int) -> int:
+    """Size of the same weights as a SCALE ``Vec<(u32, u16)>``"""
+    if count < 1 << 6:
+        prefix = 1
+    elif count < 1 << 14:
+        prefix = 2
+    else:
+        prefix = 4
+    return prefix + count * 6
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--subnets", type=int, nargs="+", default=[8, 64, 512, 4096], help="Subnet counts to benchmark")
+    parser.add_argument("--repeat", type=int, required=False, default=50, help="Encodes per subnet count")
+    parser.add_argument("--seed", type=int, required=False, default=0, help="Random seed")
+
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    print(f"{'subnets':>8}{'payload (B)':>14}{'SCALE (B)':>12}{'ratio':>8}{'encode (ms)':>14}{'decode (ms)':>14}")
+    for count in args.subnets:
+        # Sparse-ish ids as on a live chain where subnets get deregistered
+        ids = np.sort(rng.choice(count * 2, size=count, replace=False)) + 1
+        scores = dict(zip(ids.tolist(), rng.random(count).tolist()))
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            sorted_ids, weights = compute_weights(scores)
+            payload = encode_weights(sorted_ids, quantize(weights))
+        encode_ms = (time.perf_counter() - start) / args.repeat * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            decoded_ids, _ = decode_weights(payload)
+        decode_ms = (time.perf_counter() - start) / args.repeat * 1000
+        assert np.array_equal(decoded_ids, sorted_ids)
+
+        scale_size = scale_vec_size(count)
+        print(
+            f"{count:>8}{len(payload):>14}{scale_size:>12}{len(payload) / scale_size:>8.2f}"
+            f"{encode_ms:>14.3f}{decode_ms:>14.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
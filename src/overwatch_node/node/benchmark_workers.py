@@ -0,0 +1,128 @@
+import argparse
+import functools
+import os
+import random
+import time
+
+import numpy as np
+
+from node.eval_items import EvalResult, PromptTable
+from node.weights import score_result
+from node.workers import EvalWorkerPool
+
+"""
+Scaling of the evaluation worker pool from 1 to N processes
+
+Tokenizes and scores a synthetic epoch's worth of prompts and outputs in the node process and
+in worker pools of increasing size. Without ``--tokenizer`` a pure-Python greedy subword
+tokenizer stands in for the slow tokenizer, so the benchmark runs offline.
+
+python -m node.benchmark_workers --workers 1 2 4 8
+python -m node.benchmark_workers --tokenizer Orenguteng/Llama-3.1-8B-Lexi-Uncensored-V2
+"""
+
+WORDS = "the of model node subnet epoch peer weight stake block score answer question reason".split()
+
+
+class StandInTokenizer:
+    """Greedy longest-match subword tokenizer, CPU-bound in Python like a slow tokenizer"""
+
+    def __init__(self, max_piece: int = 6):
+        self.max_piece = max_piece
+        self.vocab = {}
+        for word in WORDS:
+            for end in range(1, len(word) + 1):
+                for start in range(end):
+                    self.vocab.setdefault(word[start:end], len(self.vocab))
+        for byte in range(256):
+            self.vocab.setdefault(chr(byte), len(self.vocab))
+
+    def encode(self, text: str):
+        ids = []
+        position = 0
+        while position < len(text):
+            for length in range(min(self.max_piece, len(text) - position), 0, -1):
+                token = self.vocab.get(text[position:position + length])
+                if token is not None:
+                    ids.append(token)
+                    position += length
+                    break
+            else:
+                ids.append(0)
+                position += 1
+        return ids
+
+    def __call__(self, texts, add_special_tokens: bool = False):
+        return {"input_ids": [self.encode(text) for text in texts]}
+
+
+def synthetic_results(count: int, words: int, seed: int):
+    rng = random.Random(seed)
+    table = PromptTable()
+    results = []
+    for i in range(count):
+        prompt = " ".join(rng.choice(WORDS) for _ in range(words))
+        expected = f"answer {rng.randrange(1000)}"
+        actual = " ".join(rng.choice(WORDS) for _ in range(words)) + (f" {expected}" if rng.random() < 0.5 else "")
+        results.append(EvalResult(table.add("synthetic", i, prompt, expected), actual))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="Pool sizes, defaults to 1, 2, 4 ... cpu count")
+    parser.add_argument("--entries", type=int, required=False, default=4000, help="Prompts and outputs per run")
+    parser.add_argument("--words", type=int, required=False, default=200, help="Words per prompt and output")
+    parser.add_argument("--tokenizer", type=str, required=False, default=None, help="Repository of a real tokenizer to use")
+    parser.add_argument("--repeat", type=int, required=False, default=3, help="Runs per pool size, the fastest is kept")
+    parser.add_argument("--seed", type=int, required=False, default=0, help="Random seed")
+
+    args = parser.parse_args()
+    cpus = os.cpu_count() or 1
+    workers = args.workers or sorted({2 ** i for i in range(cpus.bit_length()) if 2 ** i <= cpus} | {cpus})
+
+    if args.tokenizer is not None:
+        from dsn_connection.tokenizer_cache import load_tokenizer
+        tokenizer_factory = functools.partial(load_tokenizer, args.tokenizer)
+    else:
+        tokenizer_factory = StandInTokenizer
+
+    results = synthetic_results(args.entries, args.words, args.seed)
+    texts = [result.item.prompt for result in results]
+
+    tokenizer = tokenizer_factory()
+    start = time.perf_counter()
+    reference_ids = tokenizer(texts, add_special_tokens=False)["input_ids"]
+    baseline_tokenize = time.perf_counter() - start
+    start = time.perf_counter()
+    reference_scores = np.array([score_result(result) for result in results])
+    baseline_score = time.perf_counter() - start
+
+    print(f"{'workers':>8}{'tokenize (s)':>14}{'speedup':>9}{'score (s)':>11}{'speedup':>9}")
+    print(f"{'inline':>8}{baseline_tokenize:>14.3f}{1:>9.2f}{baseline_score:>11.3f}{1:>9.2f}")
+    for count in workers:
+        with EvalWorkerPool(count, tokenizer_factory=tokenizer_factory) as pool:
+            # Warm up so process start and tokenizer loading aren't timed
+            pool.tokenize(texts[:count])
+
+            tokenize_times, score_times = [], []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                batch = pool.tokenize(texts)
+                tokenize_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                scores = pool.score(results)
+                score_times.append(time.perf_counter() - start)
+
+        assert all(np.array_equal(batch[i], reference_ids[i]) for i in range(len(texts)))
+        assert np.array_equal(scores, reference_scores)
+        tokenize_time, score_time = min(tokenize_times), min(score_times)
+        print(
+            f"{count:>8}{tokenize_time:>14.3f}{baseline_tokenize / tokenize_time:>9.2f}"
+            f"{score_time:>11.3f}{baseline_score / score_time:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
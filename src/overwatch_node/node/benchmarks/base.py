@@ -0,0 +1,53 @@
+from typing import List, Optional
+
+from node.eval_items import EvalItem, EvalResult, PromptTable
+
+class Benchmark:
+    """
+    Runs a model over the first rows of a dataset
+
+    Subclasses name their dataset and the row fields holding the prompt and expected answer.
+    Rows are read into the `PromptTable` once, later runs only look their items up. With a
+    tokenizer, prompts tokenized in the table are generated from their token ids and the new
+    tokens are decoded, otherwise the model is given the prompt text.
+    """
+    name: str
+    path: str
+    split: str
+    prompt_field: str = "question"
+    answer_field: str = "answer"
+
+    def __init__(self, model, dataset=None, table: Optional[PromptTable] = None, tokenizer=None):
+        self.model = model
+        self._dataset = dataset
+        self.table = table if table is not None else PromptTable()
+        self.tokenizer = tokenizer
+
+    @property
+    def dataset(self):
+        # Loaded on first use, runs whose items are all in the table never touch it
+        if self._dataset is None:
+            from datasets import load_dataset
+            self._dataset = load_dataset(self.path, split=self.split)
+        return self._dataset
+
+    def items(self, num_samples: int) -> List[EvalItem]:
+        missing = [index for index in range(num_samples) if self.table.get(self.name, index) is None]
+        if missing:
+            for index, row in zip(missing, self.dataset.select(missing)):
+                self.table.add(self.name, index, row[self.prompt_field], row[self.answer_field])
+        return [self.table.get(self.name, index) for index in range(num_samples)]
+
+    def generate(self, item: EvalItem):
+        if item.token_ids is None or self.tokenizer is None:
+            return self.model.generate(item.prompt)
+
+        import torch
+
+        input_ids = torch.from_numpy(item.token_ids).long().unsqueeze(0)
+        output = self.model.generate(input_ids=input_ids)
+        # Decoder-only generate returns the prompt followed by the new tokens
+        return self.tokenizer.decode(output[0, input_ids.shape[-1]:], skip_special_tokens=True)
+
+    def run(self, num_samples=10) -> List[EvalResult]:
+        return [EvalResult(item, self.generate(item)) for item in self.items(num_samples)]
@@ -0,0 +1,368 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from cli.crypto.identity import base58_encode
+from node.benchmark_manager import BenchmarkManager
+from node.eval_items import PromptTable
+from node.weights import build_weights
+from substrate.chain_functions import submit_benchmark_weights
+from substrate.peer_directory import SUBNET_NODE_CLASSES, PeerDirectory
+
+"""
+End-to-end performance suite of one simulated epoch
+
+Runs every stage of an epoch against in-process mocks: fetch and decode the subnet node list
+from a mock Substrate RPC, run all benchmarks against a mock model with configurable latency,
+score and build weights, and submit them to the mock chain. Reports wall time per stage over
+several runs, then peak RSS and Python allocations per stage from one traced run, and compares
+them against stored baselines.
+
+python -m node.epoch_benchmark --save_baseline
+python -m node.epoch_benchmark --subnets 64 --nodes 256 --samples 10
+"""
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "overwatch_node", "epoch_benchmark_baseline.json")
+
+# benchmark -> (prompt field, answer field) of its dataset rows
+DATASET_FIELDS = {
+    "IFEval": ("instruction", "output"),
+    "BBH": ("inputs", "targets"),
+    "MATH": ("question", "answer"),
+    "GPQA": ("question", "best_answer"),
+    "MuSR": ("question", "answer"),
+    "MMLU-Pro": ("question", "answer"),
+}
+
+# Stages faster than this are only compared on allocations, their timings are mostly noise
+MIN_COMPARED_SECONDS = 0.001
+
+MB = 1024 * 1024
+
+WORDS = "the of model node subnet epoch peer weight stake block score answer question reason".split()
+
+
+class ListDataset:
+    """In-memory stand-in for a `datasets.Dataset`, only `select` is used by the benchmarks"""
+
+    def __init__(self, rows: List[Dict]):
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def select(self, indices) -> List[Dict]:
+        return [self.rows[i] for i in indices]
+
+
+def synthetic_datasets(samples: int, prompt_words: int, seed: int) -> Dict[str, ListDataset]:
+    rng = random.Random(seed)
+    datasets = {}
+    for name, (prompt_field, answer_field) in DATASET_FIELDS.items():
+        rows = []
+        for i in range(samples):
+            prompt = f"{name} {i}: " + " ".join(rng.choice(WORDS) for _ in range(prompt_words))
+            rows.append({prompt_field: prompt, answer_field: f"answer {rng.randrange(1000)}"})
+        datasets[name] = ListDataset(rows)
+    return datasets
+
+
+class MockModel:
+    """Answers correctly with probability ``accuracy`` after ``latency`` plus up to ``jitter`` seconds"""
+
+    def __init__(self, answers: Dict[str, str], accuracy: float, latency: float, jitter: float, seed: int):
+        self.answers = answers
+        self.accuracy = accuracy
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+
+    def generate(self, prompt):
+        delay = self.latency + self.jitter * self.rng.random()
+        if delay > 0:
+            time.sleep(delay)
+        if self.rng.random() < self.accuracy:
+            return f"The answer is {self.answers[prompt]}."
+        return "I am not sure."
+
+
+class MockReceipt:
+    def __init__(self, extrinsic_hash: str):
+        self.extrinsic_hash = extrinsic_hash
+        self.block_hash = "0x" + "00" * 32
+        self.is_success = True
+        self.error_message = None
+        self.triggered_events = []
+
+
+class MockKeypair:
+    def __init__(self, ss58_address: str):
+        self.ss58_address = ss58_address
+
+
+class MockSubstrate:
+    """
+    In-process stand-in for the `SubstrateInterface` methods an epoch uses, with fixed RPC and
+    inclusion latencies
+    """
+
+    def __init__(self, node_list: bytes, rpc_latency: float = 0.0, inclusion_latency: float = 0.0):
+        self.node_list = node_list
+        self.rpc_latency = rpc_latency
+        self.inclusion_latency = inclusion_latency
+        self.block_number = 1000
+        self.nonces: Dict[str, int] = {}
+        self.submitted: List[Dict] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def _rpc(self):
+        if self.rpc_latency > 0:
+            time.sleep(self.rpc_latency)
+
+    def get_block_hash(self, block_id: Optional[int] = None) -> str:
+        self._rpc()
+        return f"0x{block_id or self.block_number:064x}"
+
+    def get_block_number(self, block_hash: str) -> int:
+        self._rpc()
+        return self.block_number
+
+    def rpc_request(self, method: str, params: list) -> Dict:
+        self._rpc()
+        if method == "network_getSubnetNodes":
+            return {"result": list(self.node_list)}
+        raise ValueError(f"Mock RPC does not implement {method}")
+
+    def get_account_nonce(self, address: str) -> int:
+        self._rpc()
+        return self.nonces.get(address, 0)
+
+    def compose_call(self, call_module: str, call_function: str, call_params: Dict) -> Dict:
+        return {"call_module": call_module, "call_function": call_function, "call_params": call_params}
+
+    def create_signed_extrinsic(self, call: Dict, keypair, nonce: int, **kwargs) -> Dict:
+        return {"call": call, "signer": keypair.ss58_address, "nonce": nonce}
+
+    def submit_extrinsic(self, extrinsic: Dict, wait_for_inclusion: bool = False) -> MockReceipt:
+        self._rpc()
+        if wait_for_inclusion and self.inclusion_latency > 0:
+            time.sleep(self.inclusion_latency)
+        self.nonces[extrinsic["signer"]] = extrinsic["nonce"] + 1
+        self.submitted.append(extrinsic)
+        self.block_number += 1
+        return MockReceipt(f"0x{len(self.submitted):064x}")
+
+
+def encode_node_list(count: int, seed: int) -> bytes:
+    """SCALE encodes a `Vec<SubnetNode>` of ``count`` random nodes, as returned by the RPC"""
+    from substrate.chain_data import get_runtime_config
+
+    rng = random.Random(seed)
+    nodes = []
+    for _ in range(count):
+        # Ed25519 peer ids in their base58 text form, as stored on-chain
+        peer_id = base58_encode(bytes([0x00, 0x24, 0x08, 0x01, 0x12, 0x20]) + rng.randbytes(32))
+        nodes.append({
+            "coldkey": "0x" + rng.randbytes(32).hex(),
+            "hotkey": "0x" + rng.randbytes(32).hex(),
+            "peer_id": "0x" + peer_id.encode().hex(),
+            "initialized": 1,
+            "classification": {"class": rng.choice(SUBNET_NODE_CLASSES[1:]), "start_epoch": 1},
+            "a": "0x",
+            "b": "0x",
+            "c": "0x",
+        })
+    scale_object = get_runtime_config().create_scale_object("Vec<SubnetNode>")
+    return bytes(scale_object.encode(nodes).data)
+
+
+class StageRecorder:
+    """Records wall time, and with ``trace`` Python allocations and peak RSS, of each stage"""
+
+    def __init__(self, trace: bool = False):
+        self.trace = trace
+        self.results: Dict[str, Dict[str, float]] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        if self.trace:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        yield
+        result = {"seconds": time.perf_counter() - start}
+        if self.trace:
+            current, peak = tracemalloc.get_traced_memory()
+            result["retained_mb"] = (current - before) / MB
+            result["peak_alloc_mb"] = (peak - before) / MB
+            # ru_maxrss is in KiB on Linux, it only grows so it's the peak up to this stage
+            result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.results[name] = result
+
+
+def run_epoch(
+    args,
+    substrate: MockSubstrate,
+    datasets: Dict[str, ListDataset],
+    table: PromptTable,
+    trace: bool = False,
+) -> Dict[str, Dict[str, float]]:
+    recorder = StageRecorder(trace)
+    answers = {}
+    for name, (prompt_field, answer_field) in DATASET_FIELDS.items():
+        answers.update((row[prompt_field], row[answer_field]) for row in datasets[name].rows)
+
+    # The node and benchmark output would dominate the report, it's discarded while timing
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with recorder.stage("fetch_nodes"):
+            vec_u8 = substrate.rpc_request("network_getSubnetNodes", [])["result"]
+
+        with recorder.stage("decode_nodes"):
+            directory = PeerDirectory()
+            update = directory.update_from_vec_u8(vec_u8, substrate.block_number)
+        assert len(update.added) == args.nodes, "Decoded node list does not match the mock"
+
+        with recorder.stage("benchmarks"):
+            subnet_results = {}
+            for subnet_id in range(1, args.subnets + 1):
+                model = MockModel(
+                    answers,
+                    accuracy=0.2 + 0.7 * (subnet_id / args.subnets),
+                    latency=args.latency,
+                    jitter=args.jitter,
+                    seed=args.seed + subnet_id,
+                )
+                manager = BenchmarkManager(model, datasets=datasets, table=table)
+                subnet_results[subnet_id] = manager.run_all(num_samples=args.samples)
+
+        with recorder.stage("weights"):
+            _, encrypted_weights = build_weights(subnet_results, salt=bytes(16))
+
+        with recorder.stage("submit"):
+            receipt = submit_benchmark_weights(substrate, MockKeypair("5MockOverwatchNode"), encrypted_weights)
+        assert receipt is not None and receipt.is_success, "Mock submission failed"
+
+    total = sum(result["seconds"] for result in recorder.results.values())
+    recorder.results["total"] = {"seconds": total}
+    return recorder.results
+
+
+def signature(args) -> str:
+    """Identifies runs whose results are comparable"""
+    return (
+        f"subnets={args.subnets},nodes={args.nodes},samples={args.samples},words={args.prompt_words},"
+        f"latency={args.latency},jitter={args.jitter},rpc={args.rpc_latency},inclusion={args.inclusion_latency}"
+    )
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    regressions = []
+    for stage, result in results.items():
+        expected = baseline.get(stage)
+        if expected is None:
+            continue
+        for metric in ("seconds", "peak_alloc_mb"):
+            if metric not in result or metric not in expected:
+                continue
+            if metric == "seconds" and expected[metric] < MIN_COMPARED_SECONDS:
+                continue
+            limit = expected[metric] * (1 + tolerance) + (0.05 if metric == "peak_alloc_mb" else 0)
+            if result[metric] > limit:
+                regressions.append(f"{stage} {metric}: {result[metric]:.4f} > {expected[metric]:.4f} (+{tolerance:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--subnets", type=int, required=False, default=16, help="Subnets evaluated in the epoch")
+    parser.add_argument("--nodes", type=int, required=False, default=128, help="Nodes in the mock subnet node list")
+    parser.add_argument("--samples", type=int, required=False, default=5, help="Samples per benchmark")
+    parser.add_argument("--prompt_words", type=int, required=False, default=64, help="Words per synthetic prompt")
+    parser.add_argument("--latency", type=float, required=False, default=0.0, help="Mock model seconds per request")
+    parser.add_argument("--jitter", type=float, required=False, default=0.0, help="Mock model random extra seconds per request")
+    parser.add_argument("--rpc_latency", type=float, required=False, default=0.0, help="Mock RPC seconds per request")
+    parser.add_argument("--inclusion_latency", type=float, required=False, default=0.0, help="Mock seconds until inclusion")
+    parser.add_argument("--repeat", type=int, required=False, default=5, help="Timed runs, the median is reported")
+    parser.add_argument("--seed", type=int, required=False, default=0, help="Random seed")
+    parser.add_argument("--baseline", type=str, required=False, default=DEFAULT_BASELINE_PATH, help="Baselines file")
+    parser.add_argument("--save_baseline", action="store_true", help="Store this run as the baseline of its configuration")
+    parser.add_argument("--tolerance", type=float, required=False, default=0.2, help="Allowed relative regression")
+
+    args = parser.parse_args()
+
+    datasets = synthetic_datasets(args.samples, args.prompt_words, args.seed)
+    substrate = MockSubstrate(
+        encode_node_list(args.nodes, args.seed),
+        rpc_latency=args.rpc_latency,
+        inclusion_latency=args.inclusion_latency,
+    )
+
+    # Items are read into the table once and reused by every later epoch, as on a live node
+    table = PromptTable()
+
+    # Warm up imports and one-time initialisation such as the type registry and the table
+    run_epoch(args, substrate, datasets, table)
+
+    runs = [run_epoch(args, substrate, datasets, table) for _ in range(args.repeat)]
+    results = {
+        stage: {"seconds": statistics.median(run[stage]["seconds"] for run in runs)}
+        for stage in runs[0]
+    }
+
+    # Allocation tracing slows everything down, so it gets its own run and no timings
+    tracemalloc.start()
+    traced = run_epoch(args, substrate, datasets, table, trace=True)
+    tracemalloc.stop()
+    for stage, result in traced.items():
+        result.pop("seconds")
+        results[stage].update(result)
+
+    print(f"{'stage':<14}{'median (ms)':>13}{'peak alloc (MB)':>17}{'retained (MB)':>15}{'peak RSS (MB)':>15}")
+    for stage, result in results.items():
+        print(
+            f"{stage:<14}{result['seconds'] * 1000:>13.2f}{result.get('peak_alloc_mb', float('nan')):>17.2f}"
+            f"{result.get('retained_mb', float('nan')):>15.2f}{result.get('peak_rss_mb', float('nan')):>15.1f}"
+        )
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    key = signature(args)
+
+    if args.save_baseline:
+        baselines[key] = results
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if key not in baselines:
+        print(f"No baseline for this configuration in {args.baseline}, run with --save_baseline to store one")
+        return
+
+    regressions = compare(results, baselines[key], args.tolerance)
+    if regressions:
+        print("Regressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compact records of benchmark items and model results with one schema for every benchmark
+
+Each benchmark row is materialised once into an `EvalItem` of a `PromptTable`, addressed by
+an integer ``item_id``, with its prompt tokenized once. Results only reference their item and
+carry the model output, so later epochs reuse the table instead of re-reading dataset rows
+and every stage after generation reads the same fields.
+"""
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_text(text) -> str:
+    return _whitespace.sub(" ", str(text)).strip().lower()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class EvalItem:
+    """A benchmark prompt with its expected answer, stored once in a `PromptTable`"""
+
+    __slots__ = ("item_id", "benchmark", "source_index", "prompt", "expected", "token_ids", "_candidates")
+
+    def __init__(self, item_id: int, benchmark: str, source_index: int, prompt: str, expected):
+        self.item_id = item_id
+        self.benchmark = benchmark
+        self.source_index = source_index
+        self.prompt = prompt
+        self.expected = expected
+        self.token_ids: Optional[np.ndarray] = None
+        self._candidates: Optional[Tuple[str, ...]] = None
+
+    @property
+    def candidates(self) -> Tuple[str, ...]:
+        """Normalized accepted answers, computed on first use"""
+        if self._candidates is None:
+            expected = self.expected if isinstance(self.expected, (list, tuple)) else [self.expected]
+            self._candidates = tuple(
+                candidate for candidate in (normalize_text(value) for value in expected if value is not None) if candidate
+            )
+        return self._candidates
+
+    def __repr__(self) -> str:
+        return f"EvalItem(item_id={self.item_id}, benchmark={self.benchmark!r}, prompt={self.prompt[:40]!r})"
+
+
+class EvalResult:
+    """A model output for an `EvalItem`"""
+
+    __slots__ = ("item", "actual")
+
+    def __init__(self, item: EvalItem, actual):
+        self.item = item
+        self.actual = actual
+
+    @property
+    def item_id(self) -> int:
+        return self.item.item_id
+
+    def __repr__(self) -> str:
+        return f"EvalResult(item_id={self.item.item_id}, expected={self.item.expected!r}, actual={self.actual!r})"
+
+
+class PromptTable:
+    """Benchmark items keyed by ``item_id`` and by (benchmark, dataset row)"""
+
+    def __init__(self):
+        self.items: List[EvalItem] = []
+        self._index: Dict[Tuple[str, int], EvalItem] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, item_id: int) -> EvalItem:
+        return self.items[item_id]
+
+    def get(self, benchmark: str, source_index: int) -> Optional[EvalItem]:
+        return self._index.get((benchmark, source_index))
+
+    def add(self, benchmark: str, source_index: int, prompt: str, expected) -> EvalItem:
+        item = self._index.get((benchmark, source_index))
+        if item is None:
+            item = EvalItem(len(self.items), _intern(benchmark), source_index, prompt, _intern(expected))
+            self.items.append(item)
+            self._index[(benchmark, source_index)] = item
+        return item
+
+    def tokenize(self, tokenize) -> int:
+        """
+        Tokenizes the prompts of items that have no token ids yet, returns how many were tokenized
+
+        :param tokenize: a `node.workers.EvalWorkerPool.tokenize` or any callable mapping a list
+            of prompts to token id sequences
+        """
+        pending = [item for item in self.items if item.token_ids is None]
+        if not pending:
+            return 0
+        batch = tokenize([item.prompt for item in pending])
+        if hasattr(batch, "keys"):
+            # Hugging Face tokenizers return a BatchEncoding
+            batch = batch["input_ids"]
+        for i, item in enumerate(pending):
+            item.token_ids = np.asarray(batch[i], dtype=np.int32)
+        return len(pending)
+
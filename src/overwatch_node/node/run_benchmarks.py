@@ -1,19 +1,68 @@
-from benchmark_manager import BenchmarkManager
+import functools
+import os
+
+from cli.server.state import NodeControls, NodeState
+from node.benchmark_manager import BenchmarkManager
+from node.weights import build_weights
+from node.workers import pool_from_env
+
+# STATUS_PORT: port of the local status and control server, 0 runs the benchmarks once without it
+STATUS_PORT = int(os.getenv("STATUS_PORT", "0"))
 
 class MockModel:
     def generate(self, prompt):
         return f"Generated response for: {prompt}"
 
-def run_benchmarks():
-    subnets = []
+def _tokenizer_factory(model):
+    """Picklable factory of the model's tokenizer for the worker pool, None for mock models"""
+    repository = getattr(model, "name_or_path", None)
+    if repository is None:
+        return None
+    from dsn_connection.tokenizer_cache import load_tokenizer
+    return functools.partial(load_tokenizer, repository)
+
+def run_benchmarks(status_port: int = STATUS_PORT):
+    """
+    Runs the benchmarks and builds weights from the results. With a ``status_port`` the status
+    server is started on the manager's state and controls, and after each run the loop waits
+    for the next ``POST /control/trigger``.
+    """
+    state = NodeState()
+    controls = NodeControls(state)
+    if status_port:
+        from cli.server.server import serve_in_background
+        serve_in_background(state, controls, port=status_port)
+
     model = MockModel()
-    benchmark_manager = BenchmarkManager(model)
-    results = benchmark_manager.run_all(num_samples=5)
+    tokenizer_factory = _tokenizer_factory(model)
+    tokenizer = tokenizer_factory() if tokenizer_factory is not None else None
+    # With EVAL_WORKERS set prompts are tokenized in worker processes
+    pool = pool_from_env(tokenizer_factory)
+    try:
+        benchmark_manager = BenchmarkManager(model, state, controls, pool=pool, tokenizer=tokenizer)
+        epoch = 0
+        while True:
+            results = benchmark_manager.run_all(num_samples=5, epoch=epoch)
+            scores = benchmark_manager.score_all(results)
+            # The mock model stands in for a single subnet, its weights show up as `last_weights`
+            build_weights({0: results}, pool=pool, state=state, epoch=epoch)
+
+            for benchmark, result in results.items():
+                print(f"\nResults for {benchmark}:")
+                for entry in result:
+                    print(entry)
+                if benchmark in scores:
+                    print(f"Accuracy: {scores[benchmark].mean():.3f}")
 
-    for benchmark, result in results.items():
-        print(f"\nResults for {benchmark}:")
-        for entry in result:
-            print(entry)
+            if not status_port:
+                break
+            controls.wait_for_trigger()
+            epoch += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pool is not None:
+            pool.close()
 
 if __name__ == "__main__":
-    run_benchmarks()
\ No newline at end of file
+    run_benchmarks()
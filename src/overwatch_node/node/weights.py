@@ -0,0 +1,245 @@
+"""
+Benchmark results -> per-subnet weights -> compact payload for `submit_benchmark_weights`
+
+Weights are normalised with NumPy, quantised to u16 fixed-point summing exactly to
+``WEIGHT_SCALE`` and encoded as sorted subnet ids (delta + varint) followed by varint weights,
+which is a fraction of the size of a SCALE ``Vec<(u32, u16)>`` for realistic subnet counts.
+The payload is committed with a salted blake2b hash; the commitment is what gets submitted,
+and the salt and payload are kept to reveal and verify it.
+"""
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from node.eval_items import EvalResult, normalize_text
+
+PAYLOAD_VERSION = 1
+WEIGHT_SCALE = 65535
+SALT_BYTES = 16
+
+# "The answer is (B)", "Answer: 42", the span runs to the end of its line
+ANSWER_SPAN = re.compile(r"answer\s*(?:is|:)\s*(.+)", re.IGNORECASE)
+BOXED = re.compile(r"\\boxed\{([^{}]*)\}")
+CHOICE = re.compile(r"(?<![A-Za-z])\(?([A-J])\)?(?![A-Za-z])")
+NUMBER = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+EDGE_PUNCTUATION = " .,:;!?\"'`*$"
+
+def _canonical_number(text: str) -> str:
+    try:
+        value = Decimal(text.replace(",", ""))
+    except InvalidOperation:
+        return text
+    return str(int(value)) if value == value.to_integral_value() else str(value.normalize())
+
+def canonical_answer(text: str) -> str:
+    """Normalized answer without surrounding punctuation, ``\\boxed{}`` or choice parentheses"""
+    text = normalize_text(text)
+    boxed = BOXED.findall(text)
+    if boxed:
+        text = boxed[-1]
+    text = text.strip(EDGE_PUNCTUATION)
+    choice = re.fullmatch(r"\(([a-j])\)", text)
+    if choice:
+        return choice.group(1)
+    if NUMBER.fullmatch(text):
+        return _canonical_number(text)
+    return text
+
+def final_answer(output, candidate: str) -> str:
+    """
+    Extracts the final answer of a model output in the form of ``candidate``: the choice letter
+    or number of the last "answer is" span (or ``\\boxed{}``), else the last one in the output,
+    and for text answers that span or the last non-empty line
+    """
+    text = "" if output is None else str(output)
+    spans = ANSWER_SPAN.findall(text) or BOXED.findall(text)
+    span = spans[-1] if spans else None
+
+    if CHOICE.fullmatch(candidate.upper()):
+        # Outside an answer span only capitals count, so the article "a" is not read as a choice
+        matches = CHOICE.findall(span.upper() if span is not None else text)
+        return (matches[0] if span is not None else matches[-1]).lower() if matches else ""
+    if NUMBER.fullmatch(candidate):
+        matches = NUMBER.findall(span if span is not None else text)
+        return _canonical_number(matches[0] if span is not None else matches[-1]) if matches else ""
+    if span is None:
+        lines = [line for line in text.splitlines() if line.strip()]
+        span = lines[-1] if lines else ""
+    return canonical_answer(span)
+
+def score_answer(candidates: Sequence[str], actual) -> float:
+    """1.0 if the final answer extracted from the model output equals a normalized expected answer"""
+    for candidate in candidates:
+        candidate = canonical_answer(candidate)
+        if candidate and final_answer(actual, candidate) == candidate:
+            return 1.0
+    return 0.0
+
+
+def score_result(result: EvalResult) -> float:
+    """Scores a single benchmark result"""
+    return score_answer(result.item.candidates, result.actual)
+
+
+def score_benchmarks(results: Dict[str, List[EvalResult]], pool=None) -> float:
+    """
+    Returns the mean accuracy over benchmarks of a `BenchmarkManager.run_all` result, scored in
+    an optional `node.workers.EvalWorkerPool`
+    """
+    if pool is not None:
+        accuracies = [scores.mean() for scores in pool.score_benchmarks(results).values()]
+    else:
+        accuracies = [
+            np.mean([score_result(entry) for entry in entries]) for entries in results.values() if entries
+        ]
+    return float(np.mean(accuracies)) if accuracies else 0.0
+
+
+def compute_weights(subnet_scores: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Normalises scores to weights summing to 1
+
+    Returns:
+      Tuple[np.ndarray, np.ndarray]: (sorted uint32 subnet ids, float64 weights)
+    """
+    ids = np.fromiter(subnet_scores.keys(), dtype=np.uint32, count=len(subnet_scores))
+    scores = np.fromiter(subnet_scores.values(), dtype=np.float64, count=len(subnet_scores))
+    order = np.argsort(ids, kind="stable")
+    ids, scores = ids[order], np.clip(scores[order], 0.0, None)
+
+    total = scores.sum()
+    if total <= 0:
+        return ids, np.zeros_like(scores)
+    return ids, scores / total
+
+
+def quantize(weights: np.ndarray, scale: int = WEIGHT_SCALE) -> np.ndarray:
+    """
+    Converts weights summing to 1 into integers summing exactly to ``scale``, handing the
+    rounding remainder to the largest fractional parts
+    """
+    if weights.size == 0 or weights.sum() <= 0:
+        return np.zeros(weights.shape, dtype=np.uint32)
+
+    scaled = weights / weights.sum() * scale
+    quantized = np.floor(scaled).astype(np.int64)
+    remainder = scale - int(quantized.sum())
+    if remainder > 0:
+        largest = np.argsort(-(scaled - quantized), kind="stable")[:remainder]
+        quantized[largest] += 1
+    return quantized.astype(np.uint32)
+
+
+def _encode_varints(values: np.ndarray) -> bytes:
+    out = bytearray()
+    for value in values.tolist():
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def _decode_varints(payload: bytes, offset: int, count: int) -> Tuple[List[int], int]:
+    values = []
+    for _ in range(count):
+        value = 0
+        shift = 0
+        while True:
+            if offset >= len(payload):
+                raise ValueError("Truncated weights payload")
+            byte = payload[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        values.append(value)
+    return values, offset
+
+
+def encode_weights(ids: np.ndarray, weights: np.ndarray) -> bytes:
+    """Encodes sorted subnet ids and quantised weights as version, count, id deltas, weights"""
+    if ids.size and np.any(np.diff(ids.astype(np.int64)) <= 0):
+        raise ValueError("Subnet ids must be unique and sorted")
+    deltas = np.diff(ids.astype(np.int64), prepend=0)
+    return (
+        bytes([PAYLOAD_VERSION])
+        + _encode_varints(np.array([ids.size]))
+        + _encode_varints(deltas)
+        + _encode_varints(weights.astype(np.int64))
+    )
+
+
+def decode_weights(payload: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Decodes a payload from `encode_weights` into (subnet ids, quantised weights)"""
+    if not payload or payload[0] != PAYLOAD_VERSION:
+        raise ValueError(f"Unsupported weights payload version {payload[:1]!r}")
+    (count,), offset = _decode_varints(payload, 1, 1)
+    deltas, offset = _decode_varints(payload, offset, count)
+    weights, offset = _decode_varints(payload, offset, count)
+    if offset != len(payload):
+        raise ValueError("Trailing bytes in weights payload")
+    return np.cumsum(np.array(deltas, dtype=np.int64)).astype(np.uint32), np.array(weights, dtype=np.uint32)
+
+
+@dataclass
+class WeightCommitment:
+    """
+    Dataclass for a committed weights payload.
+    """
+
+    commitment: bytes
+    salt: bytes
+    payload: bytes
+
+    def verify(self) -> bool:
+        return commit(self.payload, self.salt) == self.commitment
+
+
+def commit(payload: bytes, salt: bytes) -> bytes:
+    return hashlib.blake2b(salt + payload, digest_size=32).digest()
+
+
+def build_weights(
+    subnet_results: Dict[int, Dict[str, List[EvalResult]]],
+    encrypt: Optional[Callable[[bytes], bytes]] = None,
+    salt: Optional[bytes] = None,
+    pool=None,
+    state=None,
+    epoch: Optional[int] = None,
+) -> Tuple[WeightCommitment, bytes]:
+    """
+    Runs the whole pipeline for one epoch
+
+    Args:
+      subnet_results (Dict[int, Dict[str, List[EvalResult]]]): `BenchmarkManager.run_all` results per subnet id.
+      encrypt (Optional[Callable[[bytes], bytes]]): Optional encryption applied to the payload
+        instead of committing to it, if the runtime expects an encrypted blob.
+      salt (Optional[bytes]): Commitment salt, random by default.
+      pool (Optional[EvalWorkerPool]): Worker pool scoring the results off the node process.
+      state (Optional[NodeState]): Status server state, receives the weights as ``last_weights``.
+      epoch (Optional[int]): Epoch the weights are for, reported as ``last_weights_epoch``.
+
+    Returns:
+      Tuple[WeightCommitment, bytes]: The commitment and the ``encrypted_weights`` argument
+    """
+    subnet_scores = {subnet_id: score_benchmarks(results, pool) for subnet_id, results in subnet_results.items()}
+    ids, weights = compute_weights(subnet_scores)
+    quantized = quantize(weights)
+    payload = encode_weights(ids, quantized)
+    if state is not None:
+        state.update(
+            last_weights={int(subnet_id): int(weight) for subnet_id, weight in zip(ids, quantized)},
+            last_weights_epoch=epoch,
+        )
+
+    salt = salt if salt is not None else os.urandom(SALT_BYTES)
+    commitment = WeightCommitment(commitment=commit(payload, salt), salt=salt, payload=payload)
+    encrypted_weights = encrypt(payload) if encrypt is not None else commitment.commitment
+    return commitment, encrypted_weights
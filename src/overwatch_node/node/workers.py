@@ -0,0 +1,216 @@
+"""
+Process-pool workers for the CPU-heavy parts of an evaluation
+
+Tokenization and scoring hold the GIL, so in the node process they serialize with each other
+and with the swarm I/O. `EvalWorkerPool` runs them in worker processes. Inputs are split into
+one chunk per worker, and results are written straight into shared-memory buffers owned by
+the caller instead of being pickled back as Python lists.
+
+The node only starts a pool when ``EVAL_WORKERS`` is set, see `pool_from_env`, and then uses
+it for tokenization. Scoring an epoch is cheaper inline than the round trip to the workers,
+measure with `node.benchmark_workers` before scoring in the pool.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from node.eval_items import EvalResult
+from node.weights import score_answer
+
+TOKEN_DTYPE = np.int32
+SCORE_DTYPE = np.float64
+
+# Upper bound of tokens per utf-8 byte, byte-level and byte-fallback tokenizers emit at most one
+TOKENS_PER_BYTE = 1
+# Extra room per text for special tokens
+TOKEN_SLACK = 8
+
+# EVAL_WORKERS: worker processes of the evaluation pool, 0 keeps tokenization in the node process
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", "0"))
+
+# Tokenizer of this worker process, created once by `_init_worker`
+_tokenizer = None
+
+
+class SharedBuffer:
+    """Caller-owned shared memory viewed as a 1-d numpy array, workers attach to it by name"""
+
+    def __init__(self, count: int, dtype):
+        self.count = count
+        self.dtype = np.dtype(dtype)
+        self.shm = SharedMemory(create=True, size=max(1, count * self.dtype.itemsize))
+        self.array = np.ndarray((count,), dtype=self.dtype, buffer=self.shm.buf)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def release(self):
+        del self.array
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+
+
+def _attach(name: str, count: int, dtype) -> Tuple[SharedMemory, np.ndarray]:
+    shm = SharedMemory(name=name)
+    return shm, np.ndarray((count,), dtype=dtype, buffer=shm.buf)
+
+
+def _init_worker(tokenizer_factory: Optional[Callable]):
+    global _tokenizer
+    _tokenizer = tokenizer_factory() if tokenizer_factory is not None else None
+
+
+def _tokenize_chunk(texts: List[str], name: str, count: int, start: int, capacity: int) -> List[int]:
+    """Tokenizes ``texts`` into ``[start, start + capacity)`` of the shared buffer, returns lengths"""
+    if _tokenizer is None:
+        raise RuntimeError("Worker pool was created without a tokenizer")
+    ids = _tokenizer(texts, add_special_tokens=False)["input_ids"]
+
+    shm, out = _attach(name, count, TOKEN_DTYPE)
+    try:
+        position = start
+        lengths = []
+        for sequence in ids:
+            if position + len(sequence) > start + capacity:
+                raise ValueError("Token buffer capacity exceeded, raise TOKENS_PER_BYTE")
+            out[position:position + len(sequence)] = sequence
+            position += len(sequence)
+            lengths.append(len(sequence))
+        return lengths
+    finally:
+        del out
+        shm.close()
+
+
+def _score_chunk(pairs: List[Tuple[Tuple[str, ...], str]], name: str, count: int, start: int):
+    shm, out = _attach(name, count, SCORE_DTYPE)
+    try:
+        for i, (candidates, actual) in enumerate(pairs):
+            out[start + i] = score_answer(candidates, actual)
+    finally:
+        del out
+        shm.close()
+
+
+@dataclass
+class TokenBatch:
+    """
+    Dataclass for the token ids of many texts as one flat array, text ``i`` is
+    ``ids[offsets[i]:offsets[i + 1]]``.
+    """
+
+    ids: np.ndarray
+    offsets: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.ids[self.offsets[index]:self.offsets[index + 1]]
+
+
+def _chunks(count: int, parts: int) -> List[Tuple[int, int]]:
+    """Splits ``range(count)`` into at most ``parts`` contiguous (start, end) ranges"""
+    parts = max(1, min(parts, count))
+    bounds = np.linspace(0, count, parts + 1).astype(int)
+    return [(int(bounds[i]), int(bounds[i + 1])) for i in range(parts) if bounds[i] < bounds[i + 1]]
+
+
+class EvalWorkerPool:
+    def __init__(
+        self,
+        workers: int,
+        tokenizer_factory: Optional[Callable] = None,
+        start_method: str = "spawn",
+    ):
+        """
+        :param workers: worker processes
+        :param tokenizer_factory: picklable callable creating the tokenizer once per worker, e.g.
+            ``functools.partial(load_tokenizer, repository)``
+        :param start_method: multiprocessing start method, spawn avoids forking the node's threads
+        """
+        self.workers = workers
+        self.has_tokenizer = tokenizer_factory is not None
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+            initargs=(tokenizer_factory,),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        self._executor.shutdown()
+
+    def tokenize(self, texts: Sequence[str]) -> TokenBatch:
+        texts = list(texts)
+        capacities = [len(text.encode()) * TOKENS_PER_BYTE + TOKEN_SLACK for text in texts]
+        starts = np.concatenate([[0], np.cumsum(capacities, dtype=np.int64)])
+
+        with SharedBuffer(int(starts[-1]), TOKEN_DTYPE) as buffer:
+            futures = [
+                (begin, end, self._executor.submit(
+                    _tokenize_chunk, texts[begin:end], buffer.name, buffer.count,
+                    int(starts[begin]), int(starts[end] - starts[begin]),
+                ))
+                for begin, end in _chunks(len(texts), self.workers)
+            ]
+
+            lengths = np.zeros(len(texts), dtype=np.int64)
+            for begin, end, future in futures:
+                lengths[begin:end] = future.result()
+
+            # Each chunk's ids start at its own offset, gaps between chunks are dropped while copying out
+            offsets = np.concatenate([[0], np.cumsum(lengths)])
+            ids = np.empty(int(offsets[-1]), dtype=TOKEN_DTYPE)
+            for begin, end, _ in futures:
+                chunk_start = int(starts[begin])
+                chunk_length = int(offsets[end] - offsets[begin])
+                ids[offsets[begin]:offsets[end]] = buffer.array[chunk_start:chunk_start + chunk_length]
+        return TokenBatch(ids=ids, offsets=offsets)
+
+    def score(self, results: Sequence[EvalResult]) -> np.ndarray:
+        """Scores results like `node.weights.score_result`"""
+        # Only the normalized answers and outputs are sent, not the prompts
+        pairs = [(result.item.candidates, result.actual) for result in results]
+        with SharedBuffer(len(pairs), SCORE_DTYPE) as buffer:
+            futures = [
+                self._executor.submit(_score_chunk, pairs[begin:end], buffer.name, buffer.count, begin)
+                for begin, end in _chunks(len(pairs), self.workers)
+            ]
+            for future in futures:
+                future.result()
+            return buffer.array.copy()
+
+    def score_benchmarks(self, results: Dict[str, List[EvalResult]]) -> Dict[str, np.ndarray]:
+        """Scores all entries of a `BenchmarkManager.run_all` result in one pass over the pool"""
+        names = [name for name, entries in results.items() if entries]
+        scores = self.score([result for name in names for result in results[name]])
+        split = np.cumsum([len(results[name]) for name in names])[:-1]
+        return dict(zip(names, np.split(scores, split)))
+
+
+def pool_from_env(tokenizer_factory: Optional[Callable] = None) -> Optional[EvalWorkerPool]:
+    """Returns a pool of ``EVAL_WORKERS`` processes, None when it is 0"""
+    if EVAL_WORKERS <= 0:
+        return None
+    return EvalWorkerPool(EVAL_WORKERS, tokenizer_factory=tokenizer_factory)
@@ -0,0 +1,293 @@
+"""
+Batched overwatch stake operations across many accounts
+
+Operations are grouped per signing account into `Utility.batch_all` calls. Each signer is
+submitted on its own worker with its own connection and a locally tracked nonce, so a fleet
+of accounts is processed concurrently instead of one process invocation per account.
+"""
+import csv
+import json
+import threading
+from decimal import Decimal, InvalidOperation
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from substrateinterface import Keypair, SubstrateInterface
+from substrateinterface.exceptions import SubstrateRequestException
+
+from metrics.node_metrics import EXTRINSIC_INCLUSION, RPC_ERRORS, RPC_LATENCY
+from substrate.preflight import OVERWATCH_STAKE_STORAGE, overwatch_stake
+
+import logging
+logger = logging.getLogger(__name__)
+
+# action -> (call function, call param)
+STAKE_CALLS = {
+  "add": ("add_to_overwatch_stake", "stake_to_be_added"),
+  "remove": ("remove_overwatch_stake", "stake_to_be_removed"),
+}
+
+# Calls per `batch_all`, keeps each extrinsic well below the block weight limit
+DEFAULT_BATCH_SIZE = 32
+
+
+@dataclass
+class StakeOperation:
+  """
+  Dataclass for one stake operation of a batch file.
+
+  ``amount`` is in the chain's integer base units. ``hotkey`` keys the overwatch stake as in
+  `Preflight`, defaulting to the signing account. ``status`` is ``unknown`` when the extrinsic
+  may or may not have been included.
+  """
+
+  index: int
+  account: str
+  amount: int
+  action: str = "add"
+  hotkey: Optional[str] = None
+  status: str = "pending"
+  error: Optional[str] = None
+  extrinsic_hash: Optional[str] = None
+  block_hash: Optional[str] = None
+
+
+@dataclass
+class SignerBatch:
+  """
+  Dataclass for the operations signed by one keypair, in submission order.
+  """
+
+  keypair: Keypair
+  operations: List[StakeOperation] = field(default_factory=list)
+
+
+def load_operations(path: str, default_action: str = "add") -> List[StakeOperation]:
+  """
+  Reads operations from a CSV file with ``account``, ``amount`` and optional ``action`` and
+  ``hotkey`` columns, or a JSON list of objects with the same keys
+
+  Amounts are integer base units, as encoded in the u128 call params. Decimal amounts are
+  rejected rather than truncated.
+  """
+  with open(path, newline="") as f:
+    if path.endswith(".json"):
+      rows = json.load(f)
+    else:
+      rows = list(csv.DictReader(f))
+
+  operations = []
+  for index, row in enumerate(rows):
+    action = (row.get("action") or default_action).strip().lower()
+    if action not in STAKE_CALLS:
+      raise ValueError(f"Operation {index}: unknown action {action!r}, expected one of {list(STAKE_CALLS)}")
+    try:
+      amount = Decimal(str(row["amount"]).strip())
+    except InvalidOperation:
+      raise ValueError(f"Operation {index}: amount {row['amount']!r} is not a number")
+    if not amount.is_finite() or amount != amount.to_integral_value():
+      raise ValueError(f"Operation {index}: amount must be an integer in base units, got {row['amount']!r}")
+    if amount <= 0:
+      raise ValueError(f"Operation {index}: amount must be positive, got {amount}")
+    hotkey = str(row.get("hotkey") or "").strip() or None
+    operations.append(StakeOperation(index=index, account=str(row["account"]).strip(), amount=int(amount), action=action, hotkey=hotkey))
+  return operations
+
+
+def load_keypairs(path: str) -> Dict[str, Keypair]:
+  """
+  Reads a JSON object of ``{name: secret uri or mnemonic}`` and indexes each keypair by both
+  its name and its ss58 address
+  """
+  with open(path) as f:
+    secrets = json.load(f)
+
+  keypairs = {}
+  for name, secret in secrets.items():
+    keypair = Keypair.create_from_uri(secret)
+    keypairs[name] = keypair
+    keypairs[keypair.ss58_address] = keypair
+  return keypairs
+
+
+def group_by_signer(operations: List[StakeOperation], keypairs: Dict[str, Keypair]) -> List[SignerBatch]:
+  """
+  Groups operations per signing account, operations without a known key are marked failed.
+  Operations without a hotkey stake towards the signing account.
+  """
+  batches: Dict[str, SignerBatch] = {}
+  for operation in operations:
+    keypair = keypairs.get(operation.account)
+    if keypair is None:
+      operation.status = "failed"
+      operation.error = "No key for account"
+      continue
+    operation.hotkey = operation.hotkey or keypair.ss58_address
+    batch = batches.setdefault(keypair.ss58_address, SignerBatch(keypair))
+    batch.operations.append(operation)
+  return list(batches.values())
+
+
+class BatchStaker:
+  def __init__(
+    self,
+    interface_factory: Callable[[], SubstrateInterface],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_workers: int = 8,
+    resend_attempts: int = 1,
+  ):
+    """
+    :param interface_factory: returns a new interface, called once per worker since
+      connections are not shared between threads
+    :param batch_size: maximum calls per `batch_all` extrinsic
+    :param max_workers: signers submitted concurrently
+    :param resend_attempts: resends of a chunk whose outcome is unknown and whose stake
+      change is not on chain
+    """
+    self.interface_factory = interface_factory
+    self.batch_size = batch_size
+    self.max_workers = max_workers
+    self.resend_attempts = resend_attempts
+    self._local = threading.local()
+
+  def _interface(self) -> SubstrateInterface:
+    if getattr(self._local, "interface", None) is None:
+      self._local.interface = self.interface_factory()
+    return self._local.interface
+
+  def _compose(self, substrate: SubstrateInterface, operations: List[StakeOperation]):
+    calls = []
+    for operation in operations:
+      call_function, call_param = STAKE_CALLS[operation.action]
+      calls.append(substrate.compose_call(
+        call_module='Network',
+        call_function=call_function,
+        call_params={call_param: operation.amount},
+      ))
+    if len(calls) == 1:
+      return calls[0]
+    return substrate.compose_call(
+      call_module='Utility',
+      call_function='batch_all',
+      call_params={'calls': calls},
+    )
+
+  def _fetch_nonce(self, substrate: SubstrateInterface, keypair: Keypair) -> int:
+    with RPC_LATENCY.labels(method="get_account_nonce").time():
+      return substrate.get_account_nonce(keypair.ss58_address)
+
+  def _stakes(self, substrate: SubstrateInterface, operations: List[StakeOperation]) -> Dict[str, int]:
+    """Returns the overwatch stake of each hotkey of ``operations``, keyed as in `Preflight`"""
+    stakes = {}
+    for operation in operations:
+      if operation.hotkey not in stakes:
+        with RPC_LATENCY.labels(method=f"query.{OVERWATCH_STAKE_STORAGE}").time():
+          stakes[operation.hotkey] = overwatch_stake(lambda *args: substrate.query(*args).value, operation.hotkey)
+    return stakes
+
+  @staticmethod
+  def _stake_change(stakes: Dict[str, int], operations: List[StakeOperation]) -> Dict[str, int]:
+    """Returns ``stakes`` after ``operations`` are applied"""
+    expected = dict(stakes)
+    for operation in operations:
+      expected[operation.hotkey] += operation.amount if operation.action == "add" else -operation.amount
+    return expected
+
+  def submit_signer(self, batch: SignerBatch):
+    """
+    Submits one signer's operations in chunks of ``batch_size``, each chunk atomically.
+
+    The nonce is fetched once and incremented locally per included extrinsic, and refetched
+    only after a send error, when it may be out of sync with the chain.
+
+    A send that fails without the node rejecting it leaves the chunk ``unknown``. The stake is
+    then re-checked on chain, and if the chunk's change is not there the chunk is resent with
+    the same nonce, so at most one of the sends can ever be included.
+    """
+    substrate = self._interface()
+    keypair = batch.keypair
+    nonce = None
+    for start in range(0, len(batch.operations), self.batch_size):
+      chunk = batch.operations[start:start + self.batch_size]
+      try:
+        if nonce is None:
+          nonce = self._fetch_nonce(substrate, keypair)
+        stakes = self._stakes(substrate, chunk)
+        call = self._compose(substrate, chunk)
+      except Exception as e:
+        self._finish(chunk, "failed", error=str(e))
+        nonce = None
+        continue
+
+      for attempt in range(self.resend_attempts + 1):
+        try:
+          extrinsic = substrate.create_signed_extrinsic(call=call, keypair=keypair, nonce=nonce)
+          with EXTRINSIC_INCLUSION.labels(call="batch_all").time():
+            receipt = substrate.submit_extrinsic(extrinsic, wait_for_inclusion=True)
+        except SubstrateRequestException as e:
+          RPC_ERRORS.labels(method="submit_extrinsic").inc()
+          if attempt == 0:
+            self._finish(chunk, "failed", error=f"Failed to send: {e}")
+          else:
+            # A resend is rejected when the earlier send already holds the nonce
+            self._finish(chunk, "unknown", error=f"Resend rejected, check stake on chain: {e}")
+          nonce = None
+          break
+        except Exception as e:
+          RPC_ERRORS.labels(method="submit_extrinsic").inc()
+          self._finish(chunk, "unknown", error=f"Send outcome unknown: {e}")
+          try:
+            included = self._stakes(substrate, chunk) == self._stake_change(stakes, chunk)
+          except Exception as check_error:
+            logger.warning(f"Could not re-check stake of {keypair.ss58_address}: {check_error}")
+            nonce = None
+            break
+          if included:
+            self._finish(chunk, "success")
+            nonce += 1
+            break
+          continue
+
+        # An included extrinsic consumes the nonce whether or not the call succeeded
+        nonce += 1
+        if receipt.is_success:
+          self._finish(chunk, "success", receipt.extrinsic_hash, receipt.block_hash)
+        else:
+          # `batch_all` is atomic, a failing call reverts the whole chunk
+          self._finish(chunk, "failed", receipt.extrinsic_hash, receipt.block_hash, str(receipt.error_message))
+        break
+      else:
+        # Every send ended unknown, the nonce may or may not have been consumed
+        nonce = None
+
+  @staticmethod
+  def _finish(
+    operations: List[StakeOperation],
+    status: str,
+    extrinsic_hash: Optional[str] = None,
+    block_hash: Optional[str] = None,
+    error: Optional[str] = None,
+  ):
+    for operation in operations:
+      operation.status = status
+      operation.extrinsic_hash = extrinsic_hash
+      operation.block_hash = block_hash
+      operation.error = error
+
+  def run(self, batches: List[SignerBatch]):
+    """Submits every signer's batches, at most ``max_workers`` signers at a time"""
+    if not batches:
+      return
+    with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches)), thread_name_prefix="batch-stake") as executor:
+      for future in [executor.submit(self.submit_signer, batch) for batch in batches]:
+        future.result()
+
+
+def write_report(path: str, operations: List[StakeOperation]):
+  fields = ["index", "account", "hotkey", "action", "amount", "status", "error", "extrinsic_hash", "block_hash"]
+  with open(path, "w", newline="") as f:
+    writer = csv.DictWriter(f, fieldnames=fields)
+    writer.writeheader()
+    for operation in operations:
+      writer.writerow({name: getattr(operation, name) for name in fields})
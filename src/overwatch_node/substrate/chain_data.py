@@ -75,6 +75,23 @@ class ChainDataType(Enum):
   RewardsData = 2
   SubnetNodeInfo = 3
 
+_rpc_runtime_config: Optional[RuntimeConfiguration] = None
+
+def get_runtime_config() -> RuntimeConfiguration:
+  """
+  Returns the runtime configuration used to decode RPC results.
+
+  Loading the legacy type registry preset is far more expensive than decoding itself, so the
+  configuration is built once and shared by every decode.
+  """
+  global _rpc_runtime_config
+  if _rpc_runtime_config is None:
+    rpc_runtime_config = RuntimeConfiguration()
+    rpc_runtime_config.update_type_registry(load_type_registry_preset("legacy"))
+    rpc_runtime_config.update_type_registry(custom_rpc_type_registry)
+    _rpc_runtime_config = rpc_runtime_config
+  return _rpc_runtime_config
+
 def from_scale_encoding(
     input: Union[List[int], bytes, ScaleBytes],
     type_name: ChainDataType,
@@ -128,11 +145,7 @@ def from_scale_encoding_using_type_string(
 
     as_scale_bytes = scalecodec.ScaleBytes(as_bytes)
 
-  rpc_runtime_config = RuntimeConfiguration()
-  rpc_runtime_config.update_type_registry(load_type_registry_preset("legacy"))
-  rpc_runtime_config.update_type_registry(custom_rpc_type_registry)
-
-  obj = rpc_runtime_config.create_scale_object(type_string, data=as_scale_bytes)
+  obj = get_runtime_config().create_scale_object(type_string, data=as_scale_bytes)
 
   return obj.decode()
 
@@ -199,4 +212,36 @@ class SubnetNode:
     """
     data = SubnetNode(**data)
 
-    return data
\ No newline at end of file
+    return data
+
+@dataclass
+class RewardsData:
+  """
+  Dataclass for overwatch rewards data.
+  """
+
+  peer_id: str
+  score: int
+
+  @classmethod
+  def fix_decoded_values(cls, data_decoded: Any) -> "RewardsData":
+    """Fixes the values of the RewardsData object."""
+    data_decoded["peer_id"] = data_decoded["peer_id"]
+    data_decoded["score"] = int(data_decoded["score"])
+
+    return cls(**data_decoded)
+
+  @classmethod
+  def list_from_vec_u8(cls, vec_u8: List[int]) -> List["RewardsData"]:
+    """Returns a list of RewardsData objects from a ``vec_u8``."""
+
+    decoded_list = from_scale_encoding(
+      vec_u8, ChainDataType.RewardsData, is_vec=True
+    )
+    if decoded_list is None:
+      return []
+
+    decoded_list = [
+      RewardsData.fix_decoded_values(decoded) for decoded in decoded_list
+    ]
+    return decoded_list
@@ -1,12 +1,17 @@
 from typing import Any, Optional
 from substrateinterface import SubstrateInterface, Keypair, ExtrinsicReceipt
 from substrateinterface.exceptions import SubstrateRequestException
-from tenacity import retry, stop_after_attempt, wait_exponential, wait_fixed
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_exponential, wait_fixed
 from substrate.config import BLOCK_SECS
+from substrate.endpoints import AllEndpointsFailed, SubmitOutcomeUnknown
 from tenacity import RetryCallState
+from metrics.node_metrics import EXTRINSIC_INCLUSION, RPC_ERRORS, RPC_LATENCY
 
 retry_counter = 0
 
+# A send that may have reached a node is not repeated, the extrinsic could already be included
+NOT_RESENT = (SubmitOutcomeUnknown, AllEndpointsFailed)
+
 def increment_counter(retry_state: RetryCallState):
     global retry_counter
     retry_counter += 1
@@ -17,10 +22,13 @@ def get_block_number(substrate: SubstrateInterface):
   def make_query():
     try:
       with substrate as _substrate:
-        block_hash = _substrate.get_block_hash()
-        block_number = _substrate.get_block_number(block_hash)
+        with RPC_LATENCY.labels(method="get_block_hash").time():
+          block_hash = _substrate.get_block_hash()
+        with RPC_LATENCY.labels(method="get_block_number").time():
+          block_number = _substrate.get_block_number(block_hash)
         return block_number
     except SubstrateRequestException as e:
+      RPC_ERRORS.labels(method="get_block_number").inc()
       print("Failed to get query request: {}".format(e))
 
   return make_query()
@@ -56,19 +64,22 @@ def register_overwatch_node(
     }
   )
 
-  @retry(wait=wait_fixed(BLOCK_SECS+1), stop=stop_after_attempt(4))
+  @retry(wait=wait_fixed(BLOCK_SECS+1), stop=stop_after_attempt(4), retry=retry_if_not_exception_type(NOT_RESENT))
   def submit_extrinsic():
     try:
       with substrate as _substrate:
         # get none on retries
-        nonce = _substrate.get_account_nonce(keypair.ss58_address)
+        with RPC_LATENCY.labels(method="get_account_nonce").time():
+          nonce = _substrate.get_account_nonce(keypair.ss58_address)
 
         # create signed extrinsic
         extrinsic = _substrate.create_signed_extrinsic(call=call, keypair=keypair, nonce=nonce)
 
-        receipt = _substrate.submit_extrinsic(extrinsic, wait_for_inclusion=True)
+        with EXTRINSIC_INCLUSION.labels(call="register_overwatch_node").time():
+          receipt = _substrate.submit_extrinsic(extrinsic, wait_for_inclusion=True)
         return receipt
     except SubstrateRequestException as e:
+      RPC_ERRORS.labels(method="submit_extrinsic").inc()
       print("Failed to send: {}".format(e))
 
   return submit_extrinsic()
@@ -94,19 +105,22 @@ def activate_overwatch_node(
     }
   )
 
-  @retry(wait=wait_fixed(BLOCK_SECS+1), stop=stop_after_attempt(4))
+  @retry(wait=wait_fixed(BLOCK_SECS+1), stop=stop_after_attempt(4), retry=retry_if_not_exception_type(NOT_RESENT))
   def submit_extrinsic():
     try:
       with substrate as _substrate:
         # get none on retries
-        nonce = _substrate.get_account_nonce(keypair.ss58_address)
+        with RPC_LATENCY.labels(method="get_account_nonce").time():
+          nonce = _substrate.get_account_nonce(keypair.ss58_address)
 
         # create signed extrinsic
         extrinsic = _substrate.create_signed_extrinsic(call=call, keypair=keypair, nonce=nonce)
 
-        receipt = _substrate.submit_extrinsic(extrinsic, wait_for_inclusion=True)
+        with EXTRINSIC_INCLUSION.labels(call="activate_overwatch_node").time():
+          receipt = _substrate.submit_extrinsic(extrinsic, wait_for_inclusion=True)
         return receipt
     except SubstrateRequestException as e:
+      RPC_ERRORS.labels(method="submit_extrinsic").inc()
       print("Failed to send: {}".format(e))
 
   return submit_extrinsic()
@@ -133,19 +147,22 @@ def add_to_stake(
     }
   )
 
-  @retry(wait=wait_fixed(BLOCK_SECS+1), stop=stop_after_attempt(4))
+  @retry(wait=wait_fixed(BLOCK_SECS+1), stop=stop_after_attempt(4), retry=retry_if_not_exception_type(NOT_RESENT))
   def submit_extrinsic():
     try:
       with substrate as _substrate:
         # get none on retries
-        nonce = _substrate.get_account_nonce(keypair.ss58_address)
+        with RPC_LATENCY.labels(method="get_account_nonce").time():
+          nonce = _substrate.get_account_nonce(keypair.ss58_address)
 
         # create signed extrinsic
         extrinsic = _substrate.create_signed_extrinsic(call=call, keypair=keypair, nonce=nonce)
 
-        receipt = _substrate.submit_extrinsic(extrinsic, wait_for_inclusion=True)
+        with EXTRINSIC_INCLUSION.labels(call="add_to_overwatch_stake").time():
+          receipt = _substrate.submit_extrinsic(extrinsic, wait_for_inclusion=True)
         return receipt
     except SubstrateRequestException as e:
+      RPC_ERRORS.labels(method="submit_extrinsic").inc()
       print("Failed to send: {}".format(e))
 
   return submit_extrinsic()
@@ -175,19 +192,22 @@ def remove_stake(
     }
   )
 
-  @retry(wait=wait_fixed(BLOCK_SECS+1), stop=stop_after_attempt(4))
+  @retry(wait=wait_fixed(BLOCK_SECS+1), stop=stop_after_attempt(4), retry=retry_if_not_exception_type(NOT_RESENT))
   def submit_extrinsic():
     try:
       with substrate as _substrate:
         # get none on retries
-        nonce = _substrate.get_account_nonce(keypair.ss58_address)
+        with RPC_LATENCY.labels(method="get_account_nonce").time():
+          nonce = _substrate.get_account_nonce(keypair.ss58_address)
 
         # create signed extrinsic
         extrinsic = _substrate.create_signed_extrinsic(call=call, keypair=keypair, nonce=nonce)
 
-        receipt = _substrate.submit_extrinsic(extrinsic, wait_for_inclusion=True)
+        with EXTRINSIC_INCLUSION.labels(call="remove_overwatch_stake").time():
+          receipt = _substrate.submit_extrinsic(extrinsic, wait_for_inclusion=True)
         return receipt
     except SubstrateRequestException as e:
+      RPC_ERRORS.labels(method="submit_extrinsic").inc()
       print("Failed to send: {}".format(e))
 
   return submit_extrinsic()
@@ -219,17 +239,19 @@ def submit_benchmark_weights(
   )
 
   # @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(4), after=increment_counter)
-  @retry(wait=wait_fixed(BLOCK_SECS+1), stop=stop_after_attempt(4), after=increment_counter)
+  @retry(wait=wait_fixed(BLOCK_SECS+1), stop=stop_after_attempt(4), retry=retry_if_not_exception_type(NOT_RESENT), after=increment_counter)
   def submit_extrinsic():
     try:
       with substrate as _substrate:
         # get none on retries
-        nonce = _substrate.get_account_nonce(keypair.ss58_address)
+        with RPC_LATENCY.labels(method="get_account_nonce").time():
+          nonce = _substrate.get_account_nonce(keypair.ss58_address)
 
         # create signed extrinsic
         extrinsic = _substrate.create_signed_extrinsic(call=call, keypair=keypair, nonce=nonce)
 
-        receipt = _substrate.submit_extrinsic(extrinsic, wait_for_inclusion=True)
+        with EXTRINSIC_INCLUSION.labels(call="submit_benchmark_weights").time():
+          receipt = _substrate.submit_extrinsic(extrinsic, wait_for_inclusion=True)
         if receipt.is_success:
           print('✅ Success, triggered events:')
           for event in receipt.triggered_events:
@@ -239,6 +261,7 @@ def submit_benchmark_weights(
 
         return receipt
     except SubstrateRequestException as e:
+      RPC_ERRORS.labels(method="submit_extrinsic").inc()
       print("Failed to send: {}".format(e))
 
   return submit_extrinsic()
\ No newline at end of file
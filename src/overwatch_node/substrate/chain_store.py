@@ -0,0 +1,242 @@
+"""
+Local SQLite store of indexed `SubnetNode` and `RewardsData` history and Network events
+
+u128 scores don't fit SQLite integers, so they are stored exactly as text alongside a float
+copy used for aggregates and sorting.
+"""
+import dataclasses
+import json
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+from substrate.chain_data import RewardsData
+from substrate.events import ChainEvent
+from substrate.peer_directory import NodeRecord, peer_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS indexed_blocks (
+  block INTEGER PRIMARY KEY,
+  epoch INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subnet_nodes (
+  block INTEGER NOT NULL,
+  epoch INTEGER NOT NULL,
+  peer_id BLOB NOT NULL,
+  hotkey TEXT NOT NULL,
+  coldkey TEXT NOT NULL,
+  classification TEXT NOT NULL,
+  start_epoch INTEGER NOT NULL,
+  PRIMARY KEY (block, peer_id)
+);
+CREATE INDEX IF NOT EXISTS subnet_nodes_peer_id ON subnet_nodes (peer_id, block);
+CREATE INDEX IF NOT EXISTS subnet_nodes_hotkey ON subnet_nodes (hotkey, block);
+CREATE TABLE IF NOT EXISTS rewards (
+  block INTEGER NOT NULL,
+  epoch INTEGER NOT NULL,
+  peer_id BLOB NOT NULL,
+  score TEXT NOT NULL,
+  score_f REAL NOT NULL,
+  PRIMARY KEY (block, peer_id)
+);
+CREATE INDEX IF NOT EXISTS rewards_peer_id ON rewards (peer_id, epoch);
+CREATE INDEX IF NOT EXISTS rewards_epoch ON rewards (epoch);
+CREATE TABLE IF NOT EXISTS events (
+  block INTEGER NOT NULL,
+  event_index INTEGER NOT NULL,
+  kind TEXT NOT NULL,
+  account TEXT,
+  data TEXT NOT NULL,
+  PRIMARY KEY (block, event_index)
+);
+CREATE INDEX IF NOT EXISTS events_account ON events (account, block);
+CREATE TABLE IF NOT EXISTS event_subjects (
+  block INTEGER NOT NULL,
+  event_index INTEGER NOT NULL,
+  account TEXT,
+  node_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS event_subjects_event ON event_subjects (block, event_index);
+CREATE INDEX IF NOT EXISTS event_subjects_account ON event_subjects (account, block);
+CREATE INDEX IF NOT EXISTS event_subjects_node_id ON event_subjects (node_id, block);
+"""
+
+
+class ChainStore:
+  def __init__(self, path: str, epoch_length: int = 1):
+    """
+    :param path: SQLite database path, ``:memory:`` for a throwaway store
+    :param epoch_length: blocks per epoch, used to derive the epoch of each indexed block
+    """
+    self.path = path
+    self.epoch_length = epoch_length
+    self._conn = sqlite3.connect(path, check_same_thread=False)
+    self._conn.execute("PRAGMA journal_mode=WAL")
+    self._conn.execute("PRAGMA synchronous=NORMAL")
+    self._conn.executescript(SCHEMA)
+    self._lock = threading.Lock()
+
+  def close(self):
+    self._conn.close()
+
+  def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+    with self._lock:
+      return self._conn.execute(sql, params).fetchall()
+
+  def epoch_of(self, block: int) -> int:
+    return block // self.epoch_length
+
+  def last_indexed_block(self) -> Optional[int]:
+    """Returns the last block of the contiguously indexed range, where indexing resumes from"""
+    rows = self._query("SELECT value FROM meta WHERE key = 'last_indexed_block'")
+    return int(rows[0][0]) if rows else None
+
+  def write_blocks(
+    self,
+    blocks: Iterable[Tuple[int, List[NodeRecord], List[RewardsData]]],
+    last_indexed_block: Optional[int] = None,
+  ):
+    """Writes decoded blocks in a single transaction, optionally advancing the resume point"""
+    with self._lock, self._conn:
+      for block, nodes, rewards in blocks:
+        epoch = self.epoch_of(block)
+        self._conn.execute("INSERT OR REPLACE INTO indexed_blocks VALUES (?, ?)", (block, epoch))
+        self._conn.executemany(
+          "INSERT OR REPLACE INTO subnet_nodes VALUES (?, ?, ?, ?, ?, ?, ?)",
+          [
+            (block, epoch, node.peer_id, node.hotkey, node.coldkey, node.classification, node.start_epoch)
+            for node in nodes
+          ],
+        )
+        self._conn.executemany(
+          "INSERT OR REPLACE INTO rewards VALUES (?, ?, ?, ?, ?)",
+          [
+            (block, epoch, peer_key(reward.peer_id), str(reward.score), float(reward.score))
+            for reward in rewards
+          ],
+        )
+      if last_indexed_block is not None:
+        self._conn.execute(
+          "INSERT OR REPLACE INTO meta VALUES ('last_indexed_block', ?)", (str(last_indexed_block),)
+        )
+
+  def peer_scores(self, peer_id, last_epochs: int = 1000) -> List[Tuple[int, int]]:
+    """Returns [(epoch, exact score)] of ``peer_id`` over the last ``last_epochs`` indexed epochs"""
+    row = self._query("SELECT MAX(epoch) FROM rewards")[0]
+    if row[0] is None:
+      return []
+    rows = self._query(
+      "SELECT epoch, score FROM rewards WHERE peer_id = ? AND epoch > ? ORDER BY epoch, block",
+      (peer_key(peer_id), row[0] - last_epochs),
+    )
+    return [(epoch, int(score)) for epoch, score in rows]
+
+  def epoch_rewards(self, first_epoch: int, last_epoch: int) -> List[Tuple[int, bytes, int]]:
+    """Returns [(epoch, peer_id, exact score)] for every peer in the epoch range, inclusive"""
+    rows = self._query(
+      "SELECT epoch, peer_id, score FROM rewards WHERE epoch BETWEEN ? AND ? ORDER BY epoch",
+      (first_epoch, last_epoch),
+    )
+    return [(epoch, peer_id, int(score)) for epoch, peer_id, score in rows]
+
+  def nodes_at(self, block: int) -> List[NodeRecord]:
+    """Returns the node list of the closest indexed block at or before ``block``"""
+    row = self._query("SELECT MAX(block) FROM indexed_blocks WHERE block <= ?", (block,))[0]
+    if row[0] is None:
+      return []
+    rows = self._query(
+      "SELECT peer_id, hotkey, coldkey, classification, start_epoch FROM subnet_nodes WHERE block = ?",
+      (row[0],),
+    )
+    return [NodeRecord(*row) for row in rows]
+
+  def hotkey_history(self, hotkey: str, last_blocks: int = 1000) -> List[Tuple[int, str]]:
+    """Returns [(block, classification)] of ``hotkey`` over the last ``last_blocks`` blocks"""
+    return self._query(
+      """
+      SELECT block, classification FROM subnet_nodes
+      WHERE hotkey = ? AND block > (SELECT COALESCE(MAX(block), 0) FROM indexed_blocks) - ?
+      ORDER BY block
+      """,
+      (hotkey, last_blocks),
+    )
+
+  def write_events(self, events: List[ChainEvent]):
+    """
+    Writes decoded events, usable directly as an `EventBus` consumer
+
+    Every account and overwatch node id an event concerns gets its own `event_subjects` row,
+    so an event is found by any of them.
+    """
+    with self._lock, self._conn:
+      self._conn.executemany(
+        "DELETE FROM event_subjects WHERE block = ? AND event_index = ?",
+        [(event.block_number, event.event_index) for event in events],
+      )
+      self._conn.executemany(
+        "INSERT INTO event_subjects VALUES (?, ?, ?, ?)",
+        [
+          (event.block_number, event.event_index, account, node_id)
+          for event in events
+          for account, node_id in (
+            [(account, None) for account in event.accounts()] + [(None, node_id) for node_id in event.node_ids()]
+          )
+        ],
+      )
+      self._conn.executemany(
+        "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)",
+        [
+          (
+            event.block_number,
+            event.event_index,
+            type(event).__name__,
+            next(iter(event.accounts()), None),
+            # u128 amounts don't fit SQLite integers, JSON keeps them exact
+            json.dumps(dataclasses.asdict(event)),
+          )
+          for event in events
+        ],
+      )
+
+  def account_node_ids(self, account: str) -> List[int]:
+    """Returns the overwatch node ids an indexed event, e.g. a registration, ties to ``account``"""
+    rows = self._query(
+      """
+      SELECT DISTINCT nodes.node_id FROM event_subjects accounts
+      JOIN event_subjects nodes ON nodes.block = accounts.block AND nodes.event_index = accounts.event_index
+      WHERE accounts.account = ? AND nodes.node_id IS NOT NULL
+      ORDER BY nodes.node_id
+      """,
+      (account,),
+    )
+    return [node_id for node_id, in rows]
+
+  def account_events(
+    self,
+    account: str,
+    last_blocks: int = 1000,
+    node_ids: Optional[Iterable[int]] = None,
+  ) -> List[Tuple[int, str, dict]]:
+    """
+    Returns [(block, kind, fields)] of events concerning ``account`` or its overwatch nodes over
+    the last ``last_blocks`` blocks
+
+    :param node_ids: node ids of ``account`` registered before the indexed range, the ids of
+      indexed registrations are looked up
+    """
+    node_ids = sorted(set(node_ids or ()) | set(self.account_node_ids(account)))
+    rows = self._query(
+      f"""
+      SELECT DISTINCT events.block, events.event_index, events.kind, events.data FROM events
+      JOIN event_subjects subjects ON subjects.block = events.block AND subjects.event_index = events.event_index
+      WHERE (subjects.account = ? OR subjects.node_id IN ({", ".join("?" * len(node_ids))}))
+        AND events.block > (SELECT COALESCE(MAX(block), 0) FROM events) - ?
+      ORDER BY events.block, events.event_index
+      """,
+      (account, *node_ids, last_blocks),
+    )
+    return [(block, kind, json.loads(data)) for block, _, kind, data in rows]
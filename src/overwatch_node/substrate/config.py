@@ -2,13 +2,25 @@
 Substrate config file for storing blockchain configuration and parameters in a pickle
 to avoid remote blockchain calls
 """
+from typing import List, Union
+
 from substrateinterface import SubstrateInterface, Keypair
 
 BLOCK_SECS = 6
 
 class SubstrateConfigCustom:
-  def __init__(self, phrase, url):
+  def __init__(self, phrase, url: Union[str, List[str]]):
+    """
+    :param url: endpoint url, or several urls to fail over between, see `substrate.endpoints`
+    """
     self.url = url
-    self.interface: SubstrateInterface = SubstrateInterface(url=url)
+    if isinstance(url, (list, tuple)) and len(url) > 1:
+      from substrate.endpoints import EndpointPool, FailoverSubstrate
+
+      pool = EndpointPool(url)
+      pool.start_probing()
+      self.interface = FailoverSubstrate(pool)
+    else:
+      self.interface: SubstrateInterface = SubstrateInterface(url=url[0] if isinstance(url, (list, tuple)) else url)
     self.keypair = Keypair.create_from_uri(phrase)
-    self.account_id = Keypair.create_from_uri(phrase).ss58_address
\ No newline at end of file
+    self.account_id = Keypair.create_from_uri(phrase).ss58_address
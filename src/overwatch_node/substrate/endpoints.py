@@ -0,0 +1,334 @@
+"""
+Multi-endpoint RPC failover with latency-based endpoint selection
+
+`EndpointPool` keeps a `SubstrateInterface` per configured endpoint, probes them in the
+background and routes each request to the fastest healthy one. A failing request fails over
+to the next endpoint immediately instead of waiting a block for a retry. `FailoverSubstrate`
+wraps a pool behind the `SubstrateInterface` methods used by `chain_functions`, so it can be
+passed anywhere an interface is expected.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from substrateinterface import SubstrateInterface
+
+from metrics.registry import Gauge
+from metrics.node_metrics import RPC_ERRORS, RPC_LATENCY
+from substrate.config import BLOCK_SECS
+
+import logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Weight of the newest sample in the latency moving average
+LATENCY_EWMA_ALPHA = 0.3
+
+# Methods building and sending one extrinsic, kept on one endpoint so the nonce, metadata and
+# signature the extrinsic is built from come from the node it is sent to
+EXTRINSIC_METHODS = {
+  "compose_call",
+  "create_signed_extrinsic",
+  "generate_signature_payload",
+  "get_account_nonce",
+  "get_payment_info",
+  "submit_extrinsic",
+}
+
+# Methods that must not be repeated on another endpoint once sent
+SEND_METHODS = {"submit_extrinsic"}
+
+# Read-only methods that may be raced across endpoints
+READ_METHODS = {
+  "get_block_hash",
+  "get_block_number",
+  "get_block_header",
+  "get_account_nonce",
+  "get_payment_info",
+  "query",
+  "query_map",
+  "rpc_request",
+  "get_events",
+}
+
+ENDPOINT_LATENCY = Gauge(
+  "overwatch_rpc_endpoint_latency_seconds",
+  "Moving average latency of each RPC endpoint",
+  labelnames=("endpoint",),
+)
+
+ENDPOINT_HEALTHY = Gauge(
+  "overwatch_rpc_endpoint_healthy",
+  "Whether each RPC endpoint is currently considered healthy",
+  labelnames=("endpoint",),
+)
+
+
+def endpoints_from_env() -> List[str]:
+  """
+  Returns the endpoint set from ``RPC_ENDPOINTS`` (comma separated), falling back to the
+  single ``RPC``, ``LOCAL_RPC`` and ``DEV_RPC`` variables
+  """
+  urls = os.getenv('RPC_ENDPOINTS')
+  if urls:
+    return [url.strip() for url in urls.split(",") if url.strip()]
+  return [url for url in (os.getenv('RPC'), os.getenv('LOCAL_RPC'), os.getenv('DEV_RPC')) if url]
+
+
+@dataclass
+class Endpoint:
+  """
+  Dataclass for the health and latency of one RPC endpoint.
+  """
+
+  url: str
+  latency: Optional[float] = None
+  failures: int = 0
+  unhealthy_until: float = 0.0
+  interface: Optional[SubstrateInterface] = field(default=None, repr=False)
+  lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+  @property
+  def healthy(self) -> bool:
+    return time.monotonic() >= self.unhealthy_until
+
+
+class AllEndpointsFailed(Exception):
+  pass
+
+
+class SubmitOutcomeUnknown(Exception):
+  """
+  Raised when sending an extrinsic failed after it may have reached the endpoint, it may be on
+  chain and must not be sent again before checking
+  """
+
+
+class EndpointPool:
+  def __init__(
+    self,
+    urls: Sequence[str],
+    probe_interval: float = BLOCK_SECS,
+    failure_threshold: int = 2,
+    cooldown: float = 30.0,
+    request_timeout: float = BLOCK_SECS,
+    interface_factory: Callable[[str], SubstrateInterface] = lambda url: SubstrateInterface(url=url),
+  ):
+    """
+    :param urls: endpoint urls, at least one
+    :param probe_interval: seconds between background health probes
+    :param failure_threshold: consecutive failures before an endpoint is taken out of rotation
+    :param cooldown: seconds an unhealthy endpoint stays out of rotation before it is retried
+    :param request_timeout: seconds to wait for a raced read before giving up on both endpoints
+    """
+    if not urls:
+      raise ValueError("At least one RPC endpoint is required")
+    self.endpoints = [Endpoint(url) for url in urls]
+    self.probe_interval = probe_interval
+    self.failure_threshold = failure_threshold
+    self.cooldown = cooldown
+    self.request_timeout = request_timeout
+    self.interface_factory = interface_factory
+    self._executor = ThreadPoolExecutor(max_workers=max(2, len(self.endpoints)), thread_name_prefix="rpc-race")
+    self._stop = threading.Event()
+    self._probe_thread: Optional[threading.Thread] = None
+
+  def _interface(self, endpoint: Endpoint) -> SubstrateInterface:
+    if endpoint.interface is None:
+      endpoint.interface = self.interface_factory(endpoint.url)
+    return endpoint.interface
+
+  def _record_success(self, endpoint: Endpoint, latency: float):
+    endpoint.latency = latency if endpoint.latency is None else (
+      LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * endpoint.latency
+    )
+    endpoint.failures = 0
+    endpoint.unhealthy_until = 0.0
+    ENDPOINT_LATENCY.labels(endpoint=endpoint.url).set(endpoint.latency)
+    ENDPOINT_HEALTHY.labels(endpoint=endpoint.url).set(1)
+
+  def _record_failure(self, endpoint: Endpoint, error: Exception):
+    endpoint.failures += 1
+    # Drop the connection, it is likely broken and will be re-established on the next use
+    endpoint.interface = None
+    if endpoint.failures >= self.failure_threshold:
+      endpoint.unhealthy_until = time.monotonic() + self.cooldown
+      ENDPOINT_HEALTHY.labels(endpoint=endpoint.url).set(0)
+    logger.warning(f"RPC endpoint {endpoint.url} failed ({endpoint.failures} in a row): {error}")
+
+  def ranked(self) -> List[Endpoint]:
+    """Healthy endpoints fastest first, followed by unhealthy ones soonest-to-recover first"""
+    healthy = [endpoint for endpoint in self.endpoints if endpoint.healthy]
+    unhealthy = [endpoint for endpoint in self.endpoints if not endpoint.healthy]
+    healthy.sort(key=lambda endpoint: float("inf") if endpoint.latency is None else endpoint.latency)
+    unhealthy.sort(key=lambda endpoint: endpoint.unhealthy_until)
+    return healthy + unhealthy
+
+  def _call_endpoint(self, endpoint: Endpoint, fn: Callable[[SubstrateInterface], T], method: str) -> T:
+    with endpoint.lock:
+      start = time.perf_counter()
+      try:
+        result = fn(self._interface(endpoint))
+      except Exception as e:
+        RPC_ERRORS.labels(method=method).inc()
+        self._record_failure(endpoint, e)
+        raise
+      latency = time.perf_counter() - start
+      RPC_LATENCY.labels(method=method).observe(latency)
+      self._record_success(endpoint, latency)
+      return result
+
+  def call(self, fn: Callable[[SubstrateInterface], T], method: str = "call") -> T:
+    """Runs ``fn`` on the fastest healthy endpoint, failing over to the next one on error"""
+    return self.call_preferring(fn, method)[0]
+
+  def call_preferring(
+    self,
+    fn: Callable[[SubstrateInterface], T],
+    method: str = "call",
+    prefer: Optional[Endpoint] = None,
+  ) -> Tuple[T, Endpoint]:
+    """Like `call`, trying ``prefer`` first while it is healthy, also returns the endpoint used"""
+    ranked = self.ranked()
+    if prefer is not None and prefer.healthy:
+      ranked = [prefer] + [endpoint for endpoint in ranked if endpoint is not prefer]
+    last_error = None
+    for endpoint in ranked:
+      try:
+        return self._call_endpoint(endpoint, fn, method), endpoint
+      except Exception as e:
+        last_error = e
+    raise AllEndpointsFailed(f"All {len(self.endpoints)} RPC endpoints failed") from last_error
+
+  def call_once(self, endpoint: Endpoint, fn: Callable[[SubstrateInterface], T], method: str = "call") -> T:
+    """Runs ``fn`` on ``endpoint`` only, without failing over"""
+    return self._call_endpoint(endpoint, fn, method)
+
+  def race(self, fn: Callable[[SubstrateInterface], T], method: str = "call", fanout: int = 2) -> T:
+    """
+    Runs a read-only ``fn`` on the ``fanout`` fastest endpoints and returns the first success,
+    falling back to `call` over the remaining endpoints if all of them fail
+    """
+    candidates = [endpoint for endpoint in self.ranked() if endpoint.healthy][:fanout]
+    if len(candidates) < 2:
+      return self.call(fn, method)
+
+    futures = {self._executor.submit(self._call_endpoint, endpoint, fn, method) for endpoint in candidates}
+    deadline = time.monotonic() + self.request_timeout
+    while futures:
+      done, futures = wait(futures, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+      if not done:
+        break
+      for future in done:
+        if future.exception() is None:
+          return future.result()
+
+    remaining = [endpoint for endpoint in self.ranked() if endpoint not in candidates]
+    last_error = None
+    for endpoint in remaining:
+      try:
+        return self._call_endpoint(endpoint, fn, method)
+      except Exception as e:
+        last_error = e
+    raise AllEndpointsFailed(f"Raced read {method} failed on every RPC endpoint") from last_error
+
+  def probe(self):
+    """Measures every endpoint once with a cheap request, skipping endpoints busy with a call"""
+    for endpoint in self.endpoints:
+      if not endpoint.lock.acquire(blocking=False):
+        # A request in flight keeps the latency estimate fresh anyway
+        continue
+      try:
+        start = time.perf_counter()
+        self._interface(endpoint).rpc_request("system_health", [])
+        self._record_success(endpoint, time.perf_counter() - start)
+      except Exception as e:
+        self._record_failure(endpoint, e)
+      finally:
+        endpoint.lock.release()
+
+  def start_probing(self):
+    if self._probe_thread is not None:
+      return
+
+    def run():
+      while not self._stop.is_set():
+        self.probe()
+        self._stop.wait(self.probe_interval)
+
+    self._probe_thread = threading.Thread(target=run, name="rpc-probe", daemon=True)
+    self._probe_thread.start()
+
+  def close(self):
+    self._stop.set()
+    self._executor.shutdown(wait=False)
+    for endpoint in self.endpoints:
+      if endpoint.interface is not None:
+        try:
+          endpoint.interface.close()
+        except Exception:
+          pass
+
+
+class FailoverSubstrate:
+  """
+  Drop-in stand-in for `SubstrateInterface` backed by an `EndpointPool`
+
+  Every method call is routed to the fastest healthy endpoint; with ``race_reads`` read-only
+  methods are raced across two endpoints. Calls building an extrinsic stick to one endpoint
+  until it fails, and a failed send is never repeated on another endpoint.
+  """
+
+  def __init__(self, pool: EndpointPool, race_reads: bool = False):
+    self.pool = pool
+    self.race_reads = race_reads
+    self._extrinsic_endpoint: Optional[Endpoint] = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    # chain_functions use `with substrate as _substrate`, the pooled connections stay open
+    return False
+
+  def _call_extrinsic_method(self, name: str, fn: Callable[[SubstrateInterface], T]) -> T:
+    endpoint = self._extrinsic_endpoint
+    if name in SEND_METHODS:
+      if endpoint is None or not endpoint.healthy:
+        endpoint = self.pool.ranked()[0]
+      try:
+        return self.pool.call_once(endpoint, fn, name)
+      except Exception as e:
+        raise SubmitOutcomeUnknown(
+          f"Sending to {endpoint.url} failed, the extrinsic may still have been included: {e}"
+        ) from e
+      finally:
+        # The next extrinsic is built on whichever endpoint is fastest then
+        self._extrinsic_endpoint = None
+
+    # Nothing was sent yet, so building the extrinsic may move to another endpoint
+    result, self._extrinsic_endpoint = self.pool.call_preferring(fn, name, prefer=endpoint)
+    return result
+
+  def __getattr__(self, name: str) -> Any:
+    if name.startswith("__"):
+      # Protocol lookups such as copy's `__deepcopy__` are not forwarded
+      raise AttributeError(name)
+    if not callable(getattr(SubstrateInterface, name, None)):
+      # Instance attributes such as `url` or `runtime_config` and properties come from the
+      # preferred endpoint
+      return self.pool.call(lambda interface: getattr(interface, name), name)
+
+    def method(*args, **kwargs):
+      fn = lambda interface: getattr(interface, name)(*args, **kwargs)
+      if name in EXTRINSIC_METHODS:
+        return self._call_extrinsic_method(name, fn)
+      if self.race_reads and name in READ_METHODS:
+        return self.pool.race(fn, name)
+      return self.pool.call(fn, name)
+
+    return method
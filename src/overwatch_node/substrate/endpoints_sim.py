@@ -0,0 +1,255 @@
+"""
+Simulation of `EndpointPool` and `FailoverSubstrate` against several local mock RPC nodes
+
+Every `MockNode` is an HTTP JSON-RPC server on localhost with an injected latency that can
+fail all requests, or only extrinsic submissions after they arrived. The run checks that
+reads go to the fastest node and fail over when it fails, that the nonce, compose, sign and
+submit calls of one extrinsic stay on one node while the latencies change, and that a failed
+submission is sent exactly once across all nodes, also through the retries of a
+`chain_functions` extrinsic.
+
+python -m substrate.endpoints_sim
+python -m substrate.endpoints_sim --nodes 4 --latency 0.01
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+from substrateinterface import Keypair, SubstrateInterface
+
+from substrate import chain_functions
+from substrate.endpoints import EndpointPool, FailoverSubstrate, SubmitOutcomeUnknown
+from substrate.indexer_replay import NODE_INFO
+
+import logging
+logger = logging.getLogger(__name__)
+
+SUBMIT_RPC = "author_submitExtrinsic"
+
+
+class MockNode:
+  """
+  HTTP JSON-RPC server answering the requests of a node with an injected latency
+
+  With ``fail`` set every request fails, with ``fail_submit`` set extrinsic submissions fail
+  after they were received, as when a connection drops before the answer.
+  """
+
+  def __init__(self, latency: float, block: int = 1000):
+    self.latency = latency
+    self.block = block
+    self.fail = False
+    self.fail_submit = False
+    self.requests = Counter()
+    self._lock = threading.Lock()
+    self._server: Optional[ThreadingHTTPServer] = None
+
+  @property
+  def url(self) -> str:
+    host, port = self._server.server_address
+    return f"http://{host}:{port}"
+
+  def handle(self, method: str, params: list):
+    time.sleep(self.latency)
+    with self._lock:
+      self.requests[method] += 1
+    if self.fail:
+      raise ConnectionError("Injected node failure")
+    if method in NODE_INFO:
+      return NODE_INFO[method]
+    if method == "system_health":
+      return {"peers": 8, "isSyncing": False, "shouldHavePeers": True}
+    if method == "chain_getHeader":
+      return {"number": hex(self.block), "parentHash": "0x" + "00" * 32}
+    if method == "rpc_methods":
+      # Without state_call the nonce is read through system_accountNextIndex
+      return {"methods": ["system_accountNextIndex", SUBMIT_RPC]}
+    if method == "system_accountNextIndex":
+      return 7
+    if method == SUBMIT_RPC:
+      if self.fail_submit:
+        raise ConnectionError("Injected failure after the extrinsic was received")
+      return "0x" + "ab" * 32
+    raise KeyError(f"Method {method} not found")
+
+  def __enter__(self):
+    node = self
+
+    class Handler(BaseHTTPRequestHandler):
+      def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        try:
+          body = {"jsonrpc": "2.0", "id": payload["id"], "result": node.handle(payload["method"], payload["params"])}
+        except Exception as e:
+          body = {"jsonrpc": "2.0", "id": payload["id"], "error": {"code": -32000, "message": str(e)}}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+      def log_message(self, format, *args):
+        pass
+
+    self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=self._server.serve_forever, daemon=True).start()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self._server.shutdown()
+    self._server.server_close()
+    return False
+
+
+class SimulatedInterface(SubstrateInterface):
+  """
+  `SubstrateInterface` whose extrinsics are plain JSON instead of SCALE, as the mock nodes
+  serve no metadata. Nonces and submissions still go over RPC.
+  """
+
+  def compose_call(self, call_module: str, call_function: str, call_params: dict = None, block_hash: str = None):
+    return {"module": call_module, "function": call_function, "params": call_params or {}}
+
+  def create_signed_extrinsic(self, call, keypair, era: dict = None, nonce: int = None, tip: int = 0, tip_asset_id: int = None, signature=None):
+    signer = getattr(keypair, "ss58_address", keypair)
+    return "0x" + json.dumps({"call": call, "signer": signer, "nonce": nonce}).encode().hex()
+
+  def submit_extrinsic(self, extrinsic, wait_for_inclusion: bool = False, wait_for_finalization: bool = False):
+    response = self.rpc_request(SUBMIT_RPC, [extrinsic])
+    return response["result"]
+
+
+def _served_by(nodes: List[MockNode], method: str, action: Callable[[], object]) -> List[int]:
+  """Runs ``action`` and returns the indexes of the nodes that answered ``method`` meanwhile"""
+  before = [node.requests[method] for node in nodes]
+  action()
+  return [index for index, node in enumerate(nodes) if node.requests[method] > before[index]]
+
+
+def simulate(latencies: List[float]) -> List[str]:
+  """Runs the checks against mock nodes with ``latencies`` and returns the failures"""
+  if len(latencies) < 2:
+    raise ValueError("At least two mock nodes are needed to fail over")
+  nodes = [MockNode(latency) for latency in latencies]
+  for node in nodes:
+    node.__enter__()
+
+  errors = []
+  pool = EndpointPool(
+    [node.url for node in nodes],
+    failure_threshold=1,
+    cooldown=60.0,
+    interface_factory=lambda url: SimulatedInterface(url=url),
+  )
+  substrate = FailoverSubstrate(pool)
+  try:
+    for _ in range(3):
+      pool.probe()
+    fastest = min(range(len(nodes)), key=lambda index: latencies[index])
+    urls = [node.url for node in nodes]
+
+    if pool.ranked()[0].url != urls[fastest]:
+      errors.append(f"Fastest endpoint is {pool.ranked()[0].url}, expected {urls[fastest]}")
+    if substrate.url != urls[fastest]:
+      errors.append(f"`url` of the failover interface is {substrate.url!r}, expected {urls[fastest]}")
+
+    served = _served_by(nodes, "chain_getHeader", lambda: substrate.get_block_number(None))
+    if served != [fastest]:
+      errors.append(f"Read was served by nodes {served}, expected the fastest {fastest}")
+
+    # One extrinsic, with the latencies changing after the nonce was read
+    sent = {}
+
+    def extrinsic():
+      sent["nonce"] = substrate.get_account_nonce("5Sim")
+      nodes[fastest].latency += 0.2
+      pool.probe()
+      call = substrate.compose_call("Network", "add_to_stake", {"amount": 1})
+      signed = substrate.create_signed_extrinsic(call, "5Sim", nonce=sent["nonce"])
+      sent["hash"] = substrate.submit_extrinsic(signed)
+
+    before = [node.requests["system_accountNextIndex"] for node in nodes]
+    submitted_by = _served_by(nodes, SUBMIT_RPC, extrinsic)
+    nonce_by = [index for index, node in enumerate(nodes) if node.requests["system_accountNextIndex"] > before[index]]
+    if nonce_by != [fastest] or submitted_by != nonce_by:
+      errors.append(f"Nonce was read from nodes {nonce_by} but the extrinsic was submitted to {submitted_by}")
+    if sent.get("nonce") != 7:
+      errors.append(f"Nonce {sent.get('nonce')} does not match the mock nodes")
+    nodes[fastest].latency -= 0.2
+
+    # Reads fail over when the fastest node fails
+    for _ in range(3):
+      pool.probe()
+    nodes[fastest].fail = True
+    try:
+      block = substrate.get_block_number(None)
+      if block != nodes[fastest].block:
+        errors.append(f"Failover read returned block {block}")
+    except Exception as e:
+      errors.append(f"Read did not fail over off the failed node: {e}")
+    nodes[fastest].fail = False
+
+    # A submission failing after it reached the node is not repeated anywhere
+    target = pool.ranked()[0]
+    failing = urls.index(target.url)
+    nodes[failing].fail_submit = True
+    submits = sum(node.requests[SUBMIT_RPC] for node in nodes)
+    try:
+      substrate.submit_extrinsic(substrate.create_signed_extrinsic({}, "5Sim", nonce=7))
+      errors.append("Failed submission did not raise")
+    except SubmitOutcomeUnknown:
+      pass
+    except Exception as e:
+      errors.append(f"Failed submission raised {type(e).__name__} instead of SubmitOutcomeUnknown: {e}")
+    resent = sum(node.requests[SUBMIT_RPC] for node in nodes) - submits
+    if resent != 1:
+      errors.append(f"Failed submission was sent {resent} times across the nodes, expected once")
+    nodes[failing].fail_submit = False
+
+    # chain_functions retry failed sends, but not one whose outcome is unknown
+    for node in nodes:
+      node.fail_submit = True
+    submits = sum(node.requests[SUBMIT_RPC] for node in nodes)
+    try:
+      chain_functions.add_to_stake(substrate, Keypair.create_from_uri("//Alice"), 1)
+      errors.append("add_to_stake with a failed submission did not raise")
+    except SubmitOutcomeUnknown:
+      pass
+    except Exception as e:
+      errors.append(f"add_to_stake raised {type(e).__name__} instead of SubmitOutcomeUnknown: {e}")
+    resent = sum(node.requests[SUBMIT_RPC] for node in nodes) - submits
+    if resent != 1:
+      errors.append(f"add_to_stake sent the failed submission {resent} times across the nodes, expected once")
+    for node in nodes:
+      node.fail_submit = False
+  finally:
+    pool.close()
+    for node in nodes:
+      node.__exit__(None, None, None)
+  return errors
+
+
+def main():
+  parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("--nodes", type=int, required=False, default=3, help="Mock RPC nodes")
+  parser.add_argument("--latency", type=float, required=False, default=0.005, help="Latency of the fastest node, each next node adds as much again")
+
+  args = parser.parse_args()
+  latencies = [args.latency * (index + 1) for index in reversed(range(args.nodes))]
+
+  errors = simulate(latencies)
+  for error in errors:
+    print(error, file=sys.stderr)
+  if errors:
+    sys.exit(1)
+  print(f"Failover, extrinsic stickiness and single submission held across {args.nodes} mock RPC nodes")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,279 @@
+"""
+Typed Network pallet events and a single subscription fanning them out to consumers
+
+`EventSubscriber` follows new block headers over one subscription, reads each block's
+``System.Events`` once, decodes only the Network events listed in `EVENT_TYPES` into compact
+records, filters them by our accounts and overwatch node ids and hands each block's records to
+every consumer of an `EventBus`. Consumers (metrics, logs, `ChainStore`) never make RPCs of their own.
+"""
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Type
+
+from substrateinterface import SubstrateInterface
+
+from metrics.node_metrics import CHAIN_EVENTS, RPC_ERRORS, RPC_LATENCY
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChainEvent:
+  """
+  Dataclass for a decoded event, ``extrinsic_index`` is None for events outside extrinsics.
+  """
+
+  block_number: int
+  event_index: int
+  extrinsic_index: Optional[int]
+
+  def accounts(self) -> Tuple[str, ...]:
+    """Accounts the event concerns, used to filter by our own accounts"""
+    return ()
+
+  def node_ids(self) -> Tuple[int, ...]:
+    """Overwatch node ids the event concerns, used to filter by our own node"""
+    return ()
+
+
+@dataclass(frozen=True)
+class OverwatchNodeRegistered(ChainEvent):
+  overwatch_node_id: int
+  hotkey: str
+
+  def accounts(self) -> Tuple[str, ...]:
+    return (self.hotkey,)
+
+  def node_ids(self) -> Tuple[int, ...]:
+    return (self.overwatch_node_id,)
+
+
+@dataclass(frozen=True)
+class StakeAdded(ChainEvent):
+  account: str
+  amount: int
+
+  def accounts(self) -> Tuple[str, ...]:
+    return (self.account,)
+
+
+@dataclass(frozen=True)
+class StakeRemoved(ChainEvent):
+  account: str
+  amount: int
+
+  def accounts(self) -> Tuple[str, ...]:
+    return (self.account,)
+
+
+@dataclass(frozen=True)
+class WeightsSubmitted(ChainEvent):
+  overwatch_node_id: int
+  epoch: int
+
+  def node_ids(self) -> Tuple[int, ...]:
+    return (self.overwatch_node_id,)
+
+
+@dataclass(frozen=True)
+class Slashed(ChainEvent):
+  account: str
+  amount: int
+
+  def accounts(self) -> Tuple[str, ...]:
+    return (self.account,)
+
+
+# Network event id -> (record type, [(record field, attribute name, attribute position)])
+# Attributes are decoded by name when the runtime names them and by position otherwise
+EVENT_TYPES: Dict[str, Tuple[Type[ChainEvent], List[Tuple[str, str, int]]]] = {
+  "OverwatchNodeRegistered": (OverwatchNodeRegistered, [("overwatch_node_id", "overwatch_node_id", 0), ("hotkey", "hotkey", 1)]),
+  "OverwatchStakeAdded": (StakeAdded, [("account", "account_id", 0), ("amount", "amount", 1)]),
+  "OverwatchStakeRemoved": (StakeRemoved, [("account", "account_id", 0), ("amount", "amount", 1)]),
+  "OverwatchWeightsSubmitted": (WeightsSubmitted, [("overwatch_node_id", "overwatch_node_id", 0), ("epoch", "epoch", 1)]),
+  "OverwatchNodeSlashed": (Slashed, [("account", "account_id", 0), ("amount", "amount", 1)]),
+}
+
+EventConsumer = Callable[[List[ChainEvent]], None]
+
+
+def _attribute(attributes: Any, name: str, position: int) -> Any:
+  if isinstance(attributes, dict):
+    return attributes[name]
+  return attributes[position]
+
+
+def decode_event(record: Any, block_number: int, event_index: int) -> Optional[ChainEvent]:
+  """
+  Decodes one ``System.Events`` record (an `EventRecord` or its ``.value``), returning None
+  for events that are not in `EVENT_TYPES`
+  """
+  value = getattr(record, "value", record)
+  event = value.get("event", value)
+  if event.get("module_id") != "Network":
+    return None
+  event_type = EVENT_TYPES.get(event.get("event_id"))
+  if event_type is None:
+    return None
+
+  cls, fields = event_type
+  attributes = event.get("attributes", value.get("attributes"))
+  try:
+    decoded = {field: _attribute(attributes, name, position) for field, name, position in fields}
+  except (KeyError, IndexError, TypeError) as e:
+    logger.warning(f"Failed to decode Network.{event['event_id']} in block {block_number}: {e}")
+    return None
+
+  return cls(
+    block_number=block_number,
+    event_index=event_index,
+    extrinsic_index=value.get("extrinsic_idx"),
+    **decoded,
+  )
+
+
+def decode_events(
+  records: Iterable[Any],
+  block_number: int,
+  accounts: Optional[Set[str]] = None,
+  node_ids: Optional[Set[int]] = None,
+) -> List[ChainEvent]:
+  """
+  Decodes a block's event records. If ``accounts`` or ``node_ids`` are given, only events
+  concerning one of them are kept
+  """
+  filtered = accounts is not None or node_ids is not None
+  events = []
+  for event_index, record in enumerate(records):
+    event = decode_event(record, block_number, event_index)
+    if event is None:
+      continue
+    if filtered and not (
+      (accounts is not None and accounts.intersection(event.accounts()))
+      or (node_ids is not None and node_ids.intersection(event.node_ids()))
+    ):
+      continue
+    events.append(event)
+  return events
+
+
+def events_from_receipt(receipt, block_number: int = 0) -> List[ChainEvent]:
+  """Decodes the Network events triggered by an extrinsic from its receipt"""
+  return decode_events(receipt.triggered_events, block_number)
+
+
+class EventBus:
+  """Fans out each block's decoded events to every consumer, isolating consumer failures"""
+
+  def __init__(self, consumers: Optional[Sequence[EventConsumer]] = None):
+    self.consumers: List[EventConsumer] = list(consumers or [])
+
+  def subscribe(self, consumer: EventConsumer):
+    self.consumers.append(consumer)
+
+  def publish(self, events: List[ChainEvent]):
+    if not events:
+      return
+    for consumer in self.consumers:
+      try:
+        consumer(events)
+      except Exception as e:
+        logger.error(f"Event consumer {consumer!r} failed: {e}", exc_info=True)
+
+
+class EventSubscriber:
+  def __init__(
+    self,
+    substrate: SubstrateInterface,
+    bus: EventBus,
+    accounts: Optional[Iterable[str]] = None,
+    finalized_only: bool = False,
+    node_ids: Optional[Iterable[int]] = None,
+  ):
+    """
+    :param substrate: interface to blockchain, used only by the subscriber thread
+    :param bus: bus receiving each block's decoded events
+    :param accounts: only events concerning these accounts or ``node_ids`` are published,
+      all if both are None
+    :param finalized_only: follow finalized instead of best blocks. A best block replaced by a
+      re-org at a height already handled is not read again.
+    :param node_ids: our overwatch node ids, so weight submissions are kept. The id of an
+      `OverwatchNodeRegistered` event for one of ``accounts`` is added when seen.
+    """
+    self.substrate = substrate
+    self.bus = bus
+    self.accounts = set(accounts) if accounts is not None else None
+    self.node_ids = set(node_ids) if node_ids is not None else (set() if accounts is not None else None)
+    self.finalized_only = finalized_only
+    self.last_block: Optional[int] = None
+    self._stop = threading.Event()
+    self._thread: Optional[threading.Thread] = None
+
+  def handle_block(self, block_number: int, block_hash: Optional[str] = None) -> Optional[List[ChainEvent]]:
+    """
+    Reads, decodes, filters and publishes the events of one block, returns None if the
+    events could not be read
+    """
+    try:
+      if block_hash is None:
+        with RPC_LATENCY.labels(method="get_block_hash").time():
+          block_hash = self.substrate.get_block_hash(block_number)
+      with RPC_LATENCY.labels(method="get_events").time():
+        records = self.substrate.get_events(block_hash)
+    except Exception as e:
+      RPC_ERRORS.labels(method="get_events").inc()
+      logger.warning(f"Failed to read events of block {block_number}: {e}")
+      return None
+
+    events = decode_events(records, block_number, self.accounts, self.node_ids)
+    if self.node_ids is not None:
+      self.node_ids.update(
+        event.overwatch_node_id for event in events
+        if isinstance(event, OverwatchNodeRegistered) and event.hotkey in (self.accounts or ())
+      )
+    self.bus.publish(events)
+    return events
+
+  def _on_header(self, header, update_nr, subscription_id):
+    if self._stop.is_set():
+      # Any return value ends the subscription
+      return True
+
+    block_number = int(header["header"]["number"])
+    if self.last_block is not None and block_number <= self.last_block:
+      # A repeated head or a re-org to a height already handled, its events were published
+      return
+
+    # Blocks skipped while a slow block was handled, or whose events could not be read, are
+    # caught up in order
+    first = block_number if self.last_block is None else self.last_block + 1
+    for number in range(first, block_number + 1):
+      if self.handle_block(number) is None:
+        # Retried from here on the next head
+        if self.last_block is None:
+          self.last_block = number - 1
+        return
+      self.last_block = number
+
+  def run(self):
+    """Blocks following new heads until `stop` is called"""
+    self.substrate.subscribe_block_headers(self._on_header, finalized_only=self.finalized_only)
+
+  def start(self) -> threading.Thread:
+    self._thread = threading.Thread(target=self.run, name="chain-events", daemon=True)
+    self._thread.start()
+    return self._thread
+
+  def stop(self):
+    self._stop.set()
+
+
+def metrics_consumer(events: List[ChainEvent]):
+  for event in events:
+    CHAIN_EVENTS.labels(event=type(event).__name__).inc()
+
+
+def log_consumer(events: List[ChainEvent]):
+  for event in events:
+    logger.info(f"⛓️ {event}")
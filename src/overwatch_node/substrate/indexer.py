@@ -0,0 +1,228 @@
+"""
+Historical chain indexer
+
+Fetches `SubnetNode` and `RewardsData` vectors for a block range with bounded parallelism,
+decodes them and writes them to a `ChainStore`, resuming from the last indexed block. With
+``--follow`` it then keeps following new heads, publishing each block's Network events to the
+metrics, the log and the same store through one `EventSubscriber`.
+
+python -m substrate.indexer --db overwatch.db --start 0 --end 100000 --step 100
+python -m substrate.indexer --db overwatch.db --start 0 --step 100 --follow --accounts 5F3sa2...
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from substrateinterface import SubstrateInterface
+from substrateinterface.exceptions import SubstrateRequestException
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+from websocket import WebSocketException
+
+from metrics.node_metrics import RPC_ERRORS, RPC_LATENCY
+from substrate.chain_data import RewardsData, SubnetNode
+from substrate.chain_store import ChainStore
+from substrate.events import EventBus, EventSubscriber, log_consumer, metrics_consumer
+from substrate.peer_directory import NodeRecord
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Runtime RPC methods returning SCALE encoded `Vec<SubnetNode>` and `Vec<RewardsData>` as `Vec<u8>`
+SUBNET_NODES_RPC = "network_getSubnetNodes"
+REWARDS_RPC = "network_getOverwatchRewards"
+
+BlockData = Tuple[int, List[NodeRecord], List[RewardsData]]
+
+# Errors of the RPC and of the connection to it, requests' connection errors are OSErrors
+RETRYABLE_ERRORS = (SubstrateRequestException, OSError, WebSocketException)
+
+
+class RpcBlockFetcher:
+  """
+  Fetches and decodes the node list and rewards at a block.
+
+  `SubstrateInterface` holds a single websocket and is not thread safe, so each worker thread
+  gets its own interface.
+  """
+
+  def __init__(
+    self,
+    url: str,
+    subnet_id: int,
+    subnet_nodes_rpc: str = SUBNET_NODES_RPC,
+    rewards_rpc: str = REWARDS_RPC,
+  ):
+    self.url = url
+    self.subnet_id = subnet_id
+    self.subnet_nodes_rpc = subnet_nodes_rpc
+    self.rewards_rpc = rewards_rpc
+    self._local = threading.local()
+
+  @property
+  def interface(self) -> SubstrateInterface:
+    interface = getattr(self._local, "interface", None)
+    if interface is None:
+      interface = SubstrateInterface(url=self.url)
+      self._local.interface = interface
+    return interface
+
+  def _rpc(self, method: str, params: list) -> List[int]:
+    with RPC_LATENCY.labels(method=method).time():
+      result = self.interface.rpc_request(method, params)
+    return result.get("result") or []
+
+  # Only transport and RPC errors are retried, a block that fails to decode fails the same way
+  # every time and is raised as is
+  @retry(
+    wait=wait_exponential(multiplier=0.5, max=8),
+    stop=stop_after_attempt(4),
+    retry=retry_if_exception_type(RETRYABLE_ERRORS),
+    reraise=True,
+  )
+  def __call__(self, block: int) -> BlockData:
+    try:
+      block_hash = self.interface.get_block_hash(block)
+      nodes = SubnetNode.list_from_vec_u8(self._rpc(self.subnet_nodes_rpc, [self.subnet_id, block_hash]))
+      rewards = RewardsData.list_from_vec_u8(self._rpc(self.rewards_rpc, [self.subnet_id, block_hash]))
+    except RETRYABLE_ERRORS as e:
+      RPC_ERRORS.labels(method="indexer").inc()
+      # Reconnect on the next attempt, the websocket may be broken
+      self._local.interface = None
+      logger.warning(f"Failed to fetch block {block}: {e}")
+      raise
+    return block, [NodeRecord.from_subnet_node(node) for node in nodes], rewards
+
+
+class ChainIndexer:
+  def __init__(
+    self,
+    store: ChainStore,
+    fetch_block: Callable[[int], BlockData],
+    max_workers: int = 8,
+  ):
+    """
+    :param store: store the decoded blocks are written to
+    :param fetch_block: returns (block, node records, rewards) for a block number, e.g. `RpcBlockFetcher`
+    :param max_workers: maximum number of blocks fetched concurrently
+    """
+    self.store = store
+    self.fetch_block = fetch_block
+    self.max_workers = max_workers
+
+  def run(self, start: int, end: int, step: int = 1, resume: bool = True) -> int:
+    """
+    Indexes every ``step``-th block in [start, end], returning the number of blocks written.
+
+    Blocks are fetched in windows of bounded size and each window is committed in one
+    transaction, so an interrupted run resumes after the last fully written window.
+    """
+    if resume:
+      last = self.store.last_indexed_block()
+      if last is not None and last >= start:
+        start = last + step
+
+    blocks = list(range(start, end + 1, step))
+    window = self.max_workers * 4
+    written = 0
+    started_at = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+      for i in range(0, len(blocks), window):
+        batch = blocks[i:i + window]
+        # map keeps block order, so the resume point only advances past fully written blocks
+        results = list(executor.map(self.fetch_block, batch))
+        self.store.write_blocks(results, last_indexed_block=batch[-1])
+        written += len(results)
+
+        elapsed = time.perf_counter() - started_at
+        logger.info(f"Indexed up to block {batch[-1]} ({written}/{len(blocks)}, {written / elapsed:.1f} blocks/s)")
+
+    return written
+
+
+def follow(
+  store: ChainStore,
+  substrate: SubstrateInterface,
+  accounts: Optional[List[str]] = None,
+  node_ids: Optional[List[int]] = None,
+  finalized_only: bool = False,
+  metrics_port: Optional[int] = None,
+  from_block: Optional[int] = None,
+):
+  """
+  Follows new heads until interrupted, every block's events go to metrics, log and ``store``
+
+  :param from_block: first block whose events are read, blocks up to the first new head are
+    caught up. Defaults to the first new head.
+  """
+  if metrics_port is not None:
+    from metrics.exposition import start_http_server
+    start_http_server(metrics_port)
+
+  # Nodes registered in already indexed blocks keep their weight submissions
+  if accounts is not None:
+    node_ids = set(node_ids or ())
+    for account in accounts:
+      node_ids.update(store.account_node_ids(account))
+
+  bus = EventBus([metrics_consumer, log_consumer, store.write_events])
+  subscriber = EventSubscriber(substrate, bus, accounts=accounts, finalized_only=finalized_only, node_ids=node_ids)
+  if from_block is not None:
+    subscriber.last_block = from_block - 1
+  try:
+    subscriber.run()
+  except KeyboardInterrupt:
+    subscriber.stop()
+
+
+def main():
+  from dotenv import load_dotenv
+
+  load_dotenv(os.path.join(Path.cwd(), '.env'))
+
+  parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("--db", type=str, required=False, default="overwatch_index.db", help="SQLite store path")
+  parser.add_argument("--subnet_id", type=int, required=False, default=1, help="Subnet to index")
+  parser.add_argument("--start", type=int, required=True, help="First block")
+  parser.add_argument("--end", type=int, required=False, default=None, help="Last block, defaults to the chain head")
+  parser.add_argument("--step", type=int, required=False, default=1, help="Index every n-th block, e.g. the epoch length")
+  parser.add_argument("--epoch_length", type=int, required=False, default=1, help="Blocks per epoch")
+  parser.add_argument("--workers", type=int, required=False, default=8, help="Blocks fetched concurrently")
+  parser.add_argument("--local", action="store_true", help="Run in local mode, uses LOCAL_RPC")
+  parser.add_argument("--follow", action="store_true", help="Keep following new heads and store their Network events")
+  parser.add_argument("--accounts", type=str, nargs="*", required=False, default=None, help="Accounts whose events are followed, all if omitted")
+  parser.add_argument("--node_ids", type=int, nargs="*", required=False, default=None, help="Overwatch node ids whose events are followed")
+  parser.add_argument("--finalized_only", action="store_true", help="Follow finalized instead of best blocks")
+  parser.add_argument("--metrics_port", type=int, required=False, default=None, help="Port to expose Prometheus metrics on while following")
+
+  args = parser.parse_args()
+
+  rpc = os.getenv('LOCAL_RPC') if args.local else os.getenv('DEV_RPC')
+  fetcher = RpcBlockFetcher(rpc, args.subnet_id)
+  end = args.end
+  if end is None:
+    end = fetcher.interface.get_block_number(None)
+
+  store = ChainStore(args.db, epoch_length=args.epoch_length)
+  try:
+    ChainIndexer(store, fetcher, max_workers=args.workers).run(args.start, end, step=args.step)
+    if args.follow:
+      follow(
+        store,
+        SubstrateInterface(url=rpc),
+        args.accounts,
+        args.node_ids,
+        args.finalized_only,
+        args.metrics_port,
+        from_block=end + 1,
+      )
+  finally:
+    store.close()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,261 @@
+"""
+Replay of recorded blocks through the indexer against a mock RPC
+
+`record` captures the raw RPC responses the indexer reads for a set of blocks into a fixture
+file. `MockRpcServer` serves a fixture over HTTP JSON-RPC and can fail the first requests for
+each block. `replay` then indexes the fixture through the real `RpcBlockFetcher` and
+`ChainIndexer`. The run is interrupted part way through and resumed, and the stored node lists
+and rewards are checked against the fixture decoded directly.
+
+Without ``--fixtures`` a fixture of synthetic SCALE encoded blocks is generated.
+
+python -m substrate.indexer_replay
+python -m substrate.indexer_replay --record_url wss://rpc.hypertensor.org:443 --blocks 100 200 300 --out blocks.json
+python -m substrate.indexer_replay --fixtures blocks.json --fail_first 2
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from substrate.chain_data import RewardsData, SubnetNode, get_runtime_config
+from substrate.chain_store import ChainStore
+from substrate.indexer import REWARDS_RPC, SUBNET_NODES_RPC, ChainIndexer, RpcBlockFetcher
+from substrate.peer_directory import SUBNET_NODE_CLASSES, NodeRecord
+
+import logging
+logger = logging.getLogger(__name__)
+
+Fixture = Dict[str, Dict]
+
+# Answers to the requests `SubstrateInterface` makes on connecting
+NODE_INFO = {
+  "system_chain": "Overwatch Replay",
+  "system_name": "overwatch-replay",
+  "system_version": "0.0.0",
+  "system_properties": {"ss58Format": 42, "tokenDecimals": 18, "tokenSymbol": "TENSOR"},
+}
+
+
+def record(url: str, subnet_id: int, blocks: List[int]) -> Fixture:
+  """Returns the block hashes and raw `Vec<u8>` RPC results of ``blocks`` as a fixture"""
+  fetcher = RpcBlockFetcher(url, subnet_id)
+  recorded = {}
+  for block in blocks:
+    block_hash = fetcher.interface.get_block_hash(block)
+    recorded[str(block)] = {
+      "hash": block_hash,
+      "subnet_nodes": fetcher._rpc(SUBNET_NODES_RPC, [subnet_id, block_hash]),
+      "rewards": fetcher._rpc(REWARDS_RPC, [subnet_id, block_hash]),
+    }
+  return {"subnet_id": subnet_id, "blocks": recorded}
+
+
+def synthesize(blocks: List[int], nodes: int, seed: int) -> Fixture:
+  """Returns a fixture of random node lists and rewards in the runtime's SCALE encoding"""
+  from cli.crypto.identity import base58_encode
+
+  rng = random.Random(seed)
+  runtime_config = get_runtime_config()
+  peer_ids = [
+    # Ed25519 peer ids in their base58 text form, as stored on-chain
+    "0x" + base58_encode(bytes([0x00, 0x24, 0x08, 0x01, 0x12, 0x20]) + rng.randbytes(32)).encode().hex()
+    for _ in range(nodes * 2)
+  ]
+  recorded = {}
+  for block in blocks:
+    members = rng.sample(peer_ids, nodes)
+    node_list = [
+      {
+        "coldkey": "0x" + rng.randbytes(32).hex(),
+        "hotkey": "0x" + rng.randbytes(32).hex(),
+        "peer_id": peer_id,
+        "initialized": 1,
+        "classification": {"class": rng.choice(SUBNET_NODE_CLASSES[1:]), "start_epoch": rng.randrange(1, 100)},
+        "a": "0x",
+        "b": "0x",
+        "c": "0x",
+      }
+      for peer_id in members
+    ]
+    # Scores span the whole u128 range, beyond what a float keeps exactly
+    rewards = [{"peer_id": peer_id, "score": rng.randrange(2 ** 128)} for peer_id in members]
+    recorded[str(block)] = {
+      "hash": "0x" + rng.randbytes(32).hex(),
+      "subnet_nodes": list(runtime_config.create_scale_object("Vec<SubnetNode>").encode(node_list).data),
+      "rewards": list(runtime_config.create_scale_object("Vec<RewardsData>").encode(rewards).data),
+    }
+  return {"subnet_id": 1, "blocks": recorded}
+
+
+class MockRpcServer:
+  """
+  HTTP JSON-RPC server answering the indexer's requests from a fixture
+
+  The first ``fail_first`` node list requests of every block fail with an RPC error, so the
+  fetcher's retries are exercised.
+  """
+
+  def __init__(self, fixture: Fixture, fail_first: int = 0):
+    self.fixture = fixture
+    self.fail_first = fail_first
+    self.requests = Counter()
+    self._failures = Counter()
+    self._lock = threading.Lock()
+    self._hashes = {data["hash"]: data for data in fixture["blocks"].values()}
+    self._server: Optional[ThreadingHTTPServer] = None
+
+  @property
+  def url(self) -> str:
+    host, port = self._server.server_address
+    return f"http://{host}:{port}"
+
+  def handle(self, method: str, params: list):
+    with self._lock:
+      self.requests[method] += 1
+    if method in NODE_INFO:
+      return NODE_INFO[method]
+    if method == "chain_getBlockHash":
+      data = self.fixture["blocks"].get(str(params[0]))
+      return data["hash"] if data is not None else None
+    if method not in (SUBNET_NODES_RPC, REWARDS_RPC):
+      raise KeyError(f"Method {method} not found")
+
+    data = self._hashes.get(params[1])
+    if data is None:
+      raise KeyError(f"Unknown block hash {params[1]}")
+    if method == SUBNET_NODES_RPC:
+      with self._lock:
+        self._failures[params[1]] += 1
+        if self._failures[params[1]] <= self.fail_first:
+          raise ConnectionError("Injected RPC failure")
+      return data["subnet_nodes"]
+    return data["rewards"]
+
+  def __enter__(self):
+    server = self
+
+    class Handler(BaseHTTPRequestHandler):
+      def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        try:
+          body = {"jsonrpc": "2.0", "id": payload["id"], "result": server.handle(payload["method"], payload["params"])}
+        except Exception as e:
+          body = {"jsonrpc": "2.0", "id": payload["id"], "error": {"code": -32000, "message": str(e)}}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+      def log_message(self, format, *args):
+        pass
+
+    self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=self._server.serve_forever, daemon=True).start()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self._server.shutdown()
+    self._server.server_close()
+    return False
+
+
+def _node_key(node: NodeRecord):
+  return node.peer_id, node.hotkey
+
+
+def replay(fixture: Fixture, fail_first: int = 0, workers: int = 4, epoch_length: int = 1) -> List[str]:
+  """
+  Indexes ``fixture`` through a `MockRpcServer`, stopping after the first half of the blocks
+  and resuming, and returns the mismatches between the store and the fixture
+  """
+  blocks = sorted(int(block) for block in fixture["blocks"])
+  step = blocks[1] - blocks[0] if len(blocks) > 1 else 1
+  if blocks != list(range(blocks[0], blocks[-1] + 1, step)):
+    raise ValueError("Fixture blocks must be evenly spaced to be replayed with a step")
+
+  errors = []
+  with MockRpcServer(fixture, fail_first) as rpc, tempfile.TemporaryDirectory() as directory:
+    store = ChainStore(os.path.join(directory, "replay.db"), epoch_length=epoch_length)
+    try:
+      fetcher = RpcBlockFetcher(rpc.url, fixture["subnet_id"])
+      indexer = ChainIndexer(store, fetcher, max_workers=workers)
+      middle = blocks[len(blocks) // 2 - 1] if len(blocks) > 1 else blocks[0]
+      written = indexer.run(blocks[0], middle, step=step)
+      # A second run over the whole range resumes after the blocks already written
+      written += indexer.run(blocks[0], blocks[-1], step=step)
+      if written != len(blocks):
+        errors.append(f"Indexed {written} blocks, the fixture has {len(blocks)}")
+      if store.last_indexed_block() != blocks[-1]:
+        errors.append(f"Resume point is {store.last_indexed_block()}, expected {blocks[-1]}")
+
+      for block in blocks:
+        data = fixture["blocks"][str(block)]
+        expected_nodes = sorted(
+          (NodeRecord.from_subnet_node(node) for node in SubnetNode.list_from_vec_u8(data["subnet_nodes"])),
+          key=_node_key,
+        )
+        if sorted(store.nodes_at(block), key=_node_key) != expected_nodes:
+          errors.append(f"Node list of block {block} differs from the fixture")
+
+        epoch = store.epoch_of(block)
+        expected_rewards = sorted(reward.score for reward in RewardsData.list_from_vec_u8(data["rewards"]))
+        stored_rewards = sorted(
+          score for reward_epoch, _, score in store.epoch_rewards(epoch, epoch) if reward_epoch == epoch
+        )
+        if epoch_length == 1 and stored_rewards != expected_rewards:
+          errors.append(f"Rewards of block {block} differ from the fixture")
+
+      expected_failures = fail_first * len(blocks)
+      retried = rpc.requests[SUBNET_NODES_RPC] - len(blocks)
+      if retried != expected_failures:
+        errors.append(f"{retried} node list requests were retried, {expected_failures} failures were injected")
+    finally:
+      store.close()
+  return errors
+
+
+def main():
+  parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("--fixtures", type=str, required=False, default=None, help="Fixture file to replay, synthetic blocks if omitted")
+  parser.add_argument("--record_url", type=str, required=False, default=None, help="RPC to record a fixture from instead of replaying")
+  parser.add_argument("--subnet_id", type=int, required=False, default=1, help="Subnet to record")
+  parser.add_argument("--blocks", type=int, nargs="+", required=False, default=list(range(100, 1700, 100)), help="Evenly spaced blocks to record or synthesize")
+  parser.add_argument("--out", type=str, required=False, default="indexer_fixture.json", help="Fixture file written by --record_url")
+  parser.add_argument("--nodes", type=int, required=False, default=16, help="Nodes per synthetic block")
+  parser.add_argument("--fail_first", type=int, required=False, default=1, help="Injected failures per block before the mock RPC answers")
+  parser.add_argument("--seed", type=int, required=False, default=0, help="Random seed of synthetic blocks")
+
+  args = parser.parse_args()
+
+  if args.record_url is not None:
+    fixture = record(args.record_url, args.subnet_id, args.blocks)
+    with open(args.out, "w") as f:
+      json.dump(fixture, f)
+    print(f"Recorded {len(args.blocks)} blocks to {args.out}")
+    return
+
+  if args.fixtures is not None:
+    with open(args.fixtures) as f:
+      fixture = json.load(f)
+  else:
+    fixture = synthesize(args.blocks, args.nodes, args.seed)
+
+  errors = replay(fixture, fail_first=args.fail_first)
+  for error in errors:
+    print(error, file=sys.stderr)
+  if errors:
+    sys.exit(1)
+  print(f"Replayed {len(fixture['blocks'])} blocks with {args.fail_first} injected failure(s) each, store matches the fixture")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,220 @@
+"""
+Peer id keyed index over on-chain subnet node lists
+
+Swarm peers (hypermind `PeerID`s) are joined against `SubnetNode.peer_id` through a hash
+index instead of linear scans over decoded node lists, so checking whether a peer is
+registered or included is O(1) per peer.
+"""
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from substrate.chain_data import SubnetNode
+
+# Order of `SubnetNodeClass` in the runtime, a node qualifies for a class if it is at or above it
+SUBNET_NODE_CLASSES = ["Deactivated", "Registered", "Idle", "Included", "Validator"]
+CLASS_RANK = {name: rank for rank, name in enumerate(SUBNET_NODE_CLASSES)}
+
+# Converted keys of swarm `PeerID` objects, bounded so long-running nodes don't grow it forever
+MAX_PEER_KEY_CACHE = 65536
+
+PeerLike = Union[bytes, str, Any]
+
+
+@dataclass(frozen=True)
+class NodeRecord:
+  """
+  Dataclass for the subset of `SubnetNode` needed to decide whether a peer's outputs count.
+  """
+
+  peer_id: bytes
+  hotkey: str
+  coldkey: str
+  classification: str
+  start_epoch: int
+
+  @property
+  def rank(self) -> int:
+    return CLASS_RANK.get(self.classification, -1)
+
+  def is_at_least(self, classification: str) -> bool:
+    return self.rank >= CLASS_RANK[classification]
+
+  @classmethod
+  def from_subnet_node(cls, node: Union[SubnetNode, Dict]) -> "NodeRecord":
+    if isinstance(node, dict):
+      node = SubnetNode(**node)
+
+    classification = node.classification
+    if isinstance(classification, dict):
+      node_class = classification.get("class") or classification.get("node_class")
+      start_epoch = classification.get("start_epoch", 0)
+    else:
+      node_class, start_epoch = classification, 0
+
+    return cls(
+      peer_id=peer_key(node.peer_id),
+      hotkey=node.hotkey,
+      coldkey=node.coldkey,
+      classification=node_class,
+      start_epoch=int(start_epoch),
+    )
+
+
+def peer_key(peer: PeerLike) -> bytes:
+  """
+  Returns the canonical index key of a peer id.
+
+  The chain stores the base58 text of the peer id as `Vec<u8>`, which scalecodec decodes to a
+  ``0x`` prefixed hex string. Swarm `PeerID` objects are converted to the same bytes.
+  """
+  if isinstance(peer, bytes):
+    return peer
+  if isinstance(peer, (bytearray, memoryview)):
+    return bytes(peer)
+  if isinstance(peer, str):
+    if peer.startswith("0x"):
+      return bytes.fromhex(peer[2:])
+    return peer.encode()
+  if isinstance(peer, list):
+    return bytes(peer)
+  if hasattr(peer, "to_base58"):
+    return peer.to_base58().encode()
+  raise TypeError(f"Unsupported peer id type {type(peer).__name__}")
+
+
+@dataclass
+class DirectoryUpdate:
+  """
+  Dataclass describing what changed in a `PeerDirectory` update.
+  """
+
+  block: int
+  added: List[NodeRecord]
+  removed: List[NodeRecord]
+  changed: List[NodeRecord]
+  skipped: bool = False
+
+
+class PeerDirectory:
+  """
+  Hash index from peer id bytes to `NodeRecord`, updated as node lists are decoded per block.
+  """
+
+  def __init__(self):
+    self._by_peer_id: Dict[bytes, NodeRecord] = {}
+    self._by_hotkey: Dict[str, NodeRecord] = {}
+    self._swarm_keys: Dict[Any, bytes] = {}
+    self._last_digest: Optional[bytes] = None
+    self._lock = threading.Lock()
+    self.block: Optional[int] = None
+
+  def __len__(self) -> int:
+    return len(self._by_peer_id)
+
+  def __contains__(self, peer: PeerLike) -> bool:
+    return self._key(peer) in self._by_peer_id
+
+  def _key(self, peer: PeerLike) -> bytes:
+    if isinstance(peer, (bytes, str)):
+      return peer_key(peer)
+
+    # Converting a `PeerID` to base58 is the expensive part of a lookup, cache it per object
+    try:
+      key = self._swarm_keys.get(peer)
+    except TypeError:
+      return peer_key(peer)
+    if key is None:
+      key = peer_key(peer)
+      if len(self._swarm_keys) >= MAX_PEER_KEY_CACHE:
+        self._swarm_keys.clear()
+      self._swarm_keys[peer] = key
+    return key
+
+  def update(self, nodes: Iterable[Union[SubnetNode, Dict, NodeRecord]], block: int) -> DirectoryUpdate:
+    """
+    Replaces the directory contents with ``nodes`` as of ``block``, reusing unchanged records.
+
+    Updates for blocks older than the current one are ignored.
+    """
+    if self.block is not None and block < self.block:
+      return DirectoryUpdate(block=block, added=[], removed=[], changed=[], skipped=True)
+
+    records = {}
+    for node in nodes:
+      record = node if isinstance(node, NodeRecord) else NodeRecord.from_subnet_node(node)
+      records[record.peer_id] = record
+
+    with self._lock:
+      previous = self._by_peer_id
+      added, changed = [], []
+      for key, record in records.items():
+        old = previous.get(key)
+        if old is None:
+          added.append(record)
+        elif old != record:
+          changed.append(record)
+        else:
+          # Keep the existing object so references held by consumers stay valid
+          records[key] = old
+      removed = [record for key, record in previous.items() if key not in records]
+
+      self._by_peer_id = records
+      self._by_hotkey = {record.hotkey: record for record in records.values()}
+      self.block = block
+
+    return DirectoryUpdate(block=block, added=added, removed=removed, changed=changed)
+
+  def update_from_vec_u8(self, vec_u8: Union[List[int], bytes], block: int) -> DirectoryUpdate:
+    """
+    Decodes a SCALE encoded `Vec<SubnetNode>` and updates the directory.
+
+    Node lists rarely change between blocks, so decoding is skipped when the raw bytes are
+    identical to the previous update.
+    """
+    raw = bytes(vec_u8)
+    digest = hashlib.blake2b(raw, digest_size=16).digest()
+    if digest == self._last_digest:
+      with self._lock:
+        if self.block is None or block > self.block:
+          self.block = block
+      return DirectoryUpdate(block=block, added=[], removed=[], changed=[], skipped=True)
+
+    update = self.update(SubnetNode.list_from_vec_u8(list(raw)), block)
+    if not update.skipped:
+      self._last_digest = digest
+    return update
+
+  def get(self, peer: PeerLike) -> Optional[NodeRecord]:
+    return self._by_peer_id.get(self._key(peer))
+
+  def get_by_hotkey(self, hotkey: str) -> Optional[NodeRecord]:
+    return self._by_hotkey.get(hotkey)
+
+  def is_registered(self, peer: PeerLike) -> bool:
+    record = self.get(peer)
+    return record is not None and record.is_at_least("Registered")
+
+  def is_included(self, peer: PeerLike) -> bool:
+    record = self.get(peer)
+    return record is not None and record.is_at_least("Included")
+
+  def verify(self, peers: Iterable[PeerLike], classification: str = "Included") -> Dict[Any, bool]:
+    """
+    Batch-verifies that each peer is at least ``classification``, one hash lookup per peer.
+
+    Returns:
+      Dict[Any, bool]: Result keyed by the peers as they were passed in
+    """
+    min_rank = CLASS_RANK[classification]
+    index = self._by_peer_id
+    results = {}
+    for peer in peers:
+      record = index.get(self._key(peer))
+      results[peer] = record is not None and record.rank >= min_rank
+    return results
+
+  def filter(self, peers: Iterable[PeerLike], classification: str = "Included") -> List[PeerLike]:
+    """Returns the peers whose outputs count, i.e. at least ``classification``"""
+    return [peer for peer, ok in self.verify(peers, classification).items() if ok]
@@ -0,0 +1,365 @@
+"""
+Pre-flight validation, fee estimation and pre-signing of extrinsics
+
+Failed extrinsics are ``Pays::Yes``, so calls are validated against cached chain state before
+they are sent. Fees are estimated with ``payment_info`` once per call shape, and the next
+epoch's call is composed and signed ahead of time so submitting is a single send.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from substrateinterface import ExtrinsicReceipt, Keypair, SubstrateInterface
+from substrateinterface.exceptions import SubstrateRequestException
+
+from metrics.node_metrics import EXTRINSIC_INCLUSION, RPC_LATENCY, record_cache
+from substrate.config import BLOCK_SECS
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Network pallet storage read by the pre-flight checks, verified against the runtime metadata
+# before the first check, see `Preflight.check_metadata`
+OVERWATCH_NODE_ID_STORAGE = "HotkeyOverwatchNodeId"
+OVERWATCH_STAKE_STORAGE = "AccountOverwatchStake"
+EPOCH_LENGTH_STORAGE = "EpochLength"
+PREFLIGHT_STORAGE = (OVERWATCH_NODE_ID_STORAGE, OVERWATCH_STAKE_STORAGE, EPOCH_LENGTH_STORAGE)
+
+# Leading fraction of each epoch in which the runtime accepts weights. The runtime exposes no
+# such constant, so by default the window is the whole epoch and nothing is rejected locally.
+# Set it to the runtime's rule to reject late submissions before they pay fees.
+SUBMISSION_WINDOW_FRACTION = 1.0
+
+# Blocks a pre-signed extrinsic stays valid after its target block, the era is widened to
+# cover the wait for the target on top of this
+PRESIGNED_ERA_PERIOD = 64
+
+# Mortal era periods are powers of two up to 2^16
+MAX_ERA_PERIOD = 1 << 16
+
+# Substrate's default `System::BlockHashCount`, used if the constant can't be read
+DEFAULT_BLOCK_HASH_COUNT = 2400
+
+# Era of an extrinsic that never expires
+IMMORTAL_ERA = "00"
+
+
+def overwatch_stake(query: Callable[..., Any], hotkey: str) -> int:
+  """
+  Returns the overwatch stake of ``hotkey``
+
+  :param query: reads a storage value, as `ChainStateCache.query`
+  """
+  return int(query("Network", OVERWATCH_STAKE_STORAGE, [hotkey]) or 0)
+
+
+class PreflightError(Exception):
+  """Raised when a call would fail on-chain and must not be sent"""
+
+
+class ChainStateCache:
+  """
+  Caches storage queries for ``ttl_blocks`` blocks so repeated pre-flight checks in the same
+  block don't hit the RPC again.
+  """
+
+  def __init__(self, substrate: SubstrateInterface, ttl_blocks: int = 1):
+    self.substrate = substrate
+    self.ttl_blocks = ttl_blocks
+    self._entries: Dict[Hashable, Tuple[int, Any]] = {}
+    self._block: Optional[int] = None
+    self._block_fetched_at = 0.0
+
+  def block_number(self, refresh: bool = False) -> int:
+    """Current block, refreshed at most once per ``BLOCK_SECS`` unless ``refresh`` is set"""
+    now = time.monotonic()
+    if refresh or self._block is None or now - self._block_fetched_at >= BLOCK_SECS:
+      with RPC_LATENCY.labels(method="get_block_number").time():
+        self._block = self.substrate.get_block_number(self.substrate.get_block_hash())
+      self._block_fetched_at = now
+    return self._block
+
+  def query(self, module: str, storage_function: str, params: Optional[List] = None) -> Any:
+    key = (module, storage_function, tuple(params or ()))
+    block = self.block_number()
+    entry = self._entries.get(key)
+    if entry is not None and block - entry[0] < self.ttl_blocks:
+      record_cache("chain_state", True)
+      return entry[1]
+
+    record_cache("chain_state", False)
+    with RPC_LATENCY.labels(method=f"query.{storage_function}").time():
+      value = self.substrate.query(module, storage_function, params or []).value
+    self._entries[key] = (block, value)
+    return value
+
+  def invalidate(self):
+    self._entries.clear()
+    self._block = None
+
+
+class FeeCache:
+  """
+  Caches ``payment_info`` fee estimates per call shape.
+
+  The shape is the call module, function and the type and length of each parameter, so calls
+  differing only in parameter values share an estimate.
+  """
+
+  def __init__(self, substrate: SubstrateInterface):
+    self.substrate = substrate
+    self._fees: Dict[Hashable, int] = {}
+
+  @staticmethod
+  def call_shape(call_module: str, call_function: str, call_params: Dict) -> Hashable:
+    def param_shape(value):
+      if isinstance(value, (bytes, str, list, tuple)):
+        return type(value).__name__, len(value)
+      return type(value).__name__
+    return call_module, call_function, tuple(sorted((name, param_shape(value)) for name, value in call_params.items()))
+
+  def estimate(self, call, keypair: Keypair, shape: Hashable) -> int:
+    fee = self._fees.get(shape)
+    if fee is not None:
+      record_cache("fee", True)
+      return fee
+
+    record_cache("fee", False)
+    with RPC_LATENCY.labels(method="payment_info").time():
+      payment_info = self.substrate.get_payment_info(call=call, keypair=keypair)
+    fee = int(payment_info["partialFee"])
+    self._fees[shape] = fee
+    return fee
+
+
+@dataclass
+class PreparedExtrinsic:
+  """
+  Dataclass for a composed, validated and signed extrinsic waiting to be sent.
+  """
+
+  call_function: str
+  call: Any
+  extrinsic: Any
+  nonce: int
+  fee: int
+  signed_at_block: int
+  target_block: Optional[int] = None
+  # Mortal era length in blocks, None for an immortal extrinsic
+  era_period: Optional[int] = PRESIGNED_ERA_PERIOD
+  # Checks re-run against fresh chain state right before sending
+  send_checks: List[Callable[[], None]] = field(default_factory=list)
+
+  def expired(self, block: int) -> bool:
+    return self.era_period is not None and block - self.signed_at_block >= self.era_period
+
+
+class Preflight:
+  def __init__(
+    self,
+    substrate: SubstrateInterface,
+    keypair: Keypair,
+    hotkey: Optional[str] = None,
+    state: Optional[ChainStateCache] = None,
+    fees: Optional[FeeCache] = None,
+    submission_window_fraction: float = SUBMISSION_WINDOW_FRACTION,
+  ):
+    """
+    :param substrate: interface to blockchain
+    :param keypair: keypair of extrinsic caller
+    :param hotkey: hotkey of the overwatch node, defaults to the caller
+    :param submission_window_fraction: leading fraction of each epoch weights are sent in,
+      see `SUBMISSION_WINDOW_FRACTION`
+    """
+    if not 0 < submission_window_fraction <= 1:
+      raise ValueError(f"Submission window fraction must be in (0, 1], got {submission_window_fraction}")
+    self.substrate = substrate
+    self.keypair = keypair
+    self.hotkey = hotkey or keypair.ss58_address
+    self.state = state or ChainStateCache(substrate)
+    self.fees = fees or FeeCache(substrate)
+    self.submission_window_fraction = submission_window_fraction
+    self._max_era_period: Optional[int] = None
+    self._metadata_checked = False
+
+  def check_metadata(self):
+    """Verifies the storage read by the checks exists in the runtime, once per instance"""
+    if self._metadata_checked:
+      return
+    missing = [
+      name for name in PREFLIGHT_STORAGE
+      if self.substrate.get_metadata_storage_function("Network", name) is None
+    ]
+    if missing:
+      raise PreflightError(f"Network storage {missing} is not in the runtime metadata")
+    self._metadata_checked = True
+
+  def free_balance(self) -> int:
+    account = self.state.query("System", "Account", [self.keypair.ss58_address])
+    return int(account["data"]["free"])
+
+  def check_registered(self):
+    if self.state.query("Network", OVERWATCH_NODE_ID_STORAGE, [self.hotkey]) is None:
+      raise PreflightError(f"{self.hotkey} is not registered as an overwatch node")
+
+  def check_stake(self, minimum: int = 1):
+    stake = overwatch_stake(self.state.query, self.hotkey)
+    if stake < minimum:
+      raise PreflightError(f"Overwatch stake {stake} of {self.hotkey} is below {minimum}")
+
+  def submission_window(self, block: Optional[int] = None) -> Tuple[int, int]:
+    """Returns the [first, last] blocks of the current epoch's submission window"""
+    block = self.state.block_number() if block is None else block
+    epoch_length = int(self.state.query("Network", EPOCH_LENGTH_STORAGE))
+    epoch_start = block - block % epoch_length
+    return epoch_start, epoch_start + max(1, int(epoch_length * self.submission_window_fraction)) - 1
+
+  def next_window_start(self) -> int:
+    block = self.state.block_number()
+    epoch_length = int(self.state.query("Network", EPOCH_LENGTH_STORAGE))
+    return block - block % epoch_length + epoch_length
+
+  def check_submission_window(self, block: Optional[int] = None):
+    block = self.state.block_number() if block is None else block
+    first, last = self.submission_window(block)
+    if not first <= block <= last:
+      raise PreflightError(f"Block {block} is outside the submission window [{first}, {last}]")
+
+  def prepare(
+    self,
+    call_module: str,
+    call_function: str,
+    call_params: Dict,
+    checks: Optional[List[Callable[[], None]]] = None,
+    target_block: Optional[int] = None,
+    nonce: Optional[int] = None,
+    send_checks: Optional[List[Callable[[], None]]] = None,
+  ) -> PreparedExtrinsic:
+    """
+    Runs ``checks``, estimates the fee, verifies the balance covers it and signs the call.
+    ``send_checks`` are run again by `submit` right before sending.
+
+    Raises:
+      PreflightError: if a check fails, nothing is signed or sent
+    """
+    self.check_metadata()
+    for check in checks or []:
+      check()
+
+    call = self.substrate.compose_call(
+      call_module=call_module,
+      call_function=call_function,
+      call_params=call_params,
+    )
+    fee = self.fees.estimate(call, self.keypair, FeeCache.call_shape(call_module, call_function, call_params))
+    balance = self.free_balance()
+    if balance < fee:
+      raise PreflightError(f"Free balance {balance} does not cover the estimated fee {fee}")
+
+    if nonce is None:
+      with RPC_LATENCY.labels(method="get_account_nonce").time():
+        nonce = self.substrate.get_account_nonce(self.keypair.ss58_address)
+    block = self.state.block_number()
+    era_period = self.era_period(0 if target_block is None else target_block - block)
+    extrinsic = self._sign(call, nonce, era_period)
+    return PreparedExtrinsic(
+      call_function, call, extrinsic, nonce, fee, block, target_block, era_period, list(send_checks or [])
+    )
+
+  def max_era_period(self) -> int:
+    """
+    Longest mortal era the chain accepts, the era's birth block hash has to still be kept in
+    ``System::BlockHashCount``
+    """
+    if self._max_era_period is None:
+      try:
+        block_hash_count = int(self.substrate.get_constant("System", "BlockHashCount").value)
+      except Exception as e:
+        logger.warning(f"Could not read System::BlockHashCount, assuming {DEFAULT_BLOCK_HASH_COUNT}: {e}")
+        block_hash_count = DEFAULT_BLOCK_HASH_COUNT
+      period = PRESIGNED_ERA_PERIOD
+      while period * 2 <= min(block_hash_count, MAX_ERA_PERIOD):
+        period *= 2
+      self._max_era_period = period
+    return self._max_era_period
+
+  def era_period(self, blocks_ahead: int) -> Optional[int]:
+    """
+    Smallest mortal era covering ``blocks_ahead`` blocks of waiting plus `PRESIGNED_ERA_PERIOD`,
+    or None for an immortal era when no mortal one is long enough
+    """
+    period = PRESIGNED_ERA_PERIOD
+    while period < blocks_ahead + PRESIGNED_ERA_PERIOD:
+      period *= 2
+    return period if period <= self.max_era_period() else None
+
+  def _sign(self, call, nonce: int, era_period: Optional[int]):
+    return self.substrate.create_signed_extrinsic(
+      call=call,
+      keypair=self.keypair,
+      nonce=nonce,
+      era=IMMORTAL_ERA if era_period is None else {"period": era_period},
+    )
+
+  def prepare_benchmark_weights(self, encrypted_weights, next_epoch: bool = False) -> PreparedExtrinsic:
+    """
+    Prepares `submit_benchmark_weights`, for the current window or signed ahead for the next one
+    """
+    checks = [self.check_registered, self.check_stake]
+    target_block = None
+    if next_epoch:
+      target_block = self.next_window_start()
+    else:
+      checks.append(self.check_submission_window)
+
+    return self.prepare(
+      "Network",
+      "submit_benchmark_weights",
+      {"encrypted_weights": encrypted_weights},
+      checks=checks,
+      target_block=target_block,
+      send_checks=[self.check_submission_window],
+    )
+
+  def submit(self, prepared: PreparedExtrinsic, poll_secs: float = 1.0) -> ExtrinsicReceipt:
+    """
+    Waits for the prepared extrinsic's target block, re-validates cheaply and sends it once.
+    Its ``send_checks`` run on the current block, so e.g. a submission window that closed
+    while waiting is not sent.
+
+    The signature is reused unless the account nonce moved since signing (another extrinsic
+    was sent from the same account) or its era expired, in which case it is re-signed. The era
+    is chosen at signing to outlast the wait for the target block, so it only expires when the
+    send is late.
+    """
+    block = self.state.block_number()
+    if prepared.target_block is not None:
+      while block < prepared.target_block:
+        time.sleep(poll_secs)
+        block = self.state.block_number(refresh=True)
+      self.state.invalidate()
+      self.check_registered()
+      self.check_stake()
+    if prepared.send_checks:
+      block = self.state.block_number(refresh=True)
+      for check in prepared.send_checks:
+        check()
+
+    with RPC_LATENCY.labels(method="get_account_nonce").time():
+      nonce = self.substrate.get_account_nonce(self.keypair.ss58_address)
+    if nonce != prepared.nonce or prepared.expired(block):
+      logger.info(f"Re-signing {prepared.call_function}, nonce {prepared.nonce} -> {nonce}")
+      prepared.era_period = self.era_period(0)
+      prepared.extrinsic = self._sign(prepared.call, nonce, prepared.era_period)
+      prepared.nonce = nonce
+      prepared.signed_at_block = block
+
+    try:
+      with EXTRINSIC_INCLUSION.labels(call=prepared.call_function).time():
+        receipt = self.substrate.submit_extrinsic(prepared.extrinsic, wait_for_inclusion=True)
+    except SubstrateRequestException as e:
+      raise PreflightError(f"Failed to send: {e}") from e
+
+    if not receipt.is_success:
+      logger.warning(f"⚠️ Extrinsic Failed: {receipt.error_message}")
+    return receipt
@@ -0,0 +1,209 @@
+"""
+Vectorized analytics over many epochs of `RewardsData` scores
+
+Scores are u128 on-chain. They are held exactly as two uint64 arrays (``hi``, ``lo``) in an
+epochs x peers matrix, and converted to float64 once for the bulk statistics, which only need
+relative precision.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+U64_MASK = (1 << 64) - 1
+TWO_POW_64 = float(1 << 64)
+
+
+def split_u128(scores: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+  """Splits u128 python ints into (hi, lo) uint64 arrays"""
+  scores = scores if isinstance(scores, list) else list(scores)
+  hi = np.fromiter((score >> 64 for score in scores), dtype=np.uint64, count=len(scores))
+  lo = np.fromiter((score & U64_MASK for score in scores), dtype=np.uint64, count=len(scores))
+  return hi, lo
+
+
+def join_u128(hi: np.ndarray, lo: np.ndarray) -> List[int]:
+  """Returns the exact python ints of (hi, lo) uint64 arrays"""
+  return [(int(h) << 64) | int(l) for h, l in zip(hi.ravel().tolist(), lo.ravel().tolist())]
+
+
+def u128_to_float(hi: np.ndarray, lo: np.ndarray) -> np.ndarray:
+  return hi.astype(np.float64) * TWO_POW_64 + lo.astype(np.float64)
+
+
+def average_ranks(values: np.ndarray) -> np.ndarray:
+  """
+  0-based ascending ranks along the last axis, tied values share the mean of their positions
+  as in Spearman's correlation
+  """
+  values = np.asarray(values)
+  order = np.argsort(values, axis=-1, kind="stable")
+  ordered = np.take_along_axis(values, order, axis=-1)
+  positions = np.broadcast_to(np.arange(values.shape[-1]), values.shape)
+
+  starts = np.ones(values.shape, dtype=bool)
+  starts[..., 1:] = ordered[..., 1:] != ordered[..., :-1]
+  ends = np.ones(values.shape, dtype=bool)
+  ends[..., :-1] = starts[..., 1:]
+  # First and last position of each value's tie group
+  first = np.maximum.accumulate(np.where(starts, positions, 0), axis=-1)
+  last = np.minimum.accumulate(np.where(ends, positions, values.shape[-1] - 1)[..., ::-1], axis=-1)[..., ::-1]
+
+  ranks = np.empty(values.shape, dtype=np.float64)
+  np.put_along_axis(ranks, order, (first + last) / 2, axis=-1)
+  return ranks
+
+
+def _exact_row_sums(values: np.ndarray) -> Tuple[List[int], List[int]]:
+  """
+  Sums uint64 rows as separate 32-bit halves, which stays exact in uint64 for up to 2^32 peers
+  """
+  upper = (values >> np.uint64(32)).sum(axis=1, dtype=np.uint64)
+  lower = (values & np.uint64(0xFFFFFFFF)).sum(axis=1, dtype=np.uint64)
+  return [int(x) for x in upper.tolist()], [int(x) for x in lower.tolist()]
+
+
+@dataclass
+class RewardsMatrix:
+  """
+  Dataclass for rewards of many peers over many epochs.
+
+  ``hi``/``lo`` are (epochs x peers) uint64 halves of the exact scores, ``mask`` marks which
+  peers have a score in each epoch.
+  """
+
+  epochs: np.ndarray
+  peer_ids: List[bytes]
+  hi: np.ndarray
+  lo: np.ndarray
+  mask: np.ndarray
+  _values: Optional[np.ndarray] = field(default=None, repr=False)
+
+  @classmethod
+  def from_rows(cls, rows: Iterable[Tuple[int, bytes, int]]) -> "RewardsMatrix":
+    """Builds the matrix from (epoch, peer_id, score) rows, e.g. `ChainStore.epoch_rewards`"""
+    rows = rows if isinstance(rows, list) else list(rows)
+    n_rows = len(rows)
+
+    peer_index: Dict[bytes, int] = {}
+    peer_columns = np.fromiter(
+      (peer_index.setdefault(peer_id, len(peer_index)) for _, peer_id, _ in rows), dtype=np.int64, count=n_rows
+    )
+    row_epochs = np.fromiter((epoch for epoch, _, _ in rows), dtype=np.int64, count=n_rows)
+    epochs, epoch_rows = np.unique(row_epochs, return_inverse=True)
+    hi_values, lo_values = split_u128([score for _, _, score in rows])
+
+    shape = (len(epochs), len(peer_index))
+    hi = np.zeros(shape, dtype=np.uint64)
+    lo = np.zeros(shape, dtype=np.uint64)
+    mask = np.zeros(shape, dtype=bool)
+    hi[epoch_rows, peer_columns] = hi_values
+    lo[epoch_rows, peer_columns] = lo_values
+    mask[epoch_rows, peer_columns] = True
+
+    return cls(epochs=epochs, peer_ids=list(peer_index), hi=hi, lo=lo, mask=mask)
+
+  @classmethod
+  def from_store(cls, store, first_epoch: int, last_epoch: int) -> "RewardsMatrix":
+    """Loads an epoch range from a `substrate.chain_store.ChainStore`"""
+    return cls.from_rows(store.epoch_rewards(first_epoch, last_epoch))
+
+  @property
+  def values(self) -> np.ndarray:
+    """Scores as float64, NaN where a peer has no score in an epoch"""
+    if self._values is None:
+      values = u128_to_float(self.hi, self.lo)
+      values[~self.mask] = np.nan
+      self._values = values
+    return self._values
+
+  def peer_column(self, peer_id: bytes) -> int:
+    return self.peer_ids.index(peer_id)
+
+  def totals(self) -> List[int]:
+    """Exact u128 sum of scores per epoch"""
+    hi_upper, hi_lower = _exact_row_sums(self.hi)
+    lo_upper, lo_lower = _exact_row_sums(self.lo)
+    return [
+      (a << 96) + (b << 64) + (c << 32) + d
+      for a, b, c, d in zip(hi_upper, hi_lower, lo_upper, lo_lower)
+    ]
+
+  def normalized(self) -> np.ndarray:
+    """Each peer's share of the epoch's total score, NaN where missing"""
+    values = self.values
+    totals = np.nansum(values, axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+      return np.where(totals > 0, values / totals, np.nan)
+
+  def moving_average(self, window: int, normalized: bool = True) -> np.ndarray:
+    """Trailing mean over the last ``window`` epochs per peer, ignoring epochs without a score"""
+    if window < 1:
+      raise ValueError(f"Moving average window must be at least 1 epoch, got {window}")
+    values = self.normalized() if normalized else self.values
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+
+    sums = np.cumsum(filled, axis=0)
+    counts = np.cumsum(present, axis=0, dtype=np.int64)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+      return np.where(counts > 0, sums / counts, np.nan)
+
+  def ranks(self) -> np.ndarray:
+    """Rank of each peer per epoch, 0 being the highest score and ties averaged, -1 where missing"""
+    values = np.where(self.mask, self.values, -np.inf)
+    return np.where(self.mask, average_ranks(-values), -1.0)
+
+  def rank_changes(self) -> np.ndarray:
+    """
+    Change in rank between consecutive epochs, positive when a peer moved up, 0 where the peer
+    is missing in either epoch. Shape is (epochs - 1, peers).
+    """
+    ranks = self.ranks()
+    both = self.mask[1:] & self.mask[:-1]
+    return np.where(both, ranks[:-1] - ranks[1:], 0)
+
+  def outliers(self, threshold: float = 3.5) -> np.ndarray:
+    """
+    Flags scores whose robust z-score within their epoch exceeds ``threshold``, using the
+    median absolute deviation so a few extreme peers don't hide each other.
+    """
+    shares = self.normalized()
+    median = np.nanmedian(shares, axis=1, keepdims=True)
+    mad = np.nanmedian(np.abs(shares - median), axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+      z = 0.6745 * (shares - median) / mad
+    return np.abs(np.nan_to_num(z, nan=0.0, posinf=0.0, neginf=0.0)) > threshold
+
+  def compare(self, benchmark_scores: Dict[bytes, float], epoch_index: int = -1) -> Dict:
+    """
+    Compares on-chain shares of an epoch against our own benchmark scores per peer.
+
+    Returns:
+      Dict: ``spearman`` rank correlation, ``peers`` compared and per peer ``diff`` of shares
+        normalized over the compared peers
+    """
+    columns = [
+      (column, benchmark_scores[peer_id])
+      for column, peer_id in enumerate(self.peer_ids)
+      if peer_id in benchmark_scores and self.mask[epoch_index, column]
+    ]
+    if len(columns) < 2:
+      return {"spearman": np.nan, "peers": len(columns), "diff": {}}
+
+    indexes = np.array([column for column, _ in columns])
+    ours = np.array([score for _, score in columns], dtype=np.float64)
+    ours = ours / ours.sum() if ours.sum() > 0 else ours
+    # Both sides are shares of the compared peers, not of everyone scored on-chain
+    chain = self.values[epoch_index, indexes]
+    chain = chain / chain.sum() if chain.sum() > 0 else chain
+
+    chain_ranks = average_ranks(chain)
+    our_ranks = average_ranks(ours)
+    spearman = np.corrcoef(chain_ranks, our_ranks)[0, 1]
+
+    diff = {self.peer_ids[column]: float(ours[i] - chain[i]) for i, column in enumerate(indexes)}
+    return {"spearman": float(spearman), "peers": len(columns), "diff": diff}